@@ -0,0 +1,242 @@
+import csv
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from datetime import date, datetime, timedelta
+
+from functions import parse_date, parse_us_date, parse_us_time
+from ohlcv import OHLCVFile
+from columns import HistoryColumns
+from quote import HISTORY_CSV_COLUMNS, HISTORY_CSV_HEADER, NUMERIC_SCALED, YahooCSVQuoteHistory
+
+# Number of rows in the benchmark histories
+BENCHMARK_ROWS = 10000
+
+# Number of rows in the benchmark history response bodies
+BENCHMARK_BODY_ROWS = 50000
+
+# Number of times each benchmark is run, the best run is reported
+BENCHMARK_REPEAT = 5
+
+
+def make_history_rows(count=BENCHMARK_ROWS):
+    """Returns a list of raw CSV API history rows, latest first."""
+    last_date = date(2013, 4, 12)
+
+    return [
+        {
+            'Date': (last_date - timedelta(days=i)).isoformat(),
+            'Open': '3.%02d' % (i % 100, ),
+            'High': '3.%02d' % ((i + 5) % 100, ),
+            'Low': '3.%02d' % ((i + 95) % 100, ),
+            'Close': '3.%02d' % ((i + 2) % 100, ),
+            'Volume': '%d' % (100000 + i, ),
+            'Adj Close': '3.%02d' % ((i + 2) % 100, ),
+        }
+        for i in range(count)
+    ]
+
+
+def make_history_body(count=BENCHMARK_BODY_ROWS):
+    """Returns a CSV API history response body, latest first."""
+    lines = [HISTORY_CSV_HEADER]
+    for row in make_history_rows(count):
+        lines.append(','.join([row[column] for column in HISTORY_CSV_COLUMNS]))
+
+    return '\n'.join(lines) + '\n'
+
+
+class StaticTransport(object):
+    """Transport that responds to every url with a fixed body."""
+    def __init__(self, body):
+        self.body = body
+
+    def get(self, url):
+        return self.body
+
+
+def get_best_time(func, repeat=BENCHMARK_REPEAT):
+    """Run func a number of times and return the best time of a call in seconds."""
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def benchmark(name, func, count, repeat=BENCHMARK_REPEAT):
+    """Run func a number of times and print the best rate of items per second."""
+    print '%-40s %12.0f /sec' % (name, count / get_best_time(func, repeat))
+
+
+def benchmark_time(name, func, repeat=BENCHMARK_REPEAT):
+    """Run func a number of times and print the best time of a call in milliseconds."""
+    print '%-40s %12.3f ms' % (name, get_best_time(func, repeat) * 1000)
+
+
+def parse_row_generic(quote_fields, data):
+    """Parse a raw row by looping over its columns, as parse_row did before
+    row converters were generated.
+
+    """
+    dic = {}
+
+    for key, value in data.items():
+        if not quote_fields.has_key(key):
+            continue
+        data_name, data_type = quote_fields[key]
+        dic[data_name] = data_type(value)
+
+    return dic
+
+
+def benchmark_parse_history():
+    """Compare parsing a history with the generic loop and the generated row converter."""
+    rows = make_history_rows()
+
+    quote = YahooCSVQuoteHistory('ABC', 'AX', [date(1990, 1, 1), date(2013, 4, 12)], defer=True)
+    quote.quote_fields = quote.get_quote_fields()
+    quote.raw_quote = rows
+
+    benchmark(
+        'parse history rows (generic loop)',
+        lambda: [parse_row_generic(quote.quote_fields, data) for data in rows],
+        len(rows)
+    )
+    benchmark('parse history rows (row converter)', quote.parse_quote, len(rows))
+
+    quote.numeric_mode = NUMERIC_SCALED
+    quote.quote_fields = quote.get_quote_fields()
+
+    benchmark('parse history rows (scaled integers)', quote.parse_quote, len(rows))
+
+
+def benchmark_read_history():
+    """Compare reading a history response body with the CSV module and read_raw_columns."""
+    body = make_history_body()
+    count = BENCHMARK_BODY_ROWS
+
+    quote_fields = YahooCSVQuoteHistory.get_field_set('*', NUMERIC_SCALED)
+
+    benchmark(
+        'read history body (DictReader)',
+        lambda: [row for row in csv.DictReader(body.split('\n'))],
+        count
+    )
+    benchmark('read history body (raw rows)', lambda: YahooCSVQuoteHistory.read_raw_rows(body), count)
+    benchmark('read history body (raw columns)', lambda: YahooCSVQuoteHistory.read_raw_columns(body), count)
+
+    benchmark(
+        'history body to columns (DictReader)',
+        lambda: HistoryColumns.from_rows(list(csv.DictReader(body.split('\n'))), quote_fields),
+        count
+    )
+    benchmark(
+        'history body to columns (raw columns)',
+        lambda: HistoryColumns.from_raw_columns(YahooCSVQuoteHistory.read_raw_columns(body), quote_fields),
+        count
+    )
+
+    def process_history(columnar):
+        quote = YahooCSVQuoteHistory(
+            'ABC', 'AX', [date(1990, 1, 1), date(2013, 4, 12)], defer=True, transport=StaticTransport(body)
+        )
+        quote.numeric_mode = NUMERIC_SCALED
+        quote.columnar = columnar
+        quote.chunk_days = None
+        quote.process_quote()
+
+    benchmark('process history (rows)', lambda: process_history(False), count)
+    benchmark('process history (columnar)', lambda: process_history(True), count)
+
+
+def benchmark_open_history():
+    """Compare the time to open a history and read one date from a CSV body and an
+    OHLCV file of BENCHMARK_BODY_ROWS rows.
+
+    """
+    body = make_history_body()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'ABC.AX.ohlcv')
+        OHLCVFile.write(path, YahooCSVQuoteHistory.read_raw_rows(body))
+
+        quote = YahooCSVQuoteHistory('ABC', 'AX', [date(1990, 1, 1), date(2013, 4, 12)], defer=True)
+        quote.numeric_mode = NUMERIC_SCALED
+        quote.quote_fields = quote.get_quote_fields()
+
+        def parse_body():
+            quote.raw_quote = YahooCSVQuoteHistory.read_raw_rows(body)
+            return [row for row in quote.parse_quote() if row['Date'] == date(2000, 1, 4)]
+
+        def open_file():
+            with OHLCVFile(path) as ohlcv_file:
+                return ohlcv_file.get(date(2000, 1, 4))
+
+        benchmark_time('open history, one date (CSV body)', parse_body)
+        benchmark_time('open history, one date (OHLCV file)', open_file)
+    finally:
+        shutil.rmtree(directory)
+
+
+def parse_date_regex(value):
+    """Parse a %Y-%m-%d date with a regex compiled on each call, as parse_date did
+    before its fast path.
+
+    """
+    match = re.compile(r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})$').match(value)
+    if match:
+        return date(**dict((k, int(v)) for k, v in match.groupdict().items()))
+
+
+def benchmark_parse_dates():
+    """Compare the date and time parsers with strptime, with and without any memo cache."""
+    days = [date(2013, 4, 12) - timedelta(days=i) for i in range(BENCHMARK_ROWS)]
+
+    iso_dates = [day.isoformat() for day in days]
+    us_dates = [day.strftime('%m/%d/%Y') for day in days]
+    us_times = ['%d:%02d%s' % (i % 12 + 1, i % 60, i % 2 and 'pm' or 'am') for i in range(BENCHMARK_ROWS)]
+
+    # Polled quotes repeat the same few values
+    repeated_dates = us_dates[:10] * (BENCHMARK_ROWS / 10)
+
+    def strptime(fmt, method):
+        return lambda value: getattr(datetime.strptime(value, fmt), method)()
+
+    cases = [
+        ('%Y-%m-%d', iso_dates, [('strptime', strptime('%Y-%m-%d', 'date')), ('regex', parse_date_regex)], parse_date),
+        ('%m/%d/%Y', us_dates, [('strptime', strptime('%m/%d/%Y', 'date'))], parse_us_date),
+        ('%I:%M%p', us_times, [('strptime', strptime('%I:%M%p', 'time'))], parse_us_time),
+        ('%m/%d/%Y repeated', repeated_dates, [('strptime', strptime('%m/%d/%Y', 'date'))], parse_us_date),
+    ]
+
+    for name, values, befores, after in cases:
+        for before_name, before in befores:
+            benchmark('%s (%s)' % (name, before_name), lambda: [before(value) for value in values], len(values))
+
+        # Only the parsers of the few values in latest quotes are memoised
+        if not hasattr(after, 'uncached'):
+            benchmark('%s (hand-rolled)' % (name, ), lambda: [after(value) for value in values], len(values))
+            continue
+
+        benchmark('%s (hand-rolled)' % (name, ), lambda: [after.uncached(value) for value in values], len(values))
+
+        def memoised():
+            after.cache.clear()
+            return [after(value) for value in values]
+
+        benchmark('%s (memoised)' % (name, ), memoised, len(values))
+
+if __name__ == '__main__':
+    benchmark_parse_history()
+    benchmark_read_history()
+    benchmark_open_history()
+    benchmark_parse_dates()
@@ -0,0 +1,189 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+__all__ = ['QUOTE_CACHE_TTL', 'QUOTE_CACHE_SIZE', 'QuoteCache', 'InFlightCall', 'SingleFlight']
+
+# Number of seconds a cached quote is fresh
+QUOTE_CACHE_TTL = 15
+
+# Maximum number of quotes kept in a cache
+QUOTE_CACHE_SIZE = 1024
+
+
+class QuoteCache(object):
+    """In-memory cache of raw quotes that expire after a time to live.
+
+    The cache holds at most `max_size` quotes and evicts the least recently
+    used quote when it is full.  Optionally a quote that has expired less than
+    `stale_ttl` seconds ago is still served while a single background thread
+    fetches a fresh one (stale-while-revalidate).
+
+    """
+    def __init__(self, ttl=QUOTE_CACHE_TTL, max_size=QUOTE_CACHE_SIZE, stale_ttl=0):
+        """Initialise the cache.
+
+        Optionally given the number of seconds a quote is fresh, the maximum
+        number of quotes to keep and the number of seconds an expired quote
+        may still be served (default is 0, never serve expired quotes).
+
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_ttl = stale_ttl
+
+        # Cached (timestamp, value) tuples, least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Keys with a background refresh running
+        self.refreshing = set()
+
+        # Counters
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, fetch):
+        """Returns the cached value of the key, or calls fetch and caches its value.
+
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+
+            if entry is not None:
+                stored, value = entry
+                age = time.time() - stored
+
+                if age <= self.ttl + self.stale_ttl:
+                    # Mark as the most recently used
+                    self.entries[key] = entry
+
+                    if age <= self.ttl:
+                        self.hits += 1
+                        return value
+
+                    # Serve the stale value and refresh it in the background
+                    self.stale_hits += 1
+                    if not key in self.refreshing:
+                        self.refreshing.add(key)
+                        thread = threading.Thread(target=self.refresh, args=(key, fetch))
+                        thread.daemon = True
+                        thread.start()
+                    return value
+
+            self.misses += 1
+
+        value = fetch()
+        self.set(key, value)
+
+        return value
+
+    def lookup(self, key):
+        """Returns the cached value of the key if it is fresh, otherwise None.
+
+        Unlike get, a miss does not fetch the value, so the caller can fetch
+        the values of several keys at once and set them.
+
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                # Mark as the most recently used
+                del self.entries[key]
+                self.entries[key] = entry
+
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+
+        return None
+
+    def set(self, key, value):
+        """Cache the value of the key, evicting the least recently used if full."""
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time(), value)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def refresh(self, key, fetch):
+        """Fetch and cache a fresh value of the key."""
+        try:
+            self.set(key, fetch())
+        except Exception:
+            # Keep serving the stale value until it expires
+            pass
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def clear(self):
+        """Remove every cached value and reset the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.stale_hits = 0
+            self.misses = 0
+
+
+class InFlightCall(object):
+    """The result of a call that other threads may be waiting on."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Shares one call between concurrent requests for the same key.
+
+    While a call for a key is running, other requests for the key wait for it
+    to finish and receive its value (or exception) instead of making their own
+    call.
+
+    """
+    def __init__(self):
+        """Initialise the single flight with no calls in flight."""
+        self.calls = {}
+        self.lock = threading.Lock()
+
+        # Number of requests that shared another request's call
+        self.shared = 0
+
+    def do(self, key, fetch):
+        """Returns the value of fetch, sharing a call in flight for the same key."""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self.calls[key] = InFlightCall()
+            else:
+                self.shared += 1
+
+        # Wait for the call made by another request
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fetch()
+        except Exception, e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+
+        return call.value
@@ -0,0 +1,298 @@
+import gzip
+import json
+import threading
+import time
+import yql
+
+from datetime import date
+from multiprocessing.pool import ThreadPool
+
+from functions import atomic_write, parse_date
+
+__all__ = ['RECORD', 'REPLAY', 'CASSETTE_CONCURRENCY', 'get_cassette_key', 'load_cassette_key',
+           'Cassette']
+
+# Modes of a cassette
+RECORD = 'record'
+REPLAY = 'replay'
+
+# Number of quotes processed at the same time when playing a cassette
+CASSETTE_CONCURRENCY = 16
+
+
+def get_cassette_key(quote):
+    """Returns the key that identifies a quote in a cassette.
+
+    The key is the quote's cache key with the model replaced by its name and
+    dates by their ISO format, so it survives being written to disk.
+
+    """
+    key = []
+    for value in quote.get_cache_key():
+        if isinstance(value, type):
+            value = value.__name__
+        elif isinstance(value, date):
+            value = value.isoformat()
+        key.append(value)
+
+    return tuple(key)
+
+
+def load_cassette_key(key):
+    """Returns a cassette key read from disk, with the lists of fields as tuples."""
+    return tuple([isinstance(value, list) and tuple(value) or value for value in key])
+
+
+class Cassette(object):
+    """Records the provider requests made by quote models and replays them later.
+
+    In record mode every provider request is captured with its response body
+    (or YQL results), response headers and timing, the quotes it was made for
+    and the fetch it was part of, so the requests of chunked histories and
+    batches are all recorded.  In replay mode the recorded responses are
+    served back by request without the network, in the order they were
+    recorded, and are read and parsed by the models as usual.  Cassettes are
+    saved as gzip compressed JSON lines, one recorded request per line.
+
+    """
+    def __init__(self, path, mode=REPLAY, speed=None):
+        """Initialise the cassette given the path of its file.
+
+        Optionally given the mode (default is replay) and the speed of
+        replayed responses relative to their recorded time (default is None,
+        respond immediately).  A replay cassette loads its file.
+
+        """
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+
+        # Recorded requests in the order they were made, and keyed by request
+        self.entries = []
+        self.index = {}
+        self.lock = threading.Lock()
+
+        # Number of fetches recorded
+        self.fetches = 0
+
+        # Time recording started
+        self.started = time.time()
+
+        # Index of the next recorded response served for each request
+        self.positions = {}
+
+        if mode == REPLAY:
+            self.load()
+        elif mode != RECORD:
+            raise Exception('Cassette mode - %s is not known' % (mode, ))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def load(self):
+        """Read the recorded requests from the cassette file."""
+        with self.lock:
+            self.entries = []
+            self.index = {}
+            self.positions = {}
+
+            with gzip.open(self.path, 'rb') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    entry['keys'] = [load_cassette_key(key) for key in entry['keys']]
+                    self.add_entry(entry)
+
+            self.fetches = max([entry['fetch'] + 1 for entry in self.entries] or [0])
+
+    def add_entry(self, entry):
+        """Add a recorded request to the cassette (the lock must be held)."""
+        self.entries.append(entry)
+        self.index.setdefault(entry['request'], []).append(entry)
+
+    def save(self):
+        """Write the recorded requests to the cassette file."""
+        with self.lock:
+            entries = list(self.entries)
+
+        with atomic_write(self.path, opener=gzip.open) as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(',', ':')))
+                f.write('\n')
+
+    def close(self):
+        """Save the cassette if it is recording."""
+        if self.mode == RECORD:
+            self.save()
+
+    def new_fetch(self):
+        """Returns the number of a new recorded fetch."""
+        with self.lock:
+            fetch = self.fetches
+            self.fetches += 1
+        return fetch
+
+    def fetch(self, quote, fetch):
+        """Call fetch to get the raw quote of a quote, grouping the requests it
+        makes on any thread as one fetch when recording.
+
+        """
+        if self.mode == RECORD:
+            quote.cassette_fetch = self.new_fetch()
+        return fetch()
+
+    def call(self, quote, quotes, fetch, request, *args, **kwargs):
+        """Returns the response of a provider request made by a quote, recording
+        or replaying it.
+
+        Given the quotes a batch request is made for (None for the quote's own
+        request), the function that makes the request and the url or YQL query.
+
+        """
+        if self.mode == RECORD:
+            return self.record(quote, quotes, fetch, request, *args, **kwargs)
+        return self.replay(request)
+
+    def record(self, quote, quotes, fetch, request, *args, **kwargs):
+        """Make a provider request and record its response."""
+        start = time.time()
+        response = quote.request_provider(fetch, request, *args, **kwargs)
+        elapsed = time.time() - start
+
+        # Only the transport gives the response headers
+        headers = None
+        if getattr(fetch, 'im_self', None) is quote.transport:
+            headers = quote.transport.get_response_headers()
+
+        # Batch and streamed requests are fetches of their own
+        fetch_number = getattr(quote, 'cassette_fetch', None)
+        if quotes is not None or fetch_number is None:
+            fetch_number = self.new_fetch()
+
+        entry = {
+            'keys': [get_cassette_key(item) for item in quotes or [quote]],
+            'batch': quotes is not None,
+            'fetch': fetch_number,
+            'request': request,
+            'offset': start - self.started,
+            'elapsed': elapsed,
+            'headers': headers,
+        }
+
+        # Bodies are bytes, which are kept as latin-1 so they survive JSON
+        if isinstance(response, basestring):
+            entry['body'] = response.decode('latin-1')
+        else:
+            entry['results'] = response.raw
+
+        with self.lock:
+            self.add_entry(entry)
+
+        return response
+
+    def replay(self, request):
+        """Returns the next recorded response of a request.
+
+        Once every recording of the request has been served the last one is
+        served again.  With a speed, the response is delayed by the recorded
+        time divided by the speed.
+
+        """
+        with self.lock:
+            matches = self.index.get(request)
+            if not matches:
+                raise Exception('Request - %s is not recorded in the cassette' % (request, ))
+
+            position = self.positions.get(request, 0)
+            self.positions[request] = position + 1
+
+        entry = matches[min(position, len(matches) - 1)]
+
+        if self.speed:
+            time.sleep(entry['elapsed'] / self.speed)
+
+        if 'body' in entry:
+            return entry['body'].encode('latin-1')
+
+        return yql.YQLObj({'query': entry['results']})
+
+    def get_fetches(self):
+        """Returns the recorded fetches as a list of the offset they started at,
+        the keys of the quotes they were made for and whether they were a batch,
+        in the order they started.
+
+        """
+        fetches = {}
+        for entry in self.entries:
+            offset, keys, batch = fetches.get(
+                entry['fetch'], (entry['offset'], entry['keys'], entry.get('batch', False))
+            )
+            fetches[entry['fetch']] = (min(offset, entry['offset']), keys, batch)
+
+        return sorted(fetches.values(), key=lambda fetch: fetch[0])
+
+    def make_quote(self, models, key):
+        """Returns a deferred quote of a cassette key that uses the cassette."""
+        name, code, exchange, fields = key[:4]
+        dates = [parse_date(value) for value in key[4:]]
+
+        if fields != '*':
+            fields = list(fields)
+
+        if dates:
+            quote = models[name](code, exchange, dates, fields, defer=True)
+        else:
+            quote = models[name](code, exchange, fields, defer=True)
+        quote.cassette = self
+
+        return quote
+
+    def play(self, models, speed=1.0, concurrency=CASSETTE_CONCURRENCY):
+        """Process the recorded quotes again with the original timing and return them.
+
+        Given the quote models that were recorded and the speed relative to the
+        recorded time (e.g. 10 plays ten times faster).  The quotes of each
+        recorded fetch are created and processed when the fetch's recorded time
+        arrives, so a captured burst can be profiled deterministically.  Single
+        quotes are processed through the models' caches, and the quotes of a
+        batch (even of one quote) are processed as a batch again, which does
+        not use the caches.
+
+        """
+        models = dict((model.__name__, model) for model in models)
+
+        self.speed = speed
+        self.positions = {}
+
+        pool = ThreadPool(concurrency)
+        try:
+            start = time.time()
+            results = []
+
+            for offset, keys, batch in self.get_fetches():
+                quotes = [self.make_quote(models, key) for key in keys]
+
+                # Wait until the quotes were recorded
+                delay = start + offset / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+                if batch:
+                    result = pool.apply_async(quotes[0].__class__.process_batch, (quotes, ))
+                else:
+                    result = pool.apply_async(quotes[0].process_quote)
+                results.append((quotes, result))
+
+            # Raise any exception
+            for quotes, result in results:
+                result.get()
+        finally:
+            pool.close()
+            pool.join()
+
+        return [quote for quotes, result in results for quote in quotes]
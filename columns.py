@@ -0,0 +1,296 @@
+import array
+
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from datetime import date
+from operator import add
+
+from functions import parse_date, parse_scaled, parse_volume
+
+__all__ = ['COLUMN_TYPECODES', 'FLOAT_TYPECODE', 'SCALED_TYPECODE', 'parse_date_ordinals',
+           'parse_volumes', 'get_column_converter',
+           'ArrayView', 'HistoryColumns']
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Array typecodes of the history fields, other fields are floats
+COLUMN_TYPECODES = {
+    'Date': 'l',        # Proleptic Gregorian ordinals
+    'Volume': 'l',
+}
+FLOAT_TYPECODE = 'd'
+
+# Array typecode of scaled integer prices
+SCALED_TYPECODE = 'l'
+
+# Day numbers of the days of a month, which are faster to look up than to parse
+DAY_NUMBERS = dict(('%02d' % (day, ), day) for day in range(1, 32))
+
+
+def parse_date_ordinals(values):
+    """Returns the ordinals of a list of date strings.
+
+    Dates in the %Y-%m-%d format are offset from the ordinal of their month,
+    which is computed once per month, so no date object is built per date.
+    Other strings are parsed with parse_date.
+
+    """
+    try:
+        if set(map(len, values)) - set([10]):
+            raise ValueError
+
+        months = [value[:8] for value in values]
+        days = map(DAY_NUMBERS.__getitem__, [value[8:] for value in values])
+
+        month_ordinals = {}
+        invalid = set()
+        for month in set(months):
+            if month[4] != '-' or month[7] != '-' or not (month[:4] + month[5:7]).isdigit():
+                raise ValueError
+
+            year, month_number = int(month[:4]), int(month[5:7])
+            month_ordinals[month] = date(year, month_number, 1).toordinal() - 1
+
+            # The days that are not in the month
+            invalid.update([
+                '%s%02d' % (month, day) for day in range(monthrange(year, month_number)[1] + 1, 32)
+            ])
+
+        if invalid.intersection(values):
+            raise ValueError
+
+        return map(add, map(month_ordinals.__getitem__, months), days)
+    except (KeyError, ValueError):
+        return [parse_date(value).toordinal() for value in values]
+
+
+def parse_volumes(values):
+    """Returns a list of volume strings as integers."""
+    try:
+        return map(int, values)
+    except ValueError:
+        return map(parse_volume, values)
+
+
+def get_column_converter(field_name, field_type=None):
+    """Returns the array typecode of a field and the function that converts a
+    list of its raw values for the array.
+
+    Fields parsed as scaled integers are kept as scaled integers.
+
+    """
+    if field_name == 'Date':
+        return COLUMN_TYPECODES['Date'], parse_date_ordinals
+
+    if field_type == parse_scaled:
+        return SCALED_TYPECODE, lambda values: map(parse_scaled, values)
+
+    if field_type == parse_volume or COLUMN_TYPECODES.get(field_name) == 'l':
+        return 'l', parse_volumes
+
+    return FLOAT_TYPECODE, lambda values: map(float, values)
+
+
+class ArrayView(object):
+    """Read-only view of part of an array that does not copy it.
+
+    The `array` module copies when sliced, so the columns of a history slice
+    are views of the whole history's arrays.
+
+    """
+    def __init__(self, data, start, stop):
+        """Initialise the view given the array and the start and stop indexes."""
+        self.data = data
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        data = self.data
+        for i in xrange(self.start, self.stop):
+            yield data[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError('Array views can only be sliced with a step of 1')
+            return ArrayView(self.data, self.start + start, self.start + max(start, stop))
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Array view index out of range')
+
+        return self.data[self.start + index]
+
+    def __eq__(self, other):
+        return self.tolist() == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ArrayView(%r)' % (self.tolist(), )
+
+    @property
+    def itemsize(self):
+        return self.data.itemsize
+
+    def tolist(self):
+        """Returns the values of the view as a list."""
+        return self.data[self.start:self.stop].tolist()
+
+
+class HistoryColumns(object):
+    """Historical quotes held as one contiguous typed array per field, oldest first.
+
+    Dates are held as ordinals, volumes as integers and prices as floats, or
+    as integers of ten-thousandths in the scaled numeric mode.  Each column is
+    a NumPy array if NumPy is installed, otherwise an `ArrayView` of an `array`
+    module array.  Slicing by date returns another HistoryColumns that shares
+    the arrays rather than copying them.
+
+    """
+    def __init__(self, arrays, start=0, stop=None):
+        """Initialise the columns given a dictionary of field names and arrays.
+
+        Optionally given the start and stop indexes of the rows to include
+        (default is every row).
+
+        """
+        self.arrays = arrays
+        self.start = start
+
+        if stop is None:
+            stop = arrays and len(arrays.values()[0]) or 0
+        self.stop = stop
+
+    @classmethod
+    def from_rows(cls, rows, quote_fields):
+        """Returns the columns of a list of raw rows given the quote fields.
+
+        Only the columns of the quote fields are kept.
+
+        """
+        raw_columns = dict(
+            (column, [row[column] for row in rows]) for column in quote_fields.keys()
+        )
+
+        return cls.from_raw_columns(raw_columns, quote_fields)
+
+    @classmethod
+    def from_raw_columns(cls, raw_columns, quote_fields):
+        """Returns the columns of lists of raw values, latest first, given the quote fields.
+
+        The raw values are keyed by query column and are converted straight
+        into the arrays without building a row for each date.
+
+        """
+        # Put the values in date order, they are usually latest first, in which
+        # case the arrays are reversed once converted
+        reverse = True
+        for column, (field_name, field_type) in quote_fields.items():
+            if field_name == 'Date':
+                dates = raw_columns[column]
+                if dates != sorted(dates, reverse=True) or len(set(dates)) != len(dates):
+                    reverse = False
+                    if dates != sorted(dates):
+                        order = sorted(range(len(dates)), key=dates.__getitem__)
+                        raw_columns = dict(
+                            (key, [values[i] for i in order]) for key, values in raw_columns.items()
+                        )
+                break
+
+        arrays = {}
+        for column, (field_name, field_type) in quote_fields.items():
+            typecode, convert = get_column_converter(field_name, field_type)
+            values = array.array(typecode, convert(raw_columns[column]))
+            if reverse:
+                values.reverse()
+
+            # Share the memory of the array with NumPy
+            if numpy is not None:
+                values = numpy.frombuffer(values, dtype=values.typecode) if values else \
+                    numpy.array([], dtype=values.typecode)
+
+            arrays[field_name] = values
+
+        return cls(arrays)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def __getitem__(self, key):
+        """Returns the column of a field name, or the columns of a slice of dates."""
+        if isinstance(key, slice):
+            return self.between(key.start, key.stop)
+
+        return self.get_column(key)
+
+    def keys(self):
+        """Returns the field names of the columns."""
+        return self.arrays.keys()
+
+    def get_column(self, name):
+        """Returns the values of a field, without copying them."""
+        try:
+            values = self.arrays[name]
+        except KeyError:
+            raise Exception('Field - %s is not in the columns' % (name, ))
+
+        if numpy is not None:
+            return values[self.start:self.stop]
+
+        return ArrayView(values, self.start, self.stop)
+
+    @property
+    def dates(self):
+        """Returns the list of dates of the rows."""
+        return [date.fromordinal(int(ordinal)) for ordinal in self.get_column('Date')]
+
+    @property
+    def nbytes(self):
+        """Returns the number of bytes of array memory used by the rows."""
+        return sum([values.itemsize for values in self.arrays.values()]) * len(self)
+
+    def between(self, start_date=None, end_date=None):
+        """Returns the columns of the rows between two dates (inclusive).
+
+        The dates may be date objects or strings (yyyy-mm-dd format), and
+        either may be None to leave that end open.  The arrays are shared, not
+        copied.
+
+        """
+        if not 'Date' in self.arrays:
+            raise Exception('Columns without dates cannot be sliced by date')
+
+        ordinals = self.arrays['Date']
+        start, stop = self.start, self.stop
+
+        if isinstance(start_date, basestring):
+            start_date = parse_date(start_date)
+        if isinstance(end_date, basestring):
+            end_date = parse_date(end_date)
+
+        if numpy is not None:
+            window = ordinals[start:stop]
+            if start_date is not None:
+                start = self.start + int(numpy.searchsorted(window, start_date.toordinal(), 'left'))
+            if end_date is not None:
+                stop = self.start + int(numpy.searchsorted(window, end_date.toordinal(), 'right'))
+        else:
+            if start_date is not None:
+                start = bisect_left(ordinals, start_date.toordinal(), self.start, self.stop)
+            if end_date is not None:
+                stop = bisect_right(ordinals, end_date.toordinal(), self.start, self.stop)
+
+        return HistoryColumns(self.arrays, start, max(start, stop))
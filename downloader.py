@@ -0,0 +1,169 @@
+import Queue
+import time
+
+from multiprocessing.pool import ThreadPool
+
+from quote import YahooCSVQuoteHistory
+
+__all__ = ['DOWNLOAD_WORKERS', 'DOWNLOAD_TIMEOUT', 'DOWNLOAD_RETRIES', 'DOWNLOAD_POLL_INTERVAL',
+           'HistoryDownloader']
+
+# Number of histories downloaded at the same time
+DOWNLOAD_WORKERS = 8
+
+# Number of seconds a job may run (including retries) before it is abandoned
+DOWNLOAD_TIMEOUT = 120
+
+# Number of times a failed job is retried
+DOWNLOAD_RETRIES = 2
+
+# Number of seconds between checks for timed out jobs
+DOWNLOAD_POLL_INTERVAL = 0.5
+
+
+class HistoryDownloader(object):
+    """Downloads the quote histories of many stocks on a bounded pool of threads.
+
+    Each job is a tuple of (code, exchange, date_range).  A deferred history
+    quote object is created for each job and processed by one of the worker
+    threads.
+
+    """
+    def __init__(self, jobs, model=YahooCSVQuoteHistory, fields='*',
+            workers=DOWNLOAD_WORKERS, timeout=DOWNLOAD_TIMEOUT,
+            retries=DOWNLOAD_RETRIES, progress=None):
+        """Initialise the downloader given the list of jobs.
+
+        Optionally given the history quote model, the fields to fetch, the
+        number of worker threads, the per-job timeout in seconds, the number of
+        retries of a failed job and a callable that is given the downloader
+        after each job completes.
+
+        """
+        self.jobs = list(jobs)
+        self.model = model
+        self.fields = fields
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.progress = progress
+
+        # Progress counters
+        self.completed = 0
+        self.failed = 0
+        self.start_time = None
+
+    @property
+    def elapsed(self):
+        """Returns the number of seconds since the download started."""
+        if self.start_time is None:
+            return 0.0
+        return time.time() - self.start_time
+
+    @property
+    def throughput(self):
+        """Returns the number of jobs finished per second."""
+        elapsed = self.elapsed
+        if elapsed == 0:
+            return 0.0
+        return (self.completed + self.failed) / elapsed
+
+    def report(self):
+        """Returns a one line summary of the download progress."""
+        finished = self.completed + self.failed
+        throughput = self.throughput
+
+        if throughput > 0:
+            remaining = '%.1fs remaining' % ((len(self.jobs) - finished) / throughput, )
+        else:
+            remaining = 'unknown time remaining'
+
+        return '%(finished)s/%(total)s jobs finished (%(failed)s failed) ' \
+            'in %(elapsed).1fs, %(throughput).2f jobs/s, %(remaining)s' \
+            % {
+                'finished': finished, 'total': len(self.jobs), 'failed': self.failed,
+                'elapsed': self.elapsed, 'throughput': throughput, 'remaining': remaining,
+            }
+
+    def download(self, job):
+        """Download the history for a single job, retrying if it fails.
+
+        Returns the processed history quote object or raises the exception of
+        the last attempt.
+
+        """
+        code, exchange, date_range = job
+
+        for attempt in range(self.retries + 1):
+            history = self.model(code, exchange, date_range, fields=self.fields, defer=True)
+            try:
+                history.process_quote()
+                return history
+            except Exception, e:
+                error = e
+
+        raise error
+
+    def run(self):
+        """Returns a generator of (job, history, error) tuples as jobs finish.
+
+        The history is None if the job failed, otherwise the error is None.  A
+        job that runs longer than the timeout is reported as failed; its thread
+        cannot be interrupted so any late result is discarded.
+
+        """
+        if not self.jobs:
+            return
+
+        results = Queue.Queue()
+        started = {}
+
+        def work(index):
+            started[index] = time.time()
+            try:
+                results.put((index, self.download(self.jobs[index]), None))
+            except Exception, e:
+                results.put((index, None, e))
+
+        self.completed = 0
+        self.failed = 0
+        self.start_time = time.time()
+
+        # The worker threads are daemons, so abandoned jobs do not block exit
+        pool = ThreadPool(min(self.workers, len(self.jobs)))
+        for index in range(len(self.jobs)):
+            pool.apply_async(work, (index, ))
+        pool.close()
+
+        pending = set(range(len(self.jobs)))
+
+        while pending:
+            finished = []
+
+            try:
+                finished.append(results.get(timeout=DOWNLOAD_POLL_INTERVAL))
+            except Queue.Empty:
+                pass
+
+            # Abandon jobs that have run longer than the timeout
+            now = time.time()
+            for index in pending:
+                if started.has_key(index) and now - started[index] > self.timeout:
+                    error = Exception('Job timed out after %s seconds' % (self.timeout, ))
+                    finished.append((index, None, error))
+
+            for index, history, error in finished:
+                # Ignore late results of abandoned jobs
+                if not index in pending:
+                    continue
+                pending.remove(index)
+
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+                if self.progress is not None:
+                    self.progress(self)
+
+                yield self.jobs[index], history, error
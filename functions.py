@@ -1,9 +1,101 @@
+# datetime.strptime imports _strptime lazily, which fails when the first calls
+# are made from several threads at once, so import it up front
+import _strptime
+import os
 import re
 
+from contextlib import contextmanager
 from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_EVEN
+from functools import wraps
 
 LOOKBACK_DAYS = 60
 
+# Maximum number of parsed values remembered by each memoised parser
+PARSE_CACHE_SIZE = 4096
+
+# Number of decimal places held by scaled integer prices (ten-thousandths)
+PRICE_PLACES = 4
+PRICE_SCALE = 10 ** PRICE_PLACES
+
+# Patterns of the date and time formats parsed by parse_date and parse_time
+DATE_RE = re.compile(
+    r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})$'
+)
+TIME_RE = re.compile(
+    r'(?P<hour>\d{1,2}):(?P<minute>\d{1,2})'
+    r'(?::(?P<second>\d{1,2})(?:\.(?P<microsecond>\d{1,6})\d{0,6})?)?'
+)
+
+def memoize(max_size=PARSE_CACHE_SIZE):
+    """Returns a decorator that remembers the results of a function of one argument.
+
+    The results are forgotten all at once when max_size are held, so memory
+    use is bounded.  Exceptions are not remembered.  The undecorated function
+    is the `uncached` attribute of the decorated one.
+
+    """
+    def decorator(func):
+        cache = {}
+
+        @wraps(func)
+        def wrapper(value):
+            try:
+                return cache[value]
+            except KeyError:
+                pass
+
+            result = func(value)
+
+            if len(cache) >= max_size:
+                cache.clear()
+            cache[value] = result
+
+            return result
+
+        wrapper.cache = cache
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+def chunks(sequence, size):
+    """Returns a generator of successive lists of at most size elements.
+
+    The last list may be shorter than size if the sequence does not divide
+    evenly.
+
+    """
+    if size < 1:
+        raise ValueError('Chunk size must be a positive integer.')
+
+    sequence = list(sequence)
+
+    for i in range(0, len(sequence), size):
+        yield sequence[i:i + size]
+
+@contextmanager
+def atomic_write(path, mode='wb', opener=open):
+    """Returns a context manager of a file that replaces the file at a path
+    once it has been written.
+
+    The file is written to a temporary path first so a failure cannot corrupt
+    the file at the path.  Optionally given the function to open the temporary
+    file with (default is open), e.g. gzip.open.
+
+    """
+    temp_path = '%s.tmp' % (path, )
+
+    try:
+        with opener(temp_path, mode) as f:
+            yield f
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    os.rename(temp_path, path)
+
 def date_range_generator(start_date, end_date):
     """Returns a generator of the dates bound by the given start and end date.
 
@@ -28,16 +120,88 @@ def date_range_generator(start_date, end_date):
         if start_date > end_date:
             break
 
+def merge_date_ranges(date_ranges):
+    """Returns a sorted list of date ranges with overlapping and adjacent ranges merged.
+
+    Each date range is a list of the start and end date objects.
+
+    """
+    output = []
+
+    for start_date, end_date in sorted(date_ranges):
+        # Extend the previous range if this one overlaps or follows on from it
+        if output and start_date <= output[-1][1] + timedelta(days=1):
+            output[-1][1] = max(output[-1][1], end_date)
+        else:
+            output.append([start_date, end_date])
+
+    return output
+
+def missing_date_ranges(date_range, covered_ranges):
+    """Returns the sub-ranges of a date range that are not within any covered range.
+
+    The date range and covered ranges are lists of the start and end date
+    objects.  The sub-ranges are returned in date order.
+
+    """
+    output = []
+
+    for day in date_range_generator(date_range[0], date_range[1]):
+        # Skip days that are covered
+        if any(start_date <= day <= end_date for start_date, end_date in covered_ranges):
+            continue
+
+        # Extend the previous sub-range if it ended yesterday
+        if output and output[-1][1] == day - timedelta(days=1):
+            output[-1][1] = day
+        else:
+            output.append([day, day])
+
+    return output
+
+def split_date_range(date_range, days, min_days=1):
+    """Returns a list of consecutive date ranges of at most days days that cover a date range.
+
+    The date range is a list of the start and end date objects.  If days is None
+    the date range is not split.  A last date range of fewer than min_days days
+    is merged into the one before it.
+
+    """
+    start_date, end_date = date_range
+
+    if days is None:
+        return [[start_date, end_date]]
+
+    if days < 1:
+        raise ValueError('Days must be a positive integer.')
+
+    output = []
+
+    while start_date <= end_date:
+        chunk_end_date = min(start_date + timedelta(days=days - 1), end_date)
+        output.append([start_date, chunk_end_date])
+        start_date = chunk_end_date + timedelta(days=1)
+
+    if len(output) > 1 and (output[-1][1] - output[-1][0]).days + 1 < min_days:
+        last_start_date, last_end_date = output.pop()
+        output[-1][1] = last_end_date
+
+    return output
+
 def parse_date(value):
     """Parses a string and returns a datetime.date object.
 
+    Dates in the %Y-%m-%d format are sliced directly, other dates are matched
+    with a regular expression.
+
     From django.utils.dateparse.
 
     """
-    date_re = re.compile(
-        r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})$'
-    )
-    match = date_re.match(value)
+    if len(value) == 10 and value[4] == '-' and value[7] == '-' \
+            and (value[:4] + value[5:7] + value[8:]).isdigit():
+        return date(int(value[:4]), int(value[5:7]), int(value[8:]))
+
+    match = DATE_RE.match(value)
     if match:
         return date(**dict((k, int(v)) for k, v in match.groupdict().items()))
 
@@ -49,11 +213,7 @@ def parse_time(value):
     From django.utils.dateparse.
 
     """
-    time_re = re.compile(
-        r'(?P<hour>\d{1,2}):(?P<minute>\d{1,2})'
-        r'(?::(?P<second>\d{1,2})(?:\.(?P<microsecond>\d{1,6})\d{0,6})?)?'
-    )
-    match = time_re.match(value)
+    match = TIME_RE.match(value)
     if match:
         kw = match.groupdict()
         if kw['microsecond']:
@@ -61,6 +221,78 @@ def parse_time(value):
         kw = dict((k, int(v)) for k, v in match.groupdict().items() if v is not None)
         return time(**kw)
 
+@memoize()
+def parse_us_date(value):
+    """Parses a string in the %m/%d/%Y format and returns a datetime.date.
+
+    Raises a ValueError if the string is not in the format.
+
+    """
+    parts = value.split('/')
+
+    if len(parts) != 3 or not all([part.isdigit() for part in parts]) \
+            or len(parts[0]) > 2 or len(parts[1]) > 2 or len(parts[2]) != 4:
+        raise ValueError('time data %r does not match format %r' % (value, '%m/%d/%Y'))
+
+    return date(int(parts[2]), int(parts[0]), int(parts[1]))
+
+@memoize()
+def parse_us_time(value):
+    """Parses a string in the %I:%M%p format (e.g. 4:10pm) and returns a datetime.time.
+
+    Raises a ValueError if the string is not in the format.
+
+    """
+    clock, meridiem = value[:-2], value[-2:].lower()
+    hour, sep, minute = clock.partition(':')
+
+    if not sep or meridiem not in ('am', 'pm') or not hour.isdigit() or not minute.isdigit() \
+            or len(hour) > 2 or len(minute) != 2:
+        raise ValueError('time data %r does not match format %r' % (value, '%I:%M%p'))
+
+    hour = int(hour)
+    if not 1 <= hour <= 12:
+        raise ValueError('time data %r does not match format %r' % (value, '%I:%M%p'))
+
+    # 12am is midnight and 12pm is midday
+    hour = hour % 12
+    if meridiem == 'pm':
+        hour += 12
+
+    return time(hour, int(minute))
+
+def parse_scaled(value):
+    """Parses a decimal string and returns it as an integer of ten-thousandths.
+
+    Plain decimal strings are converted exactly without a Decimal.  Any other
+    string is converted with Decimal, rounding half to even if it has more
+    than PRICE_PLACES decimal places.
+
+    """
+    digits = value
+    sign = 1
+    if digits[:1] == '-':
+        sign = -1
+        digits = digits[1:]
+
+    whole, sep, fraction = digits.partition('.')
+
+    if (whole + fraction).isdigit() and len(fraction) <= PRICE_PLACES:
+        return sign * (int(whole or '0') * PRICE_SCALE + int(fraction.ljust(PRICE_PLACES, '0')))
+
+    return int(Decimal(value).scaleb(PRICE_PLACES).to_integral_value(ROUND_HALF_EVEN))
+
+def parse_volume(value):
+    """Parses a string and returns it as an integer, such as a volume."""
+    try:
+        return int(value)
+    except ValueError:
+        return int(Decimal(value))
+
+def scaled_to_decimal(value):
+    """Returns an integer of ten-thousandths as the exact Decimal it represents."""
+    return Decimal(value).scaleb(-PRICE_PLACES)
+
 def validate_date_range(date_range):
     """Validate a date range.
 
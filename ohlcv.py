@@ -0,0 +1,293 @@
+import mmap
+import os
+import struct
+import threading
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from columns import HistoryColumns
+from functions import PRICE_PLACES, atomic_write, parse_date, parse_scaled, parse_volume
+from records import get_slot_name, make_record_class
+
+__all__ = ['OHLCV_FIELDS', 'OHLCV_MAGIC', 'OHLCV_VERSION', 'OHLCV_HEADER', 'OHLCV_RECORD',
+           'OHLCV_DATE', 'get_scaled_price', 'get_bar', 'get_column_bars', 'get_bars',
+           'DateOrdinals', 'OHLCVFile', 'OHLCVStore']
+
+# Fields of a daily bar after the date, in the order they are stored
+OHLCV_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume', 'Adj Close')
+
+# File header of the magic string, format version and decimal places of prices
+OHLCV_MAGIC = 'PYQOHLCV'
+OHLCV_VERSION = 1
+OHLCV_HEADER = struct.Struct('<8sHH')
+
+# Each bar is the date ordinal followed by the fields as scaled integers
+OHLCV_RECORD = struct.Struct('<i%dq' % (len(OHLCV_FIELDS), ))
+OHLCV_DATE = struct.Struct('<i')
+
+
+def get_scaled_price(value):
+    """Returns a price in any numeric mode as an integer of ten-thousandths."""
+    if isinstance(value, (int, long)):
+        return value
+    return parse_scaled(str(value))
+
+
+def get_bar(row):
+    """Returns the date ordinal and scaled fields of a parsed history row as a tuple."""
+    day = row['Date']
+    if isinstance(day, basestring):
+        day = parse_date(day)
+
+    values = [day.toordinal()]
+    for field in OHLCV_FIELDS:
+        try:
+            value = row[field]
+        except KeyError:
+            raise Exception('Field - %s is needed to store a history' % (field, ))
+
+        if field == 'Volume':
+            values.append(parse_volume(str(value)))
+        else:
+            values.append(get_scaled_price(value))
+
+    return tuple(values)
+
+
+def get_column_bars(columns):
+    """Returns the date ordinals and scaled fields of history columns as a list of tuples."""
+    for field in ('Date', ) + OHLCV_FIELDS:
+        if not field in columns:
+            raise Exception('Field - %s is needed to store a history' % (field, ))
+
+    values = [columns.get_column('Date').tolist()]
+    for field in OHLCV_FIELDS:
+        column = columns.get_column(field).tolist()
+
+        if field == 'Volume':
+            values.append([int(value) for value in column])
+        else:
+            values.append([get_scaled_price(value) for value in column])
+
+    return zip(*values)
+
+
+def get_bars(history):
+    """Returns the bars of the parsed rows or columns of a history as a list of tuples."""
+    if isinstance(history, HistoryColumns):
+        return get_column_bars(history)
+
+    return [get_bar(row) for row in history]
+
+
+class DateOrdinals(object):
+    """Sequence of the date ordinals of the bars in a file, read from the map."""
+    def __init__(self, ohlcv_file):
+        self.ohlcv_file = ohlcv_file
+
+    def __len__(self):
+        return len(self.ohlcv_file)
+
+    def __getitem__(self, index):
+        return OHLCV_DATE.unpack_from(self.ohlcv_file.map, self.ohlcv_file.get_offset(index))[0]
+
+
+class OHLCVFile(object):
+    """Read-only daily bars of a stock held in a memory mapped binary file.
+
+    The file is a fixed size header followed by a fixed size record per day,
+    oldest first.  Each record holds the date ordinal and the open, high, low,
+    close, volume and adjusted close, with prices as integers of
+    ten-thousandths.  Opening a file maps it rather than reading it, and the
+    bars of a date are found by a binary search of the records, so only the
+    pages that are read are loaded.
+
+    Bars are returned as records with the fields of the scaled numeric mode.
+
+    """
+    record_class = make_record_class(('Date', ) + OHLCV_FIELDS)
+
+    def __init__(self, path):
+        """Initialise the file given its path."""
+        self.path = path
+
+        # An empty file cannot be mapped, so check the size first
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < OHLCV_HEADER.size:
+                raise Exception('File - %s is not an OHLCV file' % (path, ))
+
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, price_places = OHLCV_HEADER.unpack_from(self.map, 0)
+
+        if magic != OHLCV_MAGIC or version != OHLCV_VERSION:
+            self.close()
+            raise Exception('File - %s is not an OHLCV file' % (path, ))
+        if price_places != PRICE_PLACES:
+            self.close()
+            raise Exception('File - %s has prices with %s decimal places' % (path, price_places))
+
+        self.count = (len(self.map) - OHLCV_HEADER.size) // OHLCV_RECORD.size
+        self.ordinals = DateOrdinals(self)
+
+    @staticmethod
+    def write(path, history):
+        """Write the parsed rows or columns of a history to a file, replacing any
+        file at the path.
+
+        The rows may be in any order and numeric mode, and need every field.
+
+        """
+        OHLCVFile.write_bars(path, get_bars(history))
+
+    @staticmethod
+    def write_bars(path, bars):
+        """Write bars (tuples of the date ordinal and scaled fields) to a file,
+        replacing any file at the path.
+
+        Later bars of a date replace earlier ones.
+
+        """
+        bars = dict((bar[0], bar) for bar in bars)
+
+        with atomic_write(path) as f:
+            f.write(OHLCV_HEADER.pack(OHLCV_MAGIC, OHLCV_VERSION, PRICE_PLACES))
+            f.write(''.join([OHLCV_RECORD.pack(*bars[ordinal]) for ordinal in sorted(bars.keys())]))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """Returns the bar at an index, oldest first."""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('OHLCV file index out of range')
+
+        return self.get_record(index)
+
+    def __iter__(self):
+        for i in xrange(self.count):
+            yield self.get_record(i)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Unmap the file."""
+        self.map.close()
+
+    def get_offset(self, index):
+        """Returns the offset of the record at an index in the file."""
+        return OHLCV_HEADER.size + index * OHLCV_RECORD.size
+
+    def get_values(self, index):
+        """Returns the date ordinal and scaled fields of the record at an index."""
+        return OHLCV_RECORD.unpack_from(self.map, self.get_offset(index))
+
+    def get_record(self, index):
+        """Returns the record at an index as a bar."""
+        values = self.get_values(index)
+
+        record = self.record_class()
+        record.Date = date.fromordinal(values[0])
+        for field, value in zip(OHLCV_FIELDS, values[1:]):
+            setattr(record, get_slot_name(field), value)
+
+        return record
+
+    @property
+    def start_date(self):
+        """Returns the date of the first bar, or None if there are no bars."""
+        return self.count and date.fromordinal(self.ordinals[0]) or None
+
+    @property
+    def end_date(self):
+        """Returns the date of the last bar, or None if there are no bars."""
+        return self.count and date.fromordinal(self.ordinals[self.count - 1]) or None
+
+    def get(self, day):
+        """Returns the bar of a date (a date object or yyyy-mm-dd string), or None."""
+        if isinstance(day, basestring):
+            day = parse_date(day)
+
+        ordinal = day.toordinal()
+        index = bisect_left(self.ordinals, ordinal)
+
+        if index < self.count and self.ordinals[index] == ordinal:
+            return self.get_record(index)
+        return None
+
+    def between(self, start_date=None, end_date=None):
+        """Returns the bars between two dates (inclusive), latest first like the
+        history models.
+
+        The dates may be date objects or strings (yyyy-mm-dd format), and
+        either may be None to leave that end open.
+
+        """
+        start, stop = 0, self.count
+
+        if isinstance(start_date, basestring):
+            start_date = parse_date(start_date)
+        if isinstance(end_date, basestring):
+            end_date = parse_date(end_date)
+
+        if start_date is not None:
+            start = bisect_left(self.ordinals, start_date.toordinal())
+        if end_date is not None:
+            stop = bisect_right(self.ordinals, end_date.toordinal())
+
+        return [self.get_record(i) for i in xrange(stop - 1, start - 1, -1)]
+
+
+class OHLCVStore(object):
+    """Directory of OHLCV files, one per stock.
+
+    Histories saved to the store are merged with the bars it already holds,
+    so a store can be kept up to date by saving the latest days.
+
+    """
+    def __init__(self, directory):
+        """Initialise the store given the directory to keep the files in."""
+        self.directory = directory
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.lock = threading.Lock()
+
+    def get_path(self, code, exchange):
+        """Returns the path of the file that holds the bars of a stock."""
+        return os.path.join(self.directory, '%s.%s.ohlcv' % (code, exchange))
+
+    def save(self, quote):
+        """Save the parsed rows or columns of a history quote, merged with the bars
+        already held.
+
+        """
+        if quote.quote is None:
+            raise Exception('Quote not fetched.')
+
+        path = self.get_path(quote.code, quote.exchange)
+
+        with self.lock:
+            bars = []
+            if os.path.exists(path):
+                with OHLCVFile(path) as ohlcv_file:
+                    bars = [ohlcv_file.get_values(i) for i in xrange(len(ohlcv_file))]
+
+            OHLCVFile.write_bars(path, bars + get_bars(quote.quote))
+
+    def open(self, code, exchange):
+        """Returns the OHLCV file of a stock, or None if the store has no bars for it."""
+        path = self.get_path(code, exchange)
+
+        if not os.path.exists(path):
+            return None
+
+        return OHLCVFile(path)
@@ -1,28 +1,388 @@
 import csv
-import pytz
 import re
-import urllib2
 import yql
 
 from datetime import datetime
 from decimal import Decimal
+from functools import partial
+from itertools import izip
+from multiprocessing.pool import ThreadPool
 
-from functions import parse_date, parse_time, validate_date_range
+from columns import HistoryColumns
+from functions import chunks, parse_date, parse_scaled, parse_time, parse_us_date, \
+    parse_us_time, parse_volume, scaled_to_decimal, split_date_range, validate_date_range
+from records import make_lazy_record_class, make_record_converter
+from timezones import get_converter
+from transport import HTTPTransport, TransportError
 
 TIME_ZONE = 'Australia/Sydney'
 
+# Timezone of the Yahoo latest quote dates and times
+YAHOO_TIME_ZONE = 'US/Eastern'
+
+# Urls of the Yahoo provider endpoints (None is the YQL library default)
+YAHOO_URLS = {
+    'csv': 'http://finance.yahoo.com/d/quotes.csv',
+    'ichart': 'http://ichart.yahoo.com/table.csv',
+    'yql': None,
+}
+
+# Urls of the provider endpoints used by the quote models, see set_provider_url
+provider_urls = dict(YAHOO_URLS)
+
+# Numeric modes of the quote models, prices and volumes are either Decimals, or
+# integers with prices scaled to ten-thousandths
+NUMERIC_DECIMAL = 'decimal'
+NUMERIC_SCALED = 'scaled'
+
+# Maximum number of symbols the Yahoo CSV API accepts in a single request
+CSV_SYMBOL_LIMIT = 200
+
+# Yahoo CSV query symbols are usually a letter followed by any digits (e.g. 's',
+# 'l1', 'c10'), and symbols of more letters are matched from the known columns
+CSV_SYMBOL_RE = re.compile(r'[a-z]\d*')
+
+# Environment required to query the YQL community tables
+YQL_ENV = 'http://www.datatables.org/alltables.env'
+
+# Column of the YQL quotes table that reports invalid symbols
+YQL_ERROR_COLUMN = 'ErrorIndicationreturnedforsymbolchangedinvalid'
+
+# Maximum number of symbols in a single YQL `symbol in (...)` query
+YQL_SYMBOL_LIMIT = 100
+
+# Number of YQL queries run at the same time by batched fetches
+YQL_CONCURRENCY = 4
+
+# Number of quotes processed at the same time by gather_quotes
+QUOTE_CONCURRENCY = 16
+
+# Number of days of history fetched by each request for a long date range, and
+# the fewest days fetched by a last request (shorter ranges join the one before)
+HISTORY_CHUNK_DAYS = 365
+HISTORY_CHUNK_MIN_DAYS = 7
+
+# Number of history chunks fetched at the same time
+HISTORY_CONCURRENCY = 4
+
+# Columns of the Yahoo CSV API history responses, in the order they are returned
+HISTORY_CSV_COLUMNS = ('Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Adj Close')
+HISTORY_CSV_HEADER = ','.join(HISTORY_CSV_COLUMNS)
+
+
+def raise_batch_errors(quotes):
+    """Raise an Exception for the errors of the quotes of a batch, if there are any."""
+    errors = [
+        '%s.%s: %s' % (quote.code, quote.exchange, quote.error)
+        for quote in quotes if quote.error is not None
+    ]
+
+    if errors:
+        raise Exception('Quotes could not be processed - %s' % ('; '.join(errors), ))
+
+
+def get_yql():
+    """Returns a YQL query object that sends queries to the YQL provider url."""
+    y = yql.Public()
+
+    if provider_urls['yql'] is not None:
+        y.uri = provider_urls['yql']
+
+    return y
+
+
+def set_provider_url(base_url=None):
+    """Point every quote model at a provider stand-in server given its base url.
+
+    The Yahoo provider urls are restored if no base url is given.
+
+    """
+    if base_url is None:
+        provider_urls.update(YAHOO_URLS)
+        return
+
+    base_url = base_url.rstrip('/')
+
+    provider_urls.update({
+        'csv': '%s/d/quotes.csv' % (base_url, ),
+        'ichart': '%s/table.csv' % (base_url, ),
+        'yql': '%s/v1/public/yql' % (base_url, ),
+    })
+
+
+def make_row_converter(quote_fields):
+    """Returns a function that converts a raw row into a dictionary of useful data.
+
+    The function is generated for the quote fields, so each row is converted
+    with a single dictionary display instead of a loop over the columns.  Rows
+    missing a column fall back to converting only the columns they have.
+
+    """
+    names = {}
+    items = []
+    checks = []
+
+    for i, (column, (field_name, field_type)) in enumerate(sorted(quote_fields.items())):
+        names['_%d' % (i, )] = field_type
+        items.append('%r: _%d(row[%r])' % (field_name, i, column))
+        checks.append(
+            '    if %(column)r in row:\n'
+            '        output[%(field_name)r] = _%(i)d(row[%(column)r])\n'
+            % {'column': column, 'field_name': field_name, 'i': i}
+        )
+
+    source = 'def convert_row(row, %(args)s):\n' \
+        '    try:\n' \
+        '        return {%(items)s}\n' \
+        '    except KeyError:\n' \
+        '        pass\n' \
+        '    output = {}\n' \
+        '%(checks)s' \
+        '    return output\n' \
+        % {
+            'args': ', '.join(['%s=%s' % (name, name) for name in sorted(names)]),
+            'items': ', '.join(items),
+            'checks': ''.join(checks),
+        }
+
+    exec source in names
+
+    return names['convert_row']
+
+
+def get_row_converter(quote_fields):
+    """Returns the row converter of the quote fields, cached if they are a field set."""
+    if isinstance(quote_fields, FieldSet):
+        return quote_fields.row_converter
+    return make_row_converter(quote_fields)
+
+
+def get_record_converter(quote_fields):
+    """Returns the record converter of the quote fields, cached if they are a field set."""
+    if isinstance(quote_fields, FieldSet):
+        return quote_fields.record_converter
+    return make_record_converter(quote_fields)
+
+
+def get_lazy_record_class(quote_fields):
+    """Returns the lazy record class of the quote fields, cached if they are a field set."""
+    if isinstance(quote_fields, FieldSet):
+        return quote_fields.lazy_record_class
+    return make_lazy_record_class(quote_fields)
+
+
+def get_csv_symbol_re(symbols):
+    """Returns a compiled pattern that splits a CSV API query string into the
+    given symbols, which may have any number of letters, or CSV_SYMBOL_RE.
+
+    Longer symbols are matched first so they are never split into shorter ones,
+    and a symbol followed by more digits is a different symbol (e.g. 'n4').
+
+    """
+    symbols = sorted(symbols, key=len, reverse=True)
+    return re.compile('|'.join(
+        [r'%s(?!\d)' % (re.escape(symbol), ) for symbol in symbols] + [CSV_SYMBOL_RE.pattern]
+    ))
+
+
+def has_raw_rows(raw_quote):
+    """Returns whether a raw history, a list of raw rows or a dictionary of raw
+    values per column, has any rows.
+
+    """
+    if isinstance(raw_quote, dict):
+        return any(raw_quote.values())
+    return bool(raw_quote)
+
+
+def get_raw_rows(raw_quote):
+    """Returns the list of raw rows of a raw history, which may be a dictionary
+    of raw values per column.
+
+    """
+    if not isinstance(raw_quote, dict):
+        return raw_quote
+
+    columns = raw_quote.keys()
+    return [dict(izip(columns, values)) for values in izip(*[raw_quote[column] for column in columns])]
+
+
+class FieldSet(dict):
+    """Immutable dictionary of query columns and their output field names and
+    types for a set of requested fields.
+
+    The field set also holds the requested fields and the query columns in the
+    order they were requested.  In the scaled numeric mode the Decimal fields
+    are parsed as scaled integer prices, or integers for the volume.
+
+    """
+    def __init__(self, fields, columns, known_fields, numeric_mode=NUMERIC_DECIMAL):
+        """Initialise the field set given the requested fields ('*' for all),
+        the query columns and the known fields of the quote model.
+
+        Optionally given the numeric mode (default is Decimal).
+
+        """
+        items = []
+        for column in columns:
+            field_name, field_type = known_fields[column]
+
+            if numeric_mode == NUMERIC_SCALED and field_type is Decimal:
+                field_type = field_name == 'Volume' and parse_volume or parse_scaled
+
+            items.append((column, (field_name, field_type)))
+
+        dict.__init__(self, items)
+        self.fields = fields
+        self.columns = tuple(columns)
+        self.numeric_mode = numeric_mode
+
+        self._row_converter = None
+        self._record_converter = None
+        self._lazy_record_class = None
+        self._csv_spec = None
+
+    @property
+    def row_converter(self):
+        """Returns the function that converts a raw row of the field set, generated once."""
+        if self._row_converter is None:
+            self._row_converter = make_row_converter(self)
+        return self._row_converter
+
+    @property
+    def record_converter(self):
+        """Returns the function that converts a raw quote of the field set into a
+        record, generated once.
+
+        """
+        if self._record_converter is None:
+            self._record_converter = make_record_converter(self)
+        return self._record_converter
+
+    @property
+    def lazy_record_class(self):
+        """Returns the record class that parses the fields of a raw quote of the
+        field set when they are read, generated once.
+
+        """
+        if self._lazy_record_class is None:
+            self._lazy_record_class = make_lazy_record_class(self)
+        return self._lazy_record_class
+
+    @property
+    def csv_spec(self):
+        """Returns the compiled CSV API query of the field set, built once."""
+        if self._csv_spec is None:
+            self._csv_spec = CSVSpec(self.columns)
+        return self._csv_spec
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('Field sets cannot be changed')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+
+class CSVSpec(object):
+    """Immutable compiled query of the CSV API for a tuple of query columns.
+
+    The spec holds the `f=` query string and the query columns in the order
+    the API returns them, so responses are read without splitting the query
+    string back into symbols.  The fields are converted by the row converter
+    of the field set.
+
+    """
+    __slots__ = ('columns', 'query')
+
+    def __init__(self, columns):
+        """Initialise the spec given the query columns."""
+        object.__setattr__(self, 'columns', tuple(columns))
+        object.__setattr__(self, 'query', ''.join(self.columns))
+
+    def __setattr__(self, name, value):
+        raise TypeError('CSV specs cannot be changed')
+
+    __delattr__ = __setattr__
+
+    def __repr__(self):
+        return 'CSVSpec(%r)' % (self.query, )
+
+    def read(self, body):
+        """Read a CSV API response body into a list of raw quote dictionaries."""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in csv.reader(body.splitlines()) if row]
+
+
+class QuoteMeta(type):
+    """Metaclass of the quote models that compiles the known fields of each model
+    into lookup tables once, when the class is created.
+
+    """
+    def __init__(cls, name, bases, attrs):
+        super(QuoteMeta, cls).__init__(name, bases, attrs)
+
+        known_fields = getattr(cls, '_known_fields', {})
+
+        # Query columns keyed by output field name
+        cls._field_columns = dict(
+            (field_name, column) for column, (field_name, field_type) in known_fields.items()
+        )
+
+        # Field sets keyed by the tuple of requested fields and numeric mode
+        cls._field_sets = {}
+
+        # Pattern that splits a CSV query string into the known columns
+        cls._symbol_re = get_csv_symbol_re(known_fields.keys())
+
 
 class QuoteBase(object):
     """Abstract quote model that defines standard attributes and methods for
     different models.
 
     """
-    def __init__(self, code, exchange, fields='*', defer=False):
+    __metaclass__ = QuoteMeta
+
+    # Known fields of the quote model, a dictionary of query columns as the
+    # keys, and the output field name and field data type as the values
+    _known_fields = {}
+
+    # Transport shared by every quote that fetches from a HTTP API
+    transport = HTTPTransport()
+
+    # Cache of raw quotes consulted before fetching (default is no cache)
+    cache = None
+
+    # Single flight that shares concurrent fetches of identical quotes
+    # (default is no sharing)
+    single_flight = None
+
+    # Rate limiter of the provider endpoint (default is no limit), e.g. one of
+    # the limiters shared by the models of each endpoint in ratelimit.limiters
+    rate_limiter = None
+
+    # Cassette that records or replays provider requests (default is the provider)
+    cassette = None
+
+    # Number of the fetch being recorded by the cassette
+    cassette_fetch = None
+
+    # Numeric mode of prices and volumes (default is Decimal)
+    numeric_mode = NUMERIC_DECIMAL
+
+    # Parse latest quotes into slotted records rather than dictionaries
+    # (default is dictionaries)
+    records = False
+
+    # Parse each field of a quote the first time it is read rather than when
+    # the quote is processed (default is to parse every field when processed)
+    lazy = False
+
+    def __init__(self, code, exchange, fields='*', defer=False, transport=None):
         """Initialise the quote model given the stock code.
 
         Optionally given a list of field names that contain the required data
-        in the quote (default is all fields '*'), and a boolean to determine
-        whether to process the quote now or at a later time (default is False).
+        in the quote (default is all fields '*'), a boolean to determine
+        whether to process the quote now or at a later time (default is False),
+        and a transport to fetch the quote with (default is the shared one).
 
         """
         # Store the stock code and columns of data to fetch
@@ -30,61 +390,152 @@ class QuoteBase(object):
         self.exchange = exchange
         self.fields = fields
 
+        # Use the given transport instead of the shared one
+        if transport is not None:
+            self.transport = transport
+
         # Default value of quote
         self.quote_fields = {}
         self.raw_quote = None
         self.quote = None
 
+        # Exception of the quote if it could not be processed in a batch
+        self.error = None
+
         # Process quote or defer it for later
         if not defer:
             self.process_quote()
 
-    def get_column_from_field(self, field):
+    @classmethod
+    def get_column_from_field(cls, field):
         """Returns the quote query column name from the field name."""
-        for column_name, (field_name, field_type) in self._known_fields.items():
-            if field == field_name:
-                return column_name
-        raise Exception('Field - %s is not known or unhandled' % (field, ))
+        try:
+            return cls._field_columns[field]
+        except KeyError:
+            raise Exception('Field - %s is not known or unhandled' % (field, ))
 
-    def get_field_from_column(self, column):
+    @classmethod
+    def get_field_from_column(cls, column):
         """Returns the field name from the quote query column name."""
-        for column_name, (field_name, field_type) in self._known_fields.items():
-            if column == column_name:
-                return field_name
-        raise Exception('Column: %s is not known or unhandled' % (column, ))
+        try:
+            return cls._known_fields[column][0]
+        except KeyError:
+            raise Exception('Column: %s is not known or unhandled' % (column, ))
+
+    @classmethod
+    def get_field_set(cls, fields, numeric_mode=None):
+        """Returns the field set of a list of field names ('*' for all fields).
+
+        Optionally given the numeric mode (default is the model's).  Field sets
+        are built once per model, list of fields and numeric mode.  Each field
+        needs it's name and type defined otherwise an Exception is raised.
+
+        """
+        if fields != '*':
+            fields = tuple(fields)
+        if numeric_mode is None:
+            numeric_mode = cls.numeric_mode
+
+        try:
+            return cls._field_sets[(fields, numeric_mode)]
+        except KeyError:
+            pass
+
+        if fields == '*':
+            columns = cls._known_fields.keys()
+        else:
+            columns = [cls.get_column_from_field(field) for field in fields]
+
+        field_set = cls._field_sets[(fields, numeric_mode)] = FieldSet(
+            fields, columns, cls._known_fields, numeric_mode
+        )
+
+        return field_set
 
     def get_quote_fields(self):
         """Returns dictionary of field names and types from given quote column names.
 
-        Each field needs it's name and type defined otherwise an Exception is
-        raised.
+        The dictionary is the field set of the requested fields.
 
         """
-        # If after all fields, just return the ones we have defined
-        if self.fields == '*':
-            return self._known_fields
+        return self.get_field_set(self.fields, self.numeric_mode)
 
-        output = {}
+    def get_cache_key(self):
+        """Returns the key that identifies the quote in a cache."""
+        if self.fields == '*':
+            fields = '*'
+        else:
+            fields = tuple(self.fields)
 
-        # Determine the query columns
-        columns = [self.get_column_from_field(field) for field in self.fields]
+        return (self.__class__, self.code, self.exchange, fields)
 
-        for column in columns:
-            if not self._known_fields.has_key(column):
-                raise NotImplementedError('Column - %s is not known or unhandled' % (column, ))
+    def get_batch_key(self):
+        """Returns the key of the quotes that can be fetched in one batch with
+        this quote, or None if the model cannot fetch quotes in batches.
 
-            # Find field in our known fields
-            data_name, data_type = self._known_fields[column]
+        """
+        if not hasattr(self, 'process_batch'):
+            return None
 
-            # Add the field name and type to the output
-            output[column] = (data_name, data_type)
+        if self.fields == '*':
+            fields = '*'
+        else:
+            fields = tuple(self.fields)
 
-        return output
+        return (self.__class__, self.exchange, fields, self.transport)
 
     def get_raw_quote(self):
         """Method to fetch a raw unparsed quote from a provider."""
         raise NotImplementedError('This method must be defined by subclass.')
 
+    def call_provider(self, fetch, *args, **kwargs):
+        """Call a function that makes a provider request through the rate limiter.
+
+        The first argument is the url or query of the request.  With a
+        cassette, the request is recorded or replayed by the cassette.  A batch
+        request is given the list of quotes it is made for as the `quotes`
+        keyword argument.
+
+        """
+        quotes = kwargs.pop('quotes', None)
+
+        if self.cassette is not None:
+            return self.cassette.call(self, quotes, fetch, *args, **kwargs)
+
+        return self.request_provider(fetch, *args, **kwargs)
+
+    def request_provider(self, fetch, *args, **kwargs):
+        """Call a function that makes a provider request through the rate limiter."""
+        if self.rate_limiter is None:
+            return fetch(*args, **kwargs)
+
+        return self.rate_limiter.call(fetch, *args, **kwargs)
+
+    def fetch_raw_quote(self):
+        """Returns the raw quote from the cache, or from get_raw_quote if not cached.
+
+        With a single flight, identical quotes fetched at the same time share
+        one call of get_raw_quote.  With a cassette, the provider requests of
+        get_raw_quote are recorded together or replayed by the cassette.
+
+        """
+        fetch = self.get_raw_quote
+        if self.cassette is not None:
+            fetch = partial(self.cassette.fetch, self, fetch)
+
+        if self.cache is None and self.single_flight is None:
+            return fetch()
+
+        key = self.get_cache_key()
+
+        if self.single_flight is not None:
+            fetch = partial(self.single_flight.do, key, fetch)
+
+        if self.cache is None:
+            return fetch()
+
+        return self.cache.get(key, fetch)
+
     def parse_quote(self):
         """Method to parse a raw quote from a provider into a standard format."""
         raise NotImplementedError('This method must be defined by subclass.')
@@ -92,14 +543,14 @@ class QuoteBase(object):
     def process_quote(self):
         """Helper method to process a quote.
 
-        Runs the get_quote_fields, get_raw_quote and parse_quote methods.
+        Runs the get_quote_fields, fetch_raw_quote and parse_quote methods.
 
         """
         # Determine the field names and types
         self.quote_fields = self.get_quote_fields()
 
         # Fetch the raw quote
-        self.raw_quote = self.get_raw_quote()
+        self.raw_quote = self.fetch_raw_quote()
 
         # Parse the raw quote with the field names and types
         self.quote = self.parse_quote()
@@ -118,43 +569,76 @@ class LatestQuoteBase(QuoteBase):
             raise Exception('%s not included in original quote.' % (field, ))
         return self.quote[field]
 
+    def get_decimal(self, field):
+        """Returns a price or volume field as a Decimal in any numeric mode."""
+        value = self._get_quote_data(field)
+
+        if self.numeric_mode == NUMERIC_SCALED and field != 'Volume':
+            return scaled_to_decimal(value)
+
+        return Decimal(value)
+
+    # The properties read dictionaries with _get_quote_data, and the slots of
+    # records (falling back to _get_quote_data for its exceptions)
     @property
     def price(self):
         """Returns the closing (last) price."""
-        return self._get_quote_data('Close')
+        if not (self.records or self.lazy):
+            return self._get_quote_data('Close')
+        try:
+            return self.quote.Close
+        except AttributeError:
+            return self._get_quote_data('Close')
 
     @property
     def price_date(self):
         """Returns the last price date."""
-        return self._get_quote_data('Date')
+        if not (self.records or self.lazy):
+            return self._get_quote_data('Date')
+        try:
+            return self.quote.Date
+        except AttributeError:
+            return self._get_quote_data('Date')
 
     @property
     def price_time(self):
         """Returns the last price time."""
-        return self._get_quote_data('Time')
+        if not (self.records or self.lazy):
+            return self._get_quote_data('Time')
+        try:
+            return self.quote.Time
+        except AttributeError:
+            return self._get_quote_data('Time')
 
     @property
     def volume(self):
         """Returns the volume traded."""
-        return self._get_quote_data('Volume')
+        if not (self.records or self.lazy):
+            return self._get_quote_data('Volume')
+        try:
+            return self.quote.Volume
+        except AttributeError:
+            return self._get_quote_data('Volume')
 
     def parse_quote(self):
         """Parse the raw data from a quote into a dictionary of useful data.
 
+        Fields in the raw quote that were not requested are ignored.  With
+        records, the quote is parsed into a record that has a slot for each
+        requested field and can be read like a dictionary.  A lazy quote is a
+        record whose fields are parsed when they are first read.
+
         """
         if self.quote_fields == {} or self.quote_fields is None:
             raise Exception('Quote cannot be parsed without output field tuple.')
 
-        output = {}
+        if self.lazy:
+            return get_lazy_record_class(self.quote_fields)(self.raw_quote)
 
-        for key, value in self.raw_quote.items():
-            # Ignore fields in the raw quote that were not requested
-            if not self.quote_fields.has_key(key):
-                continue
-            field_name, field_type = self.quote_fields[key]
-            output[field_name] = field_type(value)
+        if self.records:
+            return get_record_converter(self.quote_fields)(self.raw_quote)
 
-        return output
+        return get_row_converter(self.quote_fields)(self.raw_quote)
 
 
 class YahooQuoteDateTimeParseMixin():
@@ -173,7 +657,7 @@ class YahooQuoteDateTimeParseMixin():
         """Parses a string and return a datetime.date.
 
         """
-        return datetime.strptime(value, '%m/%d/%Y').date()
+        return parse_us_date(value)
 
     @staticmethod
     def parse_datetime(date_str, time_str):
@@ -183,28 +667,31 @@ class YahooQuoteDateTimeParseMixin():
         the US/Eastern timezone.
 
         """
-        # Match the date and time strings to create a single datetime
-        date_time_str = '%s %s' % (date_str, time_str)
-        date_time_fmt = '%m/%d/%Y %I:%M%p'
+        # Combine the date and time strings to create a single datetime
+        datetime_obj = datetime.combine(parse_us_date(date_str), parse_us_time(time_str))
 
-        datetime_obj = datetime.strptime(date_time_str, date_time_fmt)
+        # Convert the datetime into the desired timezone
+        return get_converter(YAHOO_TIME_ZONE, TIME_ZONE).convert(datetime_obj)
 
-        # Create the timezone used in the quote
-        yql_timezone = pytz.timezone('US/Eastern')
-        yql_datetime = yql_timezone.localize(datetime_obj)
+    @staticmethod
+    def parse_datetimes(date_times):
+        """Parses a list of date/time string pairs and returns a list of date/time
+        objects in the local timezone.
 
-        # Convert the datetime into the desired timezone
-        req_timezone = pytz.timezone(TIME_ZONE)
-        req_datetime = req_timezone.normalize(yql_datetime.astimezone(req_timezone))
+        """
+        datetimes = [
+            datetime.combine(parse_us_date(date_str), parse_us_time(time_str))
+            for date_str, time_str in date_times
+        ]
 
-        return req_datetime
+        return get_converter(YAHOO_TIME_ZONE, TIME_ZONE).convert_many(datetimes)
 
     @staticmethod
     def parse_time(value):
         """Parses a string and return a datetime.time.
 
         """
-        return datetime.strptime(value, '%I:%M%p').time()
+        return parse_us_time(value)
 
 
 class YahooQuote(LatestQuoteBase, YahooQuoteDateTimeParseMixin):
@@ -212,56 +699,54 @@ class YahooQuote(LatestQuoteBase, YahooQuoteDateTimeParseMixin):
     using the YQL library.
 
     """
-    @property
-    def _known_fields(self):
-        """Returns the known fields of this quote model.
-
-        Known fields is a dictionary of YQL query column names as the keys,
-        and the output field name and field data type as the values.
+    # Known fields is a dictionary of YQL query column names as the keys,
+    # and the output field name and field data type as the values
+    _known_fields = {
+        'Name': ('Name', str),
+        'LastTradeDate': ('Date', parse_us_date),
+        'LastTradeTime': ('Time', parse_us_time),
+        'LastTradePriceOnly': ('Close', Decimal),
+        'StockExchange': ('Exchange', str),
+        'Symbol': ('Code', str),
+        'Volume': ('Volume', Decimal),
+    }
+
+    def get_query_columns(self):
+        """Returns the YQL query columns for the requested fields.
+
+        Returns '*' for all fields, otherwise a list of column names that always
+        includes the error column.
 
         """
-        return {
-            'Name': ('Name', str),
-            'LastTradeDate': ('Date', YahooQuote.parse_date),
-            'LastTradeTime': ('Time', YahooQuote.parse_time),
-            'LastTradePriceOnly': ('Close', Decimal),
-            'StockExchange': ('Exchange', str),
-            'Symbol': ('Code', str),
-            'Volume': ('Volume', Decimal),
-        }
+        if self.fields == '*':
+            return '*'
+
+        columns = list(self.get_quote_fields().columns)
+
+        # Ensure the error column in included
+        if not YQL_ERROR_COLUMN in columns:
+            columns.append(YQL_ERROR_COLUMN)
+
+        return columns
 
     def get_raw_quote(self):
         """Get a quote from the Yahoo YQL finance tables and return the result.
 
         """
-        # Error column name - save typing
-        error_column = 'ErrorIndicationreturnedforsymbolchangedinvalid'
-
         # Create query object - must set the environment for community tables
-        y = yql.Public()
-        env = 'http://www.datatables.org/alltables.env'
-
-        # Determine the query columns
-        if self.fields == '*':
-            columns = '*'
-        else:
-            columns = [self.get_column_from_field(field) for field in self.fields]
-
-            # Ensure the error column in included
-            if not error_column in columns:
-                columns.append(error_column)
+        y = get_yql()
 
         # Join as a comma separated string
-        columns = ','.join(columns)
+        columns = ','.join(self.get_query_columns())
 
         # Execute the query and get the response
         query = 'select %(columns)s from yahoo.finance.quotes where symbol = "%(code)s.%(exchange)s"' \
             % {'code': self.code, 'exchange': self.exchange, 'columns': columns, }
-        response = y.execute(query, env=env)
+        response = self.call_provider(y.execute, query, env=YQL_ENV)
 
         # Get the quote and the error field
         quote = response.results['quote']
-        error = quote[error_column]
+        error = quote[YQL_ERROR_COLUMN]
 
         # If no error return the quote or raise an exception
         if error is None:
@@ -270,31 +755,139 @@ class YahooQuote(LatestQuoteBase, YahooQuoteDateTimeParseMixin):
 
         raise Exception(error)
 
+    @classmethod
+    def fetch_many(cls, codes, exchange, fields='*', transport=None):
+        """Fetch and parse the latest quotes of many stock codes at once.
+
+        Returns a list of quote objects in the same order as the given codes.
+        The codes are queried with as few `symbol in (...)` queries as possible.
+
+        """
+        quotes = [
+            cls(code, exchange, fields=fields, defer=True, transport=transport)
+            for code in codes
+        ]
+
+        cls.process_batch(quotes)
+
+        return quotes
+
+    @classmethod
+    def process_batch(cls, quotes, concurrency=YQL_CONCURRENCY, raise_errors=True):
+        """Process a list of deferred quotes using batched YQL queries.
+
+        The quotes must all request the same fields.  Each query contains at
+        most YQL_SYMBOL_LIMIT symbols, and up to `concurrency` queries are run
+        at the same time.
+
+        A quote that cannot be processed, such as an invalid symbol, has its
+        exception stored as its error and the other quotes are still
+        processed.  An Exception for the errors is then raised, unless
+        raise_errors is False.
+
+        """
+        batches = list(chunks(quotes, YQL_SYMBOL_LIMIT))
+
+        # Avoid creating threads for a single query
+        if len(batches) <= 1:
+            for batch in batches:
+                cls._process_query(batch)
+        else:
+            pool = ThreadPool(min(concurrency, len(batches)))
+            try:
+                pool.map(cls._process_query, batches)
+            finally:
+                pool.close()
+                pool.join()
+
+        if raise_errors:
+            raise_batch_errors(quotes)
+
+    @classmethod
+    def _process_query(cls, batch):
+        """Fetch a batch of quotes with a single YQL query and parse them in place."""
+        # Create query object - shared by every quote in the batch
+        y = get_yql()
+
+        # All quotes in the batch share the query columns of the first
+        columns = batch[0].get_query_columns()
+
+        # The symbol column is needed to match the results to the quotes
+        if columns != '*' and not 'Symbol' in columns:
+            columns.append('Symbol')
+
+        symbols = ','.join([
+            '"%(code)s.%(exchange)s"' % {'code': quote.code, 'exchange': quote.exchange, }
+            for quote in batch
+        ])
+
+        query = 'select %(columns)s from yahoo.finance.quotes where symbol in (%(symbols)s)' \
+            % {'columns': ','.join(columns), 'symbols': symbols, }
+
+        try:
+            response = batch[0].call_provider(y.execute, query, env=YQL_ENV, quotes=batch)
+
+            # If the response results are null there was an error
+            if response.results is None:
+                raise Exception('Error with results')
+        except Exception, e:
+            # Every quote of the batch failed
+            for quote in batch:
+                quote.error = e
+            return
+
+        rows = response.results['quote']
+
+        # A query that matches one symbol returns a dictionary instead of a list
+        if isinstance(rows, dict):
+            rows = [rows]
+
+        rows = dict((row['Symbol'].upper(), row) for row in rows)
+
+        for quote in batch:
+            symbol = ('%s.%s' % (quote.code, quote.exchange)).upper()
+            quote.error = None
+
+            try:
+                if not rows.has_key(symbol):
+                    raise Exception('No quote returned for %s' % (symbol, ))
+
+                raw_quote = rows[symbol]
+
+                # Check each row for an invalid symbol
+                error = raw_quote[YQL_ERROR_COLUMN]
+                if error is not None:
+                    raise Exception(error)
+
+                quote.quote_fields = quote.get_quote_fields()
+                quote.raw_quote = raw_quote
+                quote.quote = quote.parse_quote()
+            except Exception, e:
+                quote.error = e
+
 
 class YahooCSVQuote(LatestQuoteBase, YahooQuoteDateTimeParseMixin):
     """Represents a quote that is obtained via the Yahoo CSV API.
 
     """
-    @property
-    def _known_fields(self):
-        """Returns the known fields of this quote model.
-
-        Known fields is a dictionary of CSV query column symbols as the keys,
-        and the output field name and field data type as the values.
-
-        """
-        return {
-            'd1': ('Date', YahooCSVQuote.parse_date),
-            'g': ('Low', Decimal),
-            'h': ('High', Decimal),
-            'l1': ('Close', Decimal),
-            'n': ('Name', str),
-            'o': ('Open', Decimal),
-            's': ('Code', str),
-            't1': ('Time', YahooCSVQuote.parse_time),
-            'v': ('Volume', Decimal),
-            'x': ('Exchange', str),
-        }
+    # Known fields is a dictionary of CSV query column symbols as the keys,
+    # and the output field name and field data type as the values
+    _known_fields = {
+        'd1': ('Date', parse_us_date),
+        'g': ('Low', Decimal),
+        'h': ('High', Decimal),
+        'l1': ('Close', Decimal),
+        'n': ('Name', str),
+        'o': ('Open', Decimal),
+        's': ('Code', str),
+        't1': ('Time', parse_us_time),
+        'v': ('Volume', Decimal),
+        'x': ('Exchange', str),
+    }
+
+    def get_query_columns(self):
+        """Returns the list of CSV query column symbols for the requested fields."""
+        return list(self.get_quote_fields().columns)
 
     def get_raw_quote(self):
         """Get a quote from the Yahoo Finance CSV API and return the result.
@@ -303,62 +896,118 @@ class YahooCSVQuote(LatestQuoteBase, YahooQuoteDateTimeParseMixin):
         to types of data to get in the quote.
 
         """
-        # Determine the query columns
-        if self.fields == '*':
-            columns = self._known_fields.keys()
-        else:
-            columns = [self.get_column_from_field(field) for field in self.fields]
+        spec = self.get_quote_fields().csv_spec
 
-        # Join as a single string
-        columns = ''.join(columns)
+        symbol = '%(code)s.%(exchange)s' % {'code': self.code, 'exchange': self.exchange, }
 
-        quote_url = u'http://finance.yahoo.com/d/quotes.csv' \
-            '?s=%(code)s.%(exchange)s&f=%(columns)s' \
-            % {
-                'code': self.code, 'exchange': self.exchange, 'columns': columns,
-            }
+        body = self.call_provider(self.transport.get, self.get_quote_url(symbol, spec.query))
 
-        response = urllib2.urlopen(quote_url)
+        # Read the raw data (only one row as there is only one symbol)
+        return self.read_raw_quotes(body, spec)[0]
 
-        quote = response.read()
+    @staticmethod
+    def get_quote_url(symbols, columns):
+        """Returns the CSV API url for a string of symbols and query columns.
 
-        # Query columns need to be parsed into correct symbols
-        columns = self.parse_symbols(columns)
+        Multiple symbols may be requested at once by joining them with a '+'.
 
-        # Use the CSV module to parse the quote, using the query columns
-        reader = csv.DictReader([quote], columns)
+        """
+        return u'%(url)s?s=%(symbols)s&f=%(columns)s' \
+            % {'url': provider_urls['csv'], 'symbols': symbols, 'columns': columns, }
 
-        # Read the raw data
-        quote = [row for row in reader][0]
+    def read_raw_quotes(self, body, spec=None):
+        """Read a CSV API response body into a list of raw quote dictionaries.
 
-        return quote
+        The response contains one line of data per requested symbol, in the
+        order the symbols were requested.  Optionally given the CSV spec of the
+        query or its query string (default is the spec of the requested fields).
 
-    def parse_symbols(self, symbol_str):
-        """Parse a string of Yahoo CSV symbols and return them as a tuple.
+        """
+        if spec is None:
+            spec = self.get_quote_fields().csv_spec
+        elif isinstance(spec, basestring):
+            # Query strings need to be parsed into correct symbols
+            spec = CSVSpec(self.parse_symbols(spec))
 
-        This is required as the symbols are either single letters or a letter and
-        an integer.
+        return spec.read(body)
+
+    @classmethod
+    def fetch_many(cls, codes, exchange, fields='*', transport=None):
+        """Fetch and parse the latest quotes of many stock codes at once.
+
+        Returns a list of quote objects in the same order as the given codes.
+        The codes are packed into as few requests as the CSV API allows.
 
         """
-        # Split symbols into a list
-        symbol_list = list(symbol_str)
+        quotes = [
+            cls(code, exchange, fields=fields, defer=True, transport=transport)
+            for code in codes
+        ]
+
+        cls.process_batch(quotes)
+
+        return quotes
 
-        # Symbol output
-        output = []
-        # Output counter
-        count = 0
+    @classmethod
+    def process_batch(cls, quotes, raise_errors=True):
+        """Process a list of deferred quotes using batched CSV API requests.
 
-        # Find integers in the symbols and attach them to the previous character
-        for i in range(len(symbol_list)):
-            # If the character is a letter append to output
-            if not symbol_list[i].isdigit():
-                output.append(symbol_list[i])
-                count = len(output)
-            else:
-                # Else append the digit to the previous letter
-                output[count-1] = '%s%s' % (symbol_list[i-1], symbol_list[i])
+        The quotes must all request the same fields.  Each request contains at
+        most CSV_SYMBOL_LIMIT symbols.
+
+        A quote that cannot be processed, such as an invalid symbol, has its
+        exception stored as its error and the other quotes are still
+        processed.  An Exception for the errors is then raised, unless
+        raise_errors is False.
+
+        """
+        for batch in chunks(quotes, CSV_SYMBOL_LIMIT):
+            # All quotes in the batch share the CSV spec of the first
+            spec = batch[0].get_quote_fields().csv_spec
+
+            symbols = '+'.join([
+                '%(code)s.%(exchange)s' % {'code': quote.code, 'exchange': quote.exchange, }
+                for quote in batch
+            ])
+
+            try:
+                body = batch[0].call_provider(
+                    batch[0].transport.get, cls.get_quote_url(symbols, spec.query), quotes=batch
+                )
+
+                raw_quotes = batch[0].read_raw_quotes(body, spec)
+
+                if len(raw_quotes) != len(batch):
+                    raise Exception('Expected %s quotes but received %s' % (len(batch), len(raw_quotes)))
+            except Exception, e:
+                # Every quote of the batch failed
+                for quote in batch:
+                    quote.error = e
+                continue
+
+            # Populate each quote with its row of data and parse it
+            for quote, raw_quote in zip(batch, raw_quotes):
+                quote.error = None
+                try:
+                    quote.quote_fields = quote.get_quote_fields()
+                    quote.raw_quote = raw_quote
+                    quote.quote = quote.parse_quote()
+                except Exception, e:
+                    quote.error = e
+
+        if raise_errors:
+            raise_batch_errors(quotes)
+
+    def parse_symbols(self, symbol_str):
+        """Parse a string of Yahoo CSV symbols and return them as a tuple.
+
+        This is required as the symbols are either single letters or a letter and
+        an integer of one or more digits, or known symbols of more letters.
+        Quotes are read with the columns of their CSV spec, so this is only
+        needed for query strings.
 
-        return tuple(output)
+        """
+        return tuple(self._symbol_re.findall(symbol_str))
 
 
 class HistoryQuoteBase(QuoteBase):
@@ -366,19 +1015,149 @@ class HistoryQuoteBase(QuoteBase):
     for quote models that retrieve historical quotes.
 
     """
-    def __init__(self, code, exchange, date_range, fields='*', defer=False):
+    # Store of previously fetched histories (default is no store)
+    history_store = None
+
+    # Days of history per request (None to fetch the date range at once), the
+    # fewest days of the last request, and the number of requests made at the
+    # same time
+    chunk_days = HISTORY_CHUNK_DAYS
+    chunk_min_days = HISTORY_CHUNK_MIN_DAYS
+    chunk_concurrency = HISTORY_CONCURRENCY
+
+    # Parse histories into columns of typed arrays instead of a list of rows,
+    # and drop the raw quote once parsed (default is a list of rows).  The raw
+    # quote of a columnar history may be read as raw values per column
+    columnar = False
+
+    def __init__(self, code, exchange, date_range, fields='*', defer=False, transport=None):
         """Initialise the quote model given the stock code and date range.
 
         Optionally given a list of field names that contain the required data
-        in the quote (default is all fields '*'), and a boolean to determine
-        whether to process the quote now or at a later time (default is False).
+        in the quote (default is all fields '*'), a boolean to determine
+        whether to process the quote now or at a later time (default is False),
+        and a transport to fetch the quote with (default is the shared one).
 
         """
         # Store the date range
         self.date_range = date_range
 
+        # Columns built from the raw rows of a history that is not columnar
+        self._columns = None
+
         # Initialise the superclass
-        super(HistoryQuoteBase, self).__init__(code, exchange, fields=fields, defer=defer)
+        super(HistoryQuoteBase, self).__init__(
+            code, exchange, fields=fields, defer=defer, transport=transport
+        )
+
+    @property
+    def columns(self):
+        """Returns the history as columns of typed arrays, oldest first.
+
+        The columns of a columnar history are its parsed quote, otherwise they
+        are built from the raw rows when first used.
+
+        """
+        if self.columnar:
+            return self.quote
+
+        if self._columns is None:
+            if self.raw_quote is None:
+                raise Exception('Quote not fetched.')
+            self._columns = self.parse_columns(self.get_quote_fields())
+
+        return self._columns
+
+    def get_cache_key(self):
+        """Returns the key that identifies the quote and date range in a cache."""
+        return super(HistoryQuoteBase, self).get_cache_key() + tuple(self.get_date_range())
+
+    def get_date_range(self):
+        """Returns the validated start and end dates of the date range."""
+        # Validate dates first
+        ret, date_range = validate_date_range(self.date_range)
+
+        if not ret:
+            # raise exception or just quit - validate_date_range will raise an exceptions
+            raise Exception('Date range is no valid')
+
+        return date_range
+
+    def get_raw_quote(self):
+        """Get a list of quotes over the date range and return the result.
+
+        If the model has a history store only the dates it does not hold are
+        fetched from the provider.
+
+        """
+        start_date, end_date = self.get_date_range()
+
+        if self.history_store is not None:
+            return self.history_store.get_raw_quote(self, start_date, end_date)
+
+        return self.get_raw_quote_chunks(start_date, end_date)
+
+    def get_raw_quote_chunks(self, start_date, end_date, allow_empty=False):
+        """Get a list of quotes between two dates, fetching long ranges in chunks.
+
+        The dates are split into chunks of chunk_days days that are fetched at
+        the same time and joined into a single list, latest first, with any
+        duplicate dates removed.  A chunk without any trading days has no rows,
+        and an Exception is raised only if every chunk is empty, unless
+        allow_empty is True.
+
+        """
+        date_ranges = split_date_range([start_date, end_date], self.chunk_days, self.chunk_min_days)
+
+        if len(date_ranges) == 1:
+            return self.get_raw_quote_range(start_date, end_date, allow_empty=allow_empty)
+
+        def fetch(date_range):
+            return self.get_raw_quote_range(date_range[0], date_range[1], allow_empty=True)
+
+        pool = ThreadPool(min(self.chunk_concurrency, len(date_ranges)))
+        try:
+            results = pool.map(fetch, date_ranges)
+        finally:
+            pool.close()
+            pool.join()
+
+        results = [result for result in results if has_raw_rows(result)]
+
+        if not allow_empty and not results:
+            raise Exception('Error with results')
+
+        # The chunks do not overlap, so they are joined latest chunk first.
+        # Raw values per column are joined column by column
+        if results and all([isinstance(result, dict) for result in results]):
+            return dict(
+                (column, [value for result in reversed(results) for value in result[column]])
+                for column in results[0].keys()
+            )
+
+        # Rows without a date (it was not requested) are kept as they are,
+        # otherwise rows repeated at the chunk boundaries are dropped
+        rows = []
+        dates = set()
+        for result in reversed(results):
+            for row in get_raw_rows(result):
+                day = row.get('Date')
+                if day is not None:
+                    if day in dates:
+                        continue
+                    dates.add(day)
+                rows.append(row)
+
+        return rows
+
+    def get_raw_quote_range(self, start_date, end_date, allow_empty=False):
+        """Method to fetch a list of raw unparsed quotes between two dates from a provider.
+
+        If allow_empty is True a date range without any quotes returns an empty
+        list, otherwise an Exception is raised.
+
+        """
+        raise NotImplementedError('This method must be defined by subclass.')
 
     def parse_quote(self):
         """Parse the raw data from a historical quote into a dictionary of useful data.
@@ -387,79 +1166,98 @@ class HistoryQuoteBase(QuoteBase):
         if self.quote_fields == {} or self.quote_fields is None:
             raise Exception('Quote cannot be parsed without output field dictionary.')
 
-        output = []
+        if self.columnar:
+            return self.parse_columns(self.quote_fields)
+
+        raw_rows = get_raw_rows(self.raw_quote)
+
+        # Lazy rows parse each field when it is first read
+        if self.lazy:
+            record_class = get_lazy_record_class(self.quote_fields)
+            return [record_class(data) for data in raw_rows]
 
         # Populate the output list with data dictionaries
-        for data in self.raw_quote:
+        convert_row = get_row_converter(self.quote_fields)
 
-            # Create dictionary for this data
-            dic = {}
+        return [convert_row(data) for data in raw_rows]
 
-            for key, value in data.items():
-                # Ignore fields in data that are not in requested field dict
-                if not self.quote_fields.has_key(key):
-                    continue
-                # Lookup data name and data type
-                data_name, data_type = self.quote_fields[key]
+    def parse_columns(self, quote_fields):
+        """Parse the raw rows, or raw values per column, of the history into columns.
 
-                # Apply the datatype
-                dic[data_name] = data_type(value)
+        Raw values per column are converted straight into the columns without
+        building a row for each date.
 
-            # Add the data dictionary to the output
-            output.append(dic)
+        """
+        if isinstance(self.raw_quote, dict):
+            raw_columns = dict((column, self.raw_quote[column]) for column in quote_fields.keys())
+            return HistoryColumns.from_raw_columns(raw_columns, quote_fields)
 
-        return output
+        return HistoryColumns.from_rows(self.raw_quote, quote_fields)
 
+    def parse_row(self, data):
+        """Parse a single row of raw historical data into a dictionary of useful data.
 
-class YahooQuoteHistory(HistoryQuoteBase):
-    """Represents a set of historical quotes that are obtained via the Yahoo
-    Finance community table using the YQL library.
+        Fields in the data that were not requested are ignored.
 
-    """
-    @property
-    def _known_fields(self):
-        """Returns the known fields of this quote model.
+        """
+        return get_row_converter(self.quote_fields)(data)
+
+    def process_quote(self):
+        """Helper method to process a quote.
 
-        Known fields is a dictionary of YQL query column symbols as the keys,
-        and the output field name and field data type as the values.
+        The raw rows of a columnar history are dropped once parsed.
 
         """
-        return {
-            'Date': ('Date', parse_date),
-            'Open': ('Open', Decimal),
-            'High': ('High', Decimal),
-            'Low': ('Low', Decimal),
-            'Close': ('Close', Decimal),
-            'Volume': ('Volume', Decimal),
-            'Adj_Close': ('Adj Close', Decimal),
-        }
+        super(HistoryQuoteBase, self).process_quote()
 
-    def get_raw_quote(self):
-        """Get a list of quotes from the Yahoo YQL finance tables and return the result.
+        if self.columnar:
+            self.raw_quote = None
+
+    def iter_quote(self):
+        """Returns a generator of parsed rows of historical data.
 
-        Given the code of the stock and a list containing the start and end dates of
-        the data.
+        Each row is parsed as it is yielded rather than all at once.  The
+        raw_quote and quote attributes are not populated.
 
         """
-        # Validate dates first
-        ret, date_range = validate_date_range(self.date_range)
+        self.quote_fields = self.get_quote_fields()
 
-        if not ret:
-            # raise exception or just quit - validate_date_range will raise an exceptions
-            raise Exception('Date range is no valid')
+        for data in get_raw_rows(self.get_raw_quote()):
+            yield self.parse_row(data)
+
+
+class YahooQuoteHistory(HistoryQuoteBase):
+    """Represents a set of historical quotes that are obtained via the Yahoo
+    Finance community table using the YQL library.
+
+    """
+    # Known fields is a dictionary of YQL query column symbols as the keys,
+    # and the output field name and field data type as the values
+    _known_fields = {
+        'Date': ('Date', parse_date),
+        'Open': ('Open', Decimal),
+        'High': ('High', Decimal),
+        'Low': ('Low', Decimal),
+        'Close': ('Close', Decimal),
+        'Volume': ('Volume', Decimal),
+        'Adj_Close': ('Adj Close', Decimal),
+    }
+
+    def get_raw_quote_range(self, start_date, end_date, allow_empty=False):
+        """Get a list of quotes from the Yahoo YQL finance tables and return the result.
 
-        start_date = date_range[0]
-        end_date = date_range[1]
+        Given the start and end dates of the data, and whether a date range
+        without any quotes returns an empty list (default is False).
 
+        """
         # Create query object - must set the environment for community tables
-        y = yql.Public()
-        env = 'http://www.datatables.org/alltables.env'
+        y = get_yql()
 
         # Determine the query columns
         if self.fields == '*':
             columns = '*'
         else:
-            columns = [self.get_column_from_field(field) for field in self.fields]
+            columns = self.get_quote_fields().columns
 
         # Join as a comma separated string
         columns = ','.join(columns)
@@ -472,15 +1270,22 @@ class YahooQuoteHistory(HistoryQuoteBase):
                 'code': self.code, 'exchange': self.exchange, 'columns': columns,
                 'start_date': start_date, 'end_date': end_date,
             }
-        response = y.execute(query, env=env)
+        response = self.call_provider(y.execute, query, env=YQL_ENV)
 
-        # If the response results are null there was an error
+        # If the response results are null there was an error, or there were
+        # no trading days in the date range
         if response.results is None:
+            if allow_empty:
+                return []
             raise Exception('Error with results')
 
         # Get the quote
         quote = response.results['quote']
 
+        # A single day of data is returned as a dictionary instead of a list
+        if isinstance(quote, dict):
+            quote = [quote]
+
         return quote
 
 
@@ -489,64 +1294,301 @@ class YahooCSVQuoteHistory(HistoryQuoteBase):
     CSV API.
 
     """
-    @property
-    def _known_fields(self):
-        """Returns the known fields of this quote model.
-
-        Known fields is a dictionary of CSV headers as the keys,
-        and the output field name and field data type as the values.
-
-        """
-        return {
-            'Date': ('Date', parse_date),
-            'Open': ('Open', Decimal),
-            'High': ('High', Decimal),
-            'Low': ('Low', Decimal),
-            'Close': ('Close', Decimal),
-            'Volume': ('Volume', Decimal),
-            'Adj Close': ('Adj Close', Decimal),
-        }
-
-    def get_raw_quote(self):
-        """Get a list of quotes from the Yahoo Finanace CSV API and return the result.
-
-        Given the code of the stock and a list containing the start and end dates of
-        the data.
+    # Known fields is a dictionary of CSV headers as the keys,
+    # and the output field name and field data type as the values
+    _known_fields = {
+        'Date': ('Date', parse_date),
+        'Open': ('Open', Decimal),
+        'High': ('High', Decimal),
+        'Low': ('Low', Decimal),
+        'Close': ('Close', Decimal),
+        'Volume': ('Volume', Decimal),
+        'Adj Close': ('Adj Close', Decimal),
+    }
+
+    def get_quote_url(self, start_date, end_date):
+        """Returns the CSV API url for the stock code between two dates.
 
         """
-        # Validate dates first
-        ret, date_range = validate_date_range(self.date_range)
-
-        if not ret:
-            # raise exception or just quit - validate_date_range will raise an exceptions
-            raise Exception('Date range is no valid')
-
-        start_date = date_range[0]
-        end_date = date_range[1]
-
-        quote_url = 'http://ichart.yahoo.com/table.csv' \
+        return '%(url)s' \
             '?s=%(code)s.%(exchange)s' \
             '&a=%(start_month)s&b=%(start_day)s&c=%(start_year)s' \
             '&d=%(end_month)s&e=%(end_day)s&f=%(end_year)s' \
             '&g=%(period)s' \
             '&ignore=.csv' \
             % {
-                'code': self.code, 'exchange': self.exchange,
+                'url': provider_urls['ichart'], 'code': self.code, 'exchange': self.exchange,
                 'start_month': start_date.month - 1, 'start_day': start_date.day,
                 'start_year': start_date.year, 'end_month': end_date.month - 1,
                 'end_day': end_date.day, 'end_year': end_date.year,
                 'period': 'd',
             }
 
-        response = urllib2.urlopen(quote_url)
+    def get_raw_quote_range(self, start_date, end_date, allow_empty=False):
+        """Get a list of quotes from the Yahoo Finanace CSV API and return the result.
 
-        quote = response.read()
+        Given the start and end dates of the data, and whether a date range
+        without any quotes returns an empty list (default is False).  The
+        quotes of a columnar history are returned as a dictionary of raw values
+        per column if the response is in the usual layout.
 
-        # Use the CSV module to parse the quote (we need to split on new lines)
-        # Don't specify any columns (they will be taken as the first row of data)
-        reader = csv.DictReader(quote.split('\n'))
+        """
+        try:
+            body = self.call_provider(self.transport.get, self.get_quote_url(start_date, end_date))
+        except TransportError, e:
+            # The CSV API responds not found when there are no trading days
+            if allow_empty and e.status == 404:
+                return []
+            raise
+
+        # Columnar histories are parsed from the values of each column
+        if self.columnar:
+            raw_columns = self.read_raw_columns(body)
+            if raw_columns is not None:
+                return raw_columns
+
+        return self.read_raw_rows(body)
+
+    @staticmethod
+    def read_raw_columns(body):
+        """Read a CSV API history response body into a list of raw values per column.
 
-        # Read the raw data
-        quote = [row for row in reader]
+        Returns a dictionary of the header columns and their values, latest
+        first, or None if the body is not in the usual layout.  The body is
+        split into values in one pass, and the values of each column are taken
+        as a slice of them, so no row is built.
 
+        """
+        header_end = body.find('\n')
+        if header_end < 0 or body[:header_end].rstrip('\r') != HISTORY_CSV_HEADER:
+            return None
+
+        data = body[header_end + 1:]
+        if '\r' in data:
+            data = data.replace('\r', '')
+        data = data.rstrip('\n')
+
+        if not data:
+            return dict((column, []) for column in HISTORY_CSV_COLUMNS)
+
+        # Quoted values and blank lines need the CSV module
+        if '"' in data or '\n\n' in data:
+            return None
+
+        values = data.replace('\n', ',').split(',')
+        width = len(HISTORY_CSV_COLUMNS)
+        rows = data.count('\n') + 1
+
+        if len(values) != rows * width:
+            return None
+
+        raw_columns = dict(
+            (column, values[i::width]) for i, column in enumerate(HISTORY_CSV_COLUMNS)
+        )
+
+        # A line with a missing value would shift the columns of the following lines
+        if set(map(len, raw_columns['Date'])) != set([10]):
+            return None
+
+        return raw_columns
+
+    @classmethod
+    def read_raw_rows(cls, body):
+        """Read a CSV API history response body into a list of raw rows, latest first.
+
+        Bodies in the usual layout are read by read_raw_columns, other bodies
+        with the CSV module.
+
+        """
+        raw_columns = cls.read_raw_columns(body)
+
+        if raw_columns is None:
+            # Use the CSV module to parse the quote (we need to split on new lines)
+            # Don't specify any columns (they will be taken as the first row of data)
+            return [row for row in csv.DictReader(body.split('\n'))]
+
+        return [
+            {
+                'Date': date, 'Open': open_, 'High': high, 'Low': low, 'Close': close,
+                'Volume': volume, 'Adj Close': adj_close,
+            }
+            for date, open_, high, low, close, volume, adj_close in izip(
+                *[raw_columns[column] for column in HISTORY_CSV_COLUMNS]
+            )
+        ]
+
+    def iter_quote(self):
+        """Returns a generator of parsed rows of historical data read from the CSV API.
+
+        The response is read from the connection incrementally and each row is
+        parsed as it is yielded, so memory use does not grow with the size of
+        the date range (except with a cassette, which needs the whole
+        response).  The raw_quote and quote attributes are not populated.
+
+        """
+        # Stored histories cannot be streamed
+        if self.history_store is not None:
+            for data in super(YahooCSVQuoteHistory, self).iter_quote():
+                yield data
+            return
+
+        self.quote_fields = self.get_quote_fields()
+
+        start_date, end_date = self.get_date_range()
+
+        url = self.get_quote_url(start_date, end_date)
+
+        if self.cassette is not None:
+            # The cassette records and replays whole responses
+            lines = self.call_provider(self.transport.get, url).split('\n')
+        else:
+            # The response is read lazily, so only wait for a token rather than
+            # retrying throttled requests
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            lines = self.transport.iter_lines(url)
+
+        # The first line holds the headers
+        reader = csv.DictReader(lines)
+
+        for data in reader:
+            yield self.parse_row(data)
+
+
+def gather_quotes(quotes, concurrency=QUOTE_CONCURRENCY, return_exceptions=False):
+    """Process many deferred quotes concurrently and return them.
+
+    Up to `concurrency` quotes have their `process_quote` method running at
+    the same time, so the blocking provider requests overlap.  The quotes are
+    returned in the given order.
+
+    If `return_exceptions` is True, a quote that fails is replaced by its
+    exception in the returned list, otherwise the first exception is raised.
+
+    """
+    quotes = list(quotes)
+
+    def process(quote):
+        try:
+            quote.process_quote()
+        except Exception, e:
+            if not return_exceptions:
+                raise
+            return e
         return quote
+
+    if not quotes:
+        return []
+
+    pool = ThreadPool(min(concurrency, len(quotes)))
+    try:
+        return pool.map(process, quotes)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def process_deferred(quotes, concurrency=QUOTE_CONCURRENCY, return_exceptions=False):
+    """Process the deferred quotes of a list with as few provider requests as
+    possible, and return the list.
+
+    Latest quotes are grouped by model, exchange and fields and each group is
+    fetched with its model's batched requests, requesting each stock code
+    once.  Latest quotes held by their model's cache are parsed from it
+    without a request, and the raw quotes of a batch are stored in the cache.
+    Other quotes, such as histories, are processed on their own.  The
+    groups and other quotes are processed concurrently, up to `concurrency` at
+    a time, and each quote's raw_quote and quote are populated in place.
+    Quotes that have already been processed are left alone.
+
+    A quote that fails has its exception stored as its error without stopping
+    the other quotes.  If `return_exceptions` is True, a quote that fails is
+    replaced by its exception in the returned list, otherwise the first
+    exception is raised once every quote is processed.
+
+    """
+    quotes = list(quotes)
+
+    groups = {}
+    others = []
+    pending = []
+
+    def parse_raw_quote(quote, raw_quote):
+        quote.error = None
+        try:
+            quote.quote_fields = quote.get_quote_fields()
+            quote.raw_quote = raw_quote
+            quote.quote = quote.parse_quote()
+        except Exception, e:
+            quote.error = e
+
+    for quote in quotes:
+        if quote.quote is not None:
+            continue
+
+        pending.append(quote)
+
+        key = quote.get_batch_key()
+        if key is None:
+            others.append(quote)
+            continue
+
+        if quote.cache is not None:
+            raw_quote = quote.cache.lookup(quote.get_cache_key())
+            if raw_quote is not None:
+                parse_raw_quote(quote, raw_quote)
+                continue
+
+        # Quotes of the same stock share a single request
+        group = groups.setdefault(key, {})
+        group.setdefault((quote.code, quote.exchange), []).append(quote)
+
+    def process_group(key, group):
+        leaders = [duplicates[0] for duplicates in group.values()]
+        key[0].process_batch(leaders, raise_errors=False)
+
+        for quote in leaders:
+            if quote.error is None and quote.cache is not None:
+                quote.cache.set(quote.get_cache_key(), quote.raw_quote)
+
+        # Parse the raw quote of each leader for its duplicates
+        for duplicates in group.values():
+            for quote in duplicates[1:]:
+                if duplicates[0].error is not None:
+                    quote.error = duplicates[0].error
+                else:
+                    parse_raw_quote(quote, duplicates[0].raw_quote)
+
+    def process_other(quote):
+        quote.error = None
+        try:
+            quote.process_quote()
+        except Exception, e:
+            quote.error = e
+
+    tasks = [partial(process_group, key, group) for key, group in groups.items()]
+    tasks.extend([partial(process_other, quote) for quote in others])
+
+    # Avoid creating threads for a single task
+    if len(tasks) == 1:
+        tasks[0]()
+    elif tasks:
+        pool = ThreadPool(min(concurrency, len(tasks)))
+        try:
+            pool.map(lambda task: task(), tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    failed = set([id(quote) for quote in pending if quote.error is not None])
+
+    if not failed:
+        return quotes
+
+    if not return_exceptions:
+        for quote in quotes:
+            if id(quote) in failed:
+                raise quote.error
+
+    return [id(quote) in failed and quote.error or quote for quote in quotes]
@@ -0,0 +1,174 @@
+import random
+import threading
+import time
+
+__all__ = ['THROTTLE_STATUSES', 'RATE_LIMITS', 'BACKOFF_BASE', 'BACKOFF_MAX', 'BACKOFF_RETRIES',
+           'is_throttled', 'TokenBucket', 'limiters']
+
+# HTTP statuses the providers respond with when throttling requests
+THROTTLE_STATUSES = (429, 503, 999)
+
+# Sustained requests per second and burst size of each provider endpoint
+RATE_LIMITS = {
+    'yql': (2000 / 3600.0, 50),     # YQL public tables allow 2,000 requests an hour
+    'csv': (10.0, 20),              # finance.yahoo.com quotes.csv
+    'ichart': (10.0, 20),           # ichart.yahoo.com table.csv
+}
+
+# Seconds of the first backoff after throttling, doubled for each retry
+BACKOFF_BASE = 1.0
+
+# Maximum seconds of a single backoff
+BACKOFF_MAX = 60.0
+
+# Number of times a throttled request is retried
+BACKOFF_RETRIES = 5
+
+
+def is_throttled(e):
+    """Returns True if an exception is a throttling response from a provider.
+
+    Handles the TransportError of the CSV models and the YQLError of the YQL
+    library, which holds the HTTP response.
+
+    """
+    status = getattr(e, 'status', None)
+    if status is None:
+        status = getattr(getattr(e, 'resp', None), 'status', None)
+
+    return status in THROTTLE_STATUSES
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter shared by every request to a provider endpoint.
+
+    Tokens are added at `rate` per second up to `capacity`, and each request
+    takes one token, waiting if there are none.  A throttled request backs off
+    the whole endpoint for an exponentially growing, jittered delay.
+
+    """
+    def __init__(self, rate, capacity, retries=BACKOFF_RETRIES,
+            backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        """Initialise the bucket full, given the rate per second and capacity.
+
+        Optionally given the number of times to retry a throttled request and
+        the first and maximum number of seconds to back off.
+
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.tokens = float(capacity)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+        # No tokens are handed out until this time after throttling
+        self.blocked_until = 0.0
+
+        # Counters
+        self.waiting = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+
+    def refill(self, now):
+        """Add the tokens earned since the last refill (the lock must be held)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def average_wait(self):
+        """Returns the average number of seconds requests waited for a token."""
+        if self.acquired == 0:
+            return 0.0
+        return self.total_wait / self.acquired
+
+    def get_wait_time(self):
+        """Returns the number of seconds a new request would wait for a token."""
+        with self.lock:
+            now = time.time()
+            self.refill(now)
+
+            # Requests already waiting are served first
+            shortfall = self.waiting + 1 - self.tokens
+
+            return max(self.blocked_until - now, shortfall / self.rate, 0.0)
+
+    def try_acquire(self):
+        """Take a token and return True if one is available, otherwise return False."""
+        with self.lock:
+            now = time.time()
+            self.refill(now)
+
+            if now < self.blocked_until or self.tokens < 1:
+                return False
+
+            self.tokens -= 1
+            self.acquired += 1
+            return True
+
+    def acquire(self):
+        """Wait until a token is available, take it and return the seconds waited."""
+        start = time.time()
+
+        with self.lock:
+            self.waiting += 1
+
+        try:
+            while True:
+                with self.lock:
+                    now = time.time()
+                    self.refill(now)
+
+                    if now >= self.blocked_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        waited = now - start
+                        self.acquired += 1
+                        self.total_wait += waited
+                        return waited
+
+                    delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+                time.sleep(delay)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def backoff(self, attempt):
+        """Hold back every request to the endpoint after a throttled attempt.
+
+        The delay is chosen at random up to an exponentially growing limit, so
+        clients that were throttled together do not retry together.
+
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+        with self.lock:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.time() + delay)
+
+    def call(self, fetch, *args, **kwargs):
+        """Call fetch with the given arguments once a token is available.
+
+        A throttled call is retried after backing off, up to the number of
+        retries.  Any other exception is raised immediately.
+
+        """
+        for attempt in range(self.retries + 1):
+            self.acquire()
+            try:
+                return fetch(*args, **kwargs)
+            except Exception, e:
+                if not is_throttled(e) or attempt == self.retries:
+                    raise
+                self.backoff(attempt)
+
+
+# Rate limiters for the quote models to share, keyed by provider endpoint
+limiters = dict(
+    (endpoint, TokenBucket(rate, capacity))
+    for endpoint, (rate, capacity) in RATE_LIMITS.items()
+)
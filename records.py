@@ -0,0 +1,218 @@
+import re
+
+__all__ = ['get_slot_name', 'QuoteRecord', 'make_record_class', 'load_record',
+           'make_record_converter', 'LazyQuoteRecord', 'make_lazy_record_class']
+
+# Record classes keyed by the tuple of their field names
+record_classes = {}
+
+
+def get_slot_name(field_name):
+    """Returns the attribute name of a field in a record (e.g. 'Adj Close' is Adj_Close)."""
+    return re.sub(r'\W', '_', field_name)
+
+
+class QuoteRecord(object):
+    """Base class of the generated records that hold the fields of parsed quotes.
+
+    Each field is held in a slot rather than a dictionary, so a record uses a
+    fraction of the memory of a dictionary and its fields are read as
+    attributes.  Records can also be read and set like the dictionary they
+    replace, compare equal to it and be pickled.  Use to_dict to serialise a
+    record as JSON.
+
+    """
+    __slots__ = ()
+
+    # Field names held by the record, and their slot names
+    _fields = ()
+    _slot_names = {}
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, self._slot_names[field])
+        except (KeyError, AttributeError):
+            raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        try:
+            slot_name = self._slot_names[field]
+        except KeyError:
+            raise KeyError(field)
+        setattr(self, slot_name, value)
+
+    def __reduce__(self):
+        # Generated classes cannot be pickled by name, so records are pickled
+        # as their field names and fields
+        return load_record, (self._fields, self.to_dict())
+
+    def __contains__(self, field):
+        try:
+            self[field]
+        except KeyError:
+            return False
+        return True
+
+    has_key = __contains__
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [field for field in self._fields if field in self]
+
+    def values(self):
+        return [self[field] for field in self.keys()]
+
+    def items(self):
+        return [(field, self[field]) for field in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if not hasattr(other, 'keys'):
+            return NotImplemented
+        return dict(self.items()) == dict(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self.items()))
+
+    def to_dict(self):
+        """Returns the fields of the record as a dictionary, such as to serialise it."""
+        return dict(self.items())
+
+
+def make_record_class(field_names):
+    """Returns the record class with a slot for each of the field names, created once."""
+    field_names = tuple(sorted(field_names))
+
+    try:
+        return record_classes[field_names]
+    except KeyError:
+        pass
+
+    slot_names = dict((field_name, get_slot_name(field_name)) for field_name in field_names)
+
+    record_class = record_classes[field_names] = type('QuoteRecord', (QuoteRecord, ), {
+        '__slots__': tuple(sorted(slot_names.values())),
+        '_fields': field_names,
+        '_slot_names': slot_names,
+    })
+
+    return record_class
+
+
+def load_record(field_names, fields):
+    """Returns a record of the field names holding a dictionary of fields (used
+    to unpickle records).
+
+    """
+    record = make_record_class(field_names)()
+    for field, value in fields.items():
+        record[field] = value
+
+    return record
+
+
+def make_record_converter(quote_fields):
+    """Returns a function that converts a raw quote into a record of useful data.
+
+    The function is generated for the quote fields, so each field is assigned
+    to its slot directly.  Fields missing from the raw quote are left unset.
+
+    """
+    record_class = make_record_class(
+        [field_name for field_name, field_type in quote_fields.values()]
+    )
+
+    names = {'_record_class': record_class}
+    lines = []
+
+    for i, (column, (field_name, field_type)) in enumerate(sorted(quote_fields.items())):
+        names['_%d' % (i, )] = field_type
+        lines.append(
+            '    if %(column)r in raw:\n'
+            '        record.%(slot)s = _%(i)d(raw[%(column)r])\n'
+            % {'column': column, 'slot': get_slot_name(field_name), 'i': i}
+        )
+
+    source = 'def convert_record(raw, %(args)s):\n' \
+        '    record = _record_class()\n' \
+        '%(lines)s' \
+        '    return record\n' \
+        % {
+            'args': ', '.join(['%s=%s' % (name, name) for name in sorted(names)]),
+            'lines': ''.join(lines),
+        }
+
+    exec source in names
+
+    return names['convert_record']
+
+
+class LazyQuoteRecord(QuoteRecord):
+    """Base class of the generated records that parse each field of a raw quote
+    the first time it is read.
+
+    The raw quote is kept in the record, and a parsed field is kept in its slot
+    so it is only parsed once.  Errors parsing a field are raised when it is
+    read.
+
+    """
+    __slots__ = ()
+
+    # Raw quote column and field type keyed by slot name
+    _columns = {}
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        # Only called for slots that have not been set yet
+        try:
+            column, field_type = self._columns[name]
+        except KeyError:
+            raise AttributeError(name)
+
+        try:
+            value = self._raw[column]
+        except KeyError:
+            raise AttributeError(name)
+
+        value = field_type(value)
+        setattr(self, name, value)
+
+        return value
+
+
+def make_lazy_record_class(quote_fields):
+    """Returns a lazy record class with a slot for each field of the quote fields."""
+    slot_names = {}
+    columns = {}
+
+    for column, (field_name, field_type) in quote_fields.items():
+        slot_name = get_slot_name(field_name)
+        slot_names[field_name] = slot_name
+        columns[slot_name] = (column, field_type)
+
+    return type('LazyQuoteRecord', (LazyQuoteRecord, ), {
+        '__slots__': tuple(sorted(slot_names.values())) + ('_raw', ),
+        '_fields': tuple(sorted(slot_names.keys())),
+        '_slot_names': slot_names,
+        '_columns': columns,
+    })
@@ -0,0 +1,417 @@
+import BaseHTTPServer
+import SocketServer
+import argparse
+import gzip
+import json
+import math
+import random
+import re
+import threading
+import time
+import urlparse
+import zlib
+
+from StringIO import StringIO
+from datetime import date, datetime, timedelta
+
+from functions import date_range_generator
+from quote import HISTORY_CSV_COLUMNS, get_csv_symbol_re
+from ratelimit import TokenBucket
+
+__all__ = ['CSV_COLUMNS', 'CSV_COLUMN_RE', 'YQL_INVALID_SYMBOL', 'THROTTLE_STATUS',
+           'synthetic_history_row', 'synthetic_history', 'synthetic_quote',
+           'StandInRequestHandler', 'ThreadingHTTPServer', 'StandInServer']
+
+# Columns of the YQL quotes table for each CSV API symbol
+CSV_COLUMNS = {
+    'd1': 'LastTradeDate',
+    'g': 'DaysLow',
+    'h': 'DaysHigh',
+    'l1': 'LastTradePriceOnly',
+    'n': 'Name',
+    'o': 'Open',
+    's': 'Symbol',
+    't1': 'LastTradeTime',
+    'v': 'Volume',
+    'x': 'StockExchange',
+}
+
+# Pattern that splits the f= query string of the CSV API into symbols
+CSV_COLUMN_RE = get_csv_symbol_re(CSV_COLUMNS.keys())
+
+# Error the YQL quotes table gives for an invalid symbol
+YQL_INVALID_SYMBOL = 'No such ticker symbol. <a href="/l">Try Symbol Lookup</a> (Look up: <a href="/l">%s</a>)'
+
+# HTTP status Yahoo responds with when throttling requests
+THROTTLE_STATUS = 999
+
+
+def synthetic_history_row(symbol, day):
+    """Returns a raw CSV API history row of synthetic data for a symbol and date.
+
+    The data is repeatable, so a symbol always has the same price on a date.
+
+    """
+    rng = random.Random('%s %s' % (symbol, day.toordinal()))
+
+    # A base price per symbol that drifts slowly over time
+    base = 1 + (zlib.crc32(symbol) & 0xffff) / 1000.0
+    close = base * (1 + 0.2 * math.sin(day.toordinal() / 50.0)) * rng.uniform(0.98, 1.02)
+    open_ = close * rng.uniform(0.98, 1.02)
+
+    return {
+        'Date': day.isoformat(),
+        'Open': '%.2f' % (open_, ),
+        'High': '%.2f' % (max(open_, close) * rng.uniform(1.0, 1.02), ),
+        'Low': '%.2f' % (min(open_, close) * rng.uniform(0.98, 1.0), ),
+        'Close': '%.2f' % (close, ),
+        'Volume': '%d' % (rng.randint(1000, 5000000), ),
+        'Adj Close': '%.2f' % (close, ),
+    }
+
+
+def synthetic_history(symbol, start_date, end_date):
+    """Returns the raw CSV API history of synthetic data for the weekdays of a date range.
+
+    The rows are latest first like the providers.
+
+    """
+    return [
+        synthetic_history_row(symbol, day)
+        for day in reversed(list(date_range_generator(start_date, end_date)))
+        if day.weekday() < 5
+    ]
+
+
+def synthetic_quote(symbol):
+    """Returns a raw YQL latest quote of synthetic data for a symbol."""
+    # The latest quote is from the last weekday
+    day = date.today()
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+
+    row = synthetic_history_row(symbol, day)
+
+    return {
+        'Name': 'SYNTHETIC %s' % (symbol.split('.')[0], ),
+        'Symbol': symbol,
+        'StockExchange': symbol.endswith('.AX') and 'ASX' or 'NYQ',
+        'LastTradeDate': day.strftime('%m/%d/%Y').lstrip('0').replace('/0', '/'),
+        'LastTradeTime': '4:10pm',
+        'LastTradePriceOnly': row['Close'],
+        'Open': row['Open'],
+        'DaysHigh': row['High'],
+        'DaysLow': row['Low'],
+        'Volume': row['Volume'],
+        'ErrorIndicationreturnedforsymbolchangedinvalid': None,
+    }
+
+
+class StandInRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handles requests to the stand-in server like the Yahoo endpoints."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status, content_type, body = self.server.stand_in.respond(self.path)
+
+        # Compress the body if the client accepts it
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(body)
+            f.close()
+            body = buf.getvalue()
+            encoding = 'gzip'
+        else:
+            encoding = None
+
+        chunk_size = self.server.stand_in.chunk_size
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if chunk_size:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+
+        if chunk_size:
+            for start in range(0, len(body), chunk_size):
+                chunk = body[start:start + chunk_size]
+                self.wfile.write('%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write('0\r\n\r\n')
+        else:
+            self.wfile.write(body)
+
+        # Close the connection without telling the client, like a server whose
+        # keep-alive timeout has passed
+        if self.server.stand_in.drop_connections:
+            self.close_connection = 1
+
+    def log_message(self, format, *args):
+        """Do not log every request."""
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """HTTP server that handles each connection in a thread."""
+    daemon_threads = True
+
+
+class StandInServer(object):
+    """Local HTTP stand-in for the Yahoo quotes.csv, table.csv and YQL endpoints.
+
+    Responses are built from fixtures where given, otherwise from repeatable
+    synthetic data.  The server can add latency, fail a fraction of requests
+    and throttle requests beyond a rate, so the fetch path can be load tested
+    without the network.  Use `set_provider_url(server.url)` to point the
+    quote models at it.
+
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0,
+            rate=None, capacity=None, fixtures=None, invalid_symbols=(), drop_connections=False,
+            chunk_size=None):
+        """Initialise the server.
+
+        Optionally given the host and port to listen on (default is any free
+        port), the latency in seconds of each response (a number or a tuple of
+        the minimum and maximum), the fraction of requests that fail, the
+        requests per second and burst size above which requests are throttled,
+        a dictionary of fixtures, a list of symbols that are invalid, a
+        boolean to determine whether to close each connection after its
+        response without a Connection: close header (default is False) and
+        the size of the chunks to send response bodies in with chunked
+        transfer encoding (default is None, send a Content-Length).
+
+        Fixtures are keyed by symbol (e.g. 'ABC.AX') with a 'quote' dictionary
+        of YQL quote columns and/or a 'history' list of CSV API history rows.
+
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fixtures = fixtures or {}
+        self.invalid_symbols = set(invalid_symbols)
+        self.drop_connections = drop_connections
+        self.chunk_size = chunk_size
+
+        if rate is None:
+            self.limiter = None
+        else:
+            self.limiter = TokenBucket(rate, capacity or max(1, int(rate)))
+
+        self.random = random.Random()
+
+        # Counters
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), StandInRequestHandler)
+        self.httpd.stand_in = self
+        self.thread = None
+
+    @property
+    def url(self):
+        """Returns the base url of the server."""
+        host, port = self.httpd.server_address
+        return 'http://%s:%s' % (host, port)
+
+    def start(self):
+        """Start serving requests in a background thread."""
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving requests and close the socket."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_quote(self, symbol):
+        """Returns the raw YQL latest quote of a symbol."""
+        if symbol in self.invalid_symbols:
+            quote = dict((column, None) for column in synthetic_quote(symbol).keys())
+            quote['Symbol'] = symbol
+            quote['ErrorIndicationreturnedforsymbolchangedinvalid'] = YQL_INVALID_SYMBOL % (symbol, )
+            return quote
+
+        fixture = self.fixtures.get(symbol, {})
+        if fixture.has_key('quote'):
+            return fixture['quote']
+
+        return synthetic_quote(symbol)
+
+    def get_history(self, symbol, start_date, end_date):
+        """Returns the raw CSV API history rows of a symbol between two dates."""
+        fixture = self.fixtures.get(symbol, {})
+
+        if fixture.has_key('history'):
+            start_key = start_date.isoformat()
+            end_key = end_date.isoformat()
+            return [row for row in fixture['history'] if start_key <= row['Date'] <= end_key]
+
+        return synthetic_history(symbol, start_date, end_date)
+
+    def respond(self, path):
+        """Returns the HTTP status, content type and body of the response to a path."""
+        with self.lock:
+            self.requests += 1
+
+        # Delay the response
+        latency = self.latency
+        if isinstance(latency, tuple):
+            latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+        if self.limiter is not None and not self.limiter.try_acquire():
+            with self.lock:
+                self.throttled += 1
+            return THROTTLE_STATUS, 'text/plain', 'Throttled'
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            return 500, 'text/plain', 'Internal Server Error'
+
+        parts = urlparse.urlsplit(path)
+        query = urlparse.parse_qs(parts.query)
+
+        if parts.path == '/d/quotes.csv':
+            return self.respond_csv_quote(query)
+        if parts.path == '/table.csv':
+            return self.respond_csv_history(query)
+        if parts.path == '/v1/public/yql':
+            return self.respond_yql(query)
+
+        return 404, 'text/plain', 'Not Found'
+
+    def respond_csv_quote(self, query):
+        """Returns the response of the CSV API latest quotes endpoint."""
+        # The '+' between symbols is decoded as a space
+        symbols = query.get('s', [''])[0].split()
+        columns = CSV_COLUMN_RE.findall(query.get('f', [''])[0])
+
+        lines = []
+        for symbol in symbols:
+            quote = self.get_quote(symbol)
+
+            values = []
+            for column in columns:
+                value = quote.get(CSV_COLUMNS.get(column))
+                if value is None:
+                    value = 'N/A'
+                # Strings are quoted, numbers are not
+                if not re.match(r'^-?[\d.]+$', value):
+                    value = '"%s"' % (value, )
+                values.append(value)
+
+            lines.append(','.join(values))
+
+        return 200, 'application/octet-stream', ''.join('%s\r\n' % (line, ) for line in lines)
+
+    def respond_csv_history(self, query):
+        """Returns the response of the CSV API history endpoint."""
+        symbol = query.get('s', [''])[0]
+
+        if symbol in self.invalid_symbols:
+            return 404, 'text/html', 'Not Found'
+
+        def get_date(month, day, year):
+            return date(int(query[year][0]), int(query[month][0]) + 1, int(query[day][0]))
+
+        start_date = get_date('a', 'b', 'c')
+        end_date = get_date('d', 'e', 'f')
+
+        lines = [','.join(HISTORY_CSV_COLUMNS)]
+        for row in self.get_history(symbol, start_date, end_date):
+            lines.append(','.join([row[header] for header in HISTORY_CSV_COLUMNS]))
+
+        return 200, 'text/csv', '\n'.join(lines) + '\n'
+
+    def respond_yql(self, query):
+        """Returns the response of the YQL endpoint for the Yahoo finance tables."""
+        statement = query.get('q', [''])[0]
+
+        match = re.match(r'\s*select\s+(.+?)\s+from\s+(\S+)\s+where\s+(.*)$', statement, re.I | re.S)
+        if match is None:
+            return 400, 'application/json', json.dumps({'error': {'description': 'Invalid query'}})
+
+        columns, table, conditions = match.groups()
+        columns = [column.strip() for column in columns.split(',')]
+
+        symbols = re.findall(r'"([^"]+)"', re.search(r'symbol\s*(?:=\s*"[^"]*"|in\s*\([^)]*\))', conditions).group())
+
+        if table == 'yahoo.finance.quotes':
+            results = [self.get_quote(symbol) for symbol in symbols]
+        elif table == 'yahoo.finance.historicaldata':
+            start_date = datetime.strptime(re.search(r'startDate\s*=\s*"([^"]+)"', conditions).group(1), '%Y-%m-%d').date()
+            end_date = datetime.strptime(re.search(r'endDate\s*=\s*"([^"]+)"', conditions).group(1), '%Y-%m-%d').date()
+
+            results = []
+            for symbol in symbols:
+                if symbol in self.invalid_symbols:
+                    continue
+                for row in self.get_history(symbol, start_date, end_date):
+                    # The YQL table names the adjusted close column differently
+                    row = dict(row, Symbol=symbol)
+                    row['Adj_Close'] = row.pop('Adj Close')
+                    results.append(row)
+        else:
+            return 400, 'application/json', json.dumps({'error': {'description': 'Unknown table %s' % (table, )}})
+
+        # Only return the requested columns
+        if columns != ['*']:
+            results = [
+                dict((column, row.get(column)) for column in columns)
+                for row in results
+            ]
+
+        # A single result is a dictionary rather than a list, and no results are null
+        count = len(results)
+
+        if not results:
+            results = None
+        elif count == 1:
+            results = {'quote': results[0]}
+        else:
+            results = {'quote': results}
+
+        body = {
+            'query': {
+                'count': count,
+                'created': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'lang': 'en-US',
+                'results': results,
+            }
+        }
+
+        return 200, 'application/json', json.dumps(body)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the Yahoo quote endpoints.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--rate', type=float, default=None, help='requests per second before throttling')
+    parser.add_argument('--capacity', type=int, default=None, help='burst size before throttling')
+    args = parser.parse_args()
+
+    server = StandInServer(
+        args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+        rate=args.rate, capacity=args.capacity,
+    )
+    print 'Serving Yahoo stand-in at %s' % (server.url, )
+    server.httpd.serve_forever()
@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+
+from datetime import date, timedelta
+
+from functions import atomic_write, merge_date_ranges, missing_date_ranges, parse_date
+
+__all__ = ['HistoryStore']
+
+
+class HistoryStore(object):
+    """On-disk store of raw historical quotes and the dates they cover.
+
+    Each stock has a JSON file in the store directory per history model that
+    holds the raw rows keyed by date and the date ranges that have been fetched.
+    When a date range is requested only the dates not yet covered are fetched
+    from the provider and merged into the file.
+
+    """
+    def __init__(self, directory):
+        """Initialise the store given the directory to keep the files in."""
+        self.directory = directory
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Locks per file, so concurrent quotes for a stock do not clash
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def get_path(self, quote):
+        """Returns the path of the file that stores the history of a quote."""
+        return os.path.join(
+            self.directory,
+            '%s-%s.%s.json' % (quote.__class__.__name__, quote.code, quote.exchange)
+        )
+
+    def get_lock(self, path):
+        """Returns the lock of a file."""
+        with self.lock:
+            return self.locks.setdefault(path, threading.Lock())
+
+    def load(self, path):
+        """Returns the covered date ranges and raw rows stored in a file."""
+        if not os.path.exists(path):
+            return [], {}
+
+        with open(path) as f:
+            data = json.load(f)
+
+        coverage = [
+            [parse_date(start_date), parse_date(end_date)]
+            for start_date, end_date in data['coverage']
+        ]
+
+        return coverage, data['rows']
+
+    def save(self, path, coverage, rows):
+        """Write the covered date ranges and raw rows to a file."""
+        data = {
+            'coverage': [
+                [start_date.isoformat(), end_date.isoformat()]
+                for start_date, end_date in coverage
+            ],
+            'rows': rows,
+        }
+
+        with atomic_write(path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    def get_raw_quote(self, quote, start_date, end_date):
+        """Returns the raw rows of a history quote between two dates.
+
+        Dates that are not covered by the store are fetched with the quote
+        model's get_raw_quote_chunks method.  All fields are fetched so the
+        stored rows can answer any request.  Missing dates without any trading
+        days are covered by no rows.  Today's date is never marked as covered
+        as its data may still change.
+
+        """
+        path = self.get_path(quote)
+
+        with self.get_lock(path):
+            coverage, rows = self.load(path)
+
+            missing = missing_date_ranges([start_date, end_date], coverage)
+
+            if missing:
+                # Fetch every field of the missing sub-ranges
+                fetcher = quote.__class__(
+                    quote.code, quote.exchange, [start_date, end_date],
+                    defer=True, transport=quote.transport
+                )
+
+                # The store keeps raw rows
+                fetcher.columnar = False
+
+                last_covered = date.today() - timedelta(days=1)
+
+                for missing_start, missing_end in missing:
+                    for row in fetcher.get_raw_quote_chunks(missing_start, missing_end, allow_empty=True):
+                        rows[row['Date']] = row
+
+                    if missing_start <= last_covered:
+                        coverage.append([missing_start, min(missing_end, last_covered)])
+
+                self.save(path, merge_date_ranges(coverage), rows)
+
+        # Return the rows within the date range, latest first like the providers
+        start_key = start_date.isoformat()
+        end_key = end_date.isoformat()
+
+        return [
+            rows[key] for key in sorted(rows.keys(), reverse=True)
+            if start_key <= key <= end_key
+        ]
@@ -1,11 +1,33 @@
+import array
+import csv
+import json
+import os
+import pickle
+import pytz
+import shutil
+import tempfile
+import threading
 import unittest
+import urllib
 import yql
 
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from time import sleep
 
+from cache import *
+from cassette import *
+from columns import *
+from downloader import *
 from functions import *
+from ohlcv import *
 from quote import *
+from ratelimit import *
+from records import *
+from server import *
+from store import *
+from timezones import *
+from transport import *
 
 
 class YahooQuoteTestCase(unittest.TestCase):
@@ -413,6 +435,53 @@ class YahooQuoteParseTimeTestCase(unittest.TestCase):
         )
 
 
+class YahooQuoteFetchManyTestCase(unittest.TestCase):
+    """Test Case for the `YahooQuote`.`fetch_many` function.
+
+    The `fetch_many` function should fetch the latest quotes of many codes with
+    a `symbol in (...)` query and return a quote object for each code.
+
+    """
+    def setUp(self):
+        self.server = StandInServer(invalid_symbols=['NOTACODE.AX'])
+        self.server.start()
+        set_provider_url(self.server.url)
+
+        self.test_codes = ['ABC', 'BHP', 'CBA']
+        self.test_exchange = 'AX'
+        self.test_fields = ['Code', 'Exchange', ]
+
+        # Expected parsed quotes
+        self.test_parsed_quotes = [
+            {'Code': 'ABC.AX', 'Exchange': 'ASX'},
+            {'Code': 'BHP.AX', 'Exchange': 'ASX'},
+            {'Code': 'CBA.AX', 'Exchange': 'ASX'},
+        ]
+
+        self.test_bad_codes = ['ABC', 'NOTACODE']
+
+    def tearDown(self):
+        set_provider_url()
+        self.server.stop()
+
+    def test_fetch_many(self):
+        """fetch_many should return parsed quotes in the order of the codes."""
+        quotes = YahooQuote.fetch_many(self.test_codes, self.test_exchange, self.test_fields)
+
+        self.assertEqual([quote.code for quote in quotes], self.test_codes)
+
+        self.assertEqual([quote.quote for quote in quotes], self.test_parsed_quotes)
+
+        # All of the codes should be fetched with one query
+        self.assertEqual(self.server.requests, 1)
+
+    def test_fetch_many_bad_code(self):
+        """fetch_many should raise Exception if any code is invalid."""
+        self.assertRaises(
+            Exception, YahooQuote.fetch_many, self.test_bad_codes, self.test_exchange
+        )
+
+
 class YahooCSVQuoteTestCase(unittest.TestCase):
     """Test Case for the YahooCSVQuote model.
 
@@ -800,6 +869,11 @@ class YahooCSVQuoteParseQuoteTestCase(unittest.TestCase):
         self.assertRaises(Exception, self.test_quote_no_fields.parse_quote)
 
 
+class MultiLetterCSVQuote(YahooCSVQuote):
+    """CSV quote model with query column symbols of more than one letter."""
+    _known_fields = dict(YahooCSVQuote._known_fields, xa=('Exchange', str), xb2=('Market', str))
+
+
 class YahooCSVQuoteParseSymbolsTestCase(unittest.TestCase):
     """Test Case for the `YahooCSVQuote`.`parse_symbols` function.
 
@@ -817,6 +891,7 @@ class YahooCSVQuoteParseSymbolsTestCase(unittest.TestCase):
             'nsl1hr5j1ym3m4n4xd1': (
                 'n', 's', 'l1', 'h', 'r5', 'j1', 'y', 'm3', 'm4', 'n4', 'x', 'd1'
             ),
+            'sc10l1': ('s', 'c10', 'l1', ),
         }
 
         self.test_quote = YahooCSVQuote(self.test_code, self.test_exchange, defer=True)
@@ -831,6 +906,15 @@ class YahooCSVQuoteParseSymbolsTestCase(unittest.TestCase):
             for symbol_str, symbol_list in self.test_symbols_dict.items()
         ]
 
+    def test_parse_symbols_multi_letter(self):
+        """parse_symbols should not split known symbols of more than one letter."""
+        quote = MultiLetterCSVQuote(self.test_code, self.test_exchange, defer=True)
+
+        self.assertEqual(quote.parse_symbols('sxal1xb2r5'), ('s', 'xa', 'l1', 'xb2', 'r5'))
+        self.assertEqual(quote.read_raw_quotes('"ABC.AX","ASX",3.33\r\n', 'sxal1'), [
+            {'s': 'ABC.AX', 'xa': 'ASX', 'l1': '3.33'}
+        ])
+
 
 class YahooCSVQuoteParseTimeTestCase(unittest.TestCase):
     """Test Case for the YahooCSVQuote.parse_time function.
@@ -849,6 +933,191 @@ class YahooCSVQuoteParseTimeTestCase(unittest.TestCase):
         )
 
 
+class YahooCSVQuoteReadRawQuotesTestCase(unittest.TestCase):
+    """Test Case for the `YahooCSVQuote`.`read_raw_quotes` function.
+
+    The `read_raw_quotes` function should read a CSV API response containing
+    one line per symbol into a list of raw quote dictionaries.
+
+    """
+    def setUp(self):
+        self.test_quote = YahooCSVQuote('ABC', 'AX', defer=True)
+        self.test_columns = 'sl1v'
+        self.test_body = '"ABC.AX",3.330,1351200\r\n"BHP.AX",35.10,5423100\r\n'
+
+        self.test_raw_quotes = [
+            {'s': 'ABC.AX', 'l1': '3.330', 'v': '1351200'},
+            {'s': 'BHP.AX', 'l1': '35.10', 'v': '5423100'},
+        ]
+
+    def test_read_raw_quotes(self):
+        """read_raw_quotes should return one raw quote per line of the body."""
+        self.assertEqual(
+            self.test_quote.read_raw_quotes(self.test_body, self.test_columns),
+            self.test_raw_quotes
+        )
+
+
+class CSVSpecTestCase(unittest.TestCase):
+    """Test Case for the `CSVSpec` class.
+
+    A CSV spec should hold the query string and columns of a field set, be
+    built once per field set and read responses without parsing the query
+    string.
+
+    """
+    def setUp(self):
+        self.test_fields = ['Code', 'Close', 'Volume']
+        self.test_spec = YahooCSVQuote.get_field_set(self.test_fields).csv_spec
+        self.test_body = '"ABC.AX",3.330,1351200\r\n\r\n"BHP.AX",35.10,5423100\r\n'
+
+    def test_spec(self):
+        """The spec should hold the query string and columns in order."""
+        self.assertEqual(self.test_spec.query, 'sl1v')
+        self.assertEqual(self.test_spec.columns, ('s', 'l1', 'v'))
+
+    def test_spec_cached(self):
+        """The spec should be built once per field set."""
+        self.assertTrue(YahooCSVQuote.get_field_set(self.test_fields).csv_spec is self.test_spec)
+
+    def test_spec_immutable(self):
+        """Setting an attribute of the spec should raise TypeError."""
+        self.assertRaises(TypeError, setattr, self.test_spec, 'query', 'sl1')
+
+    def test_read(self):
+        """read should return one raw quote per non-empty line of the body."""
+        self.assertEqual(self.test_spec.read(self.test_body), [
+            {'s': 'ABC.AX', 'l1': '3.330', 'v': '1351200'},
+            {'s': 'BHP.AX', 'l1': '35.10', 'v': '5423100'},
+        ])
+
+    def test_read_multi_character_columns(self):
+        """Columns of any length should be read without parsing a query string."""
+        spec = CSVSpec(('s', 'c10', 'ab2'))
+        self.assertEqual(spec.query, 'sc10ab2')
+        self.assertEqual(spec.read('"ABC.AX",1.00,x\n'), [{'s': 'ABC.AX', 'c10': '1.00', 'ab2': 'x'}])
+
+    def test_read_raw_quotes_default_spec(self):
+        """read_raw_quotes should use the spec of the requested fields by default."""
+        quote = YahooCSVQuote('ABC', 'AX', self.test_fields, defer=True)
+        self.assertEqual(quote.read_raw_quotes(self.test_body), self.test_spec.read(self.test_body))
+
+
+class YahooCSVQuoteFetchManyTestCase(unittest.TestCase):
+    """Test Case for the `YahooCSVQuote`.`fetch_many` function.
+
+    The `fetch_many` function should fetch the latest quotes of many codes with
+    batched requests and return a parsed quote object for each code.
+
+    """
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.start()
+        set_provider_url(self.server.url)
+
+        self.test_codes = ['ABC', 'BHP', 'CBA']
+        self.test_exchange = 'AX'
+        self.test_fields = ['Code', 'Exchange', ]
+
+        # Expected parsed quotes
+        self.test_parsed_quotes = [
+            {'Code': 'ABC.AX', 'Exchange': 'ASX'},
+            {'Code': 'BHP.AX', 'Exchange': 'ASX'},
+            {'Code': 'CBA.AX', 'Exchange': 'ASX'},
+        ]
+
+    def tearDown(self):
+        set_provider_url()
+        self.server.stop()
+
+    def test_fetch_many(self):
+        """fetch_many should return parsed quotes in the order of the codes."""
+        quotes = YahooCSVQuote.fetch_many(self.test_codes, self.test_exchange, self.test_fields)
+
+        self.assertEqual([quote.code for quote in quotes], self.test_codes)
+
+        self.assertEqual([quote.quote for quote in quotes], self.test_parsed_quotes)
+
+        # All of the codes should be fetched with one request
+        self.assertEqual(self.server.requests, 1)
+
+
+class StaticYQLResponse(object):
+    """YQL response of fixed results."""
+    def __init__(self, results):
+        self.results = results
+
+
+class StaticYahooQuote(YahooQuote):
+    """Latest quote model that answers YQL queries with fixed rows instead of fetching them."""
+    rows = []
+
+    def call_provider(self, fetch, *args, **kwargs):
+        return StaticYQLResponse({'quote': StaticYahooQuote.rows})
+
+
+class ProcessBatchErrorsTestCase(unittest.TestCase):
+    """Test Case for errors of the `process_batch` functions.
+
+    A quote that cannot be processed should have its error stored without
+    stopping the other quotes of the batch, and an Exception should be raised
+    once every quote is processed.
+
+    """
+    def setUp(self):
+        self.server = StandInServer(invalid_symbols=['NOTACODE.AX'])
+        self.server.start()
+        set_provider_url(self.server.url)
+
+        self.test_codes = ['ABC', 'NOTACODE', 'CBA']
+
+        StaticYahooQuote.rows = [
+            {'Symbol': '%s.AX' % (code, ), 'LastTradePriceOnly': '3.33', YQL_ERROR_COLUMN: None}
+            for code in self.test_codes
+        ]
+        StaticYahooQuote.rows[1][YQL_ERROR_COLUMN] = 'No such ticker symbol'
+
+    def tearDown(self):
+        set_provider_url()
+        self.server.stop()
+
+    def assert_batch_errors(self, quotes):
+        self.assertEqual([quote.error is None for quote in quotes], [True, False, True])
+        self.assertEqual([quote.quote is None for quote in quotes], [False, True, False])
+
+    def test_csv_batch_errors(self):
+        """The valid quotes of a CSV batch should be processed before the Exception is raised."""
+        quotes = [YahooCSVQuote(code, 'AX', ['Code', 'Close'], defer=True) for code in self.test_codes]
+
+        self.assertRaises(Exception, YahooCSVQuote.process_batch, quotes)
+        self.assert_batch_errors(quotes)
+
+    def test_yql_batch_errors(self):
+        """The valid quotes of a YQL batch should be processed before the Exception is raised."""
+        quotes = [StaticYahooQuote(code, 'AX', ['Code', 'Close'], defer=True) for code in self.test_codes]
+
+        self.assertRaises(Exception, StaticYahooQuote.process_batch, quotes)
+        self.assert_batch_errors(quotes)
+        self.assertEqual(quotes[2].quote, {'Code': 'CBA.AX', 'Close': Decimal('3.33')})
+
+    def test_fetch_many(self):
+        """fetch_many of both models should return a list of quotes in the order of the codes."""
+        codes = ['ABC', 'CBA']
+
+        for model in (StaticYahooQuote, YahooCSVQuote):
+            quotes = model.fetch_many(codes, 'AX', ['Code', 'Close'])
+
+            self.assertTrue(isinstance(quotes, list))
+            self.assertEqual([quote.quote['Code'] for quote in quotes], ['ABC.AX', 'CBA.AX'])
+
+    def test_batch_errors_not_raised(self):
+        """process_batch should only store the errors without raise_errors."""
+        quotes = [StaticYahooQuote(code, 'AX', ['Code', 'Close'], defer=True) for code in self.test_codes]
+
+        StaticYahooQuote.process_batch(quotes, raise_errors=False)
+        self.assert_batch_errors(quotes)
+
+
 class YahooQuoteHistoryTestCase(unittest.TestCase):
     """Test Case for the YahooQuoteHistory model.
 
@@ -1426,6 +1695,96 @@ class YahooCSVQuoteHistoryGetRawQuoteTestCase(unittest.TestCase):
         self.assertEqual(self.test_quote.get_raw_quote(), self.test_raw_quote)
 
 
+class YahooCSVQuoteHistoryReadRawRowsTestCase(unittest.TestCase):
+    """Test Case for the `YahooCSVQuoteHistory`.`read_raw_rows` and
+    `read_raw_columns` functions.
+
+    Bodies in the usual layout should be read without the CSV module into the
+    same rows it would return, other bodies should fall back to it.
+
+    """
+    def setUp(self):
+        self.test_body = 'Date,Open,High,Low,Close,Volume,Adj Close\n' \
+            '2013-04-12,3.36,3.38,3.31,3.33,1351200,3.33\n' \
+            '2013-04-11,3.35,3.41,3.34,3.36,1823400,3.36\n'
+
+    def read_dict_rows(self, body):
+        return [row for row in csv.DictReader(body.split('\n'))]
+
+    def test_read_raw_columns(self):
+        """read_raw_columns should return the values of each column, latest first."""
+        raw_columns = YahooCSVQuoteHistory.read_raw_columns(self.test_body)
+
+        self.assertEqual(sorted(raw_columns.keys()), sorted(HISTORY_CSV_COLUMNS))
+        self.assertEqual(raw_columns['Date'], ['2013-04-12', '2013-04-11'])
+        self.assertEqual(raw_columns['Adj Close'], ['3.33', '3.36'])
+
+    def test_read_raw_columns_empty(self):
+        """read_raw_columns should return empty columns for a body without rows."""
+        raw_columns = YahooCSVQuoteHistory.read_raw_columns(HISTORY_CSV_HEADER + '\n')
+
+        self.assertEqual(raw_columns['Date'], [])
+
+    def test_read_raw_columns_other_layout(self):
+        """read_raw_columns should return None for bodies it cannot read."""
+        bodies = [
+            'Date,Close\n2013-04-12,3.33\n',
+            self.test_body.replace('3.36,3.38', '"3.36",3.38'),
+            self.test_body.replace(',1351200', ''),
+            self.test_body + '\n2013-04-10,3.35,3.41,3.34,3.36,1823400,3.36\n',
+            '',
+        ]
+
+        for body in bodies:
+            self.assertEqual(YahooCSVQuoteHistory.read_raw_columns(body), None)
+
+    def test_read_raw_rows(self):
+        """read_raw_rows should return the rows of the CSV module."""
+        for body in [self.test_body, self.test_body.replace('\n', '\r\n')]:
+            self.assertEqual(YahooCSVQuoteHistory.read_raw_rows(body), self.read_dict_rows(self.test_body))
+
+    def test_read_raw_rows_fallback(self):
+        """read_raw_rows should read other bodies with the CSV module."""
+        body = 'Date,Close\n2013-04-12,"3.33"\n'
+
+        self.assertEqual(YahooCSVQuoteHistory.read_raw_rows(body), self.read_dict_rows(body))
+
+    def test_columnar_history(self):
+        """A columnar history should parse the response into columns from the raw columns."""
+        quote = YahooCSVQuoteHistory(
+            'ABC', 'AX', [date(2013, 4, 11), date(2013, 4, 12)], ['Date', 'Close'],
+            defer=True, transport=StaticTransport(self.test_body)
+        )
+        quote.columnar = True
+
+        self.assertEqual(quote.get_raw_quote(), YahooCSVQuoteHistory.read_raw_columns(self.test_body))
+
+        quote.process_quote()
+
+        self.assertEqual(quote.columns.dates, [date(2013, 4, 11), date(2013, 4, 12)])
+        self.assertEqual(list(quote.columns['Close']), [3.36, 3.33])
+        self.assertEqual(quote.raw_quote, None)
+
+    def test_columnar_history_rows(self):
+        """A history should parse raw columns shared by a columnar history into rows."""
+        quote = YahooCSVQuoteHistory('ABC', 'AX', [date(2013, 4, 11), date(2013, 4, 12)], defer=True)
+        quote.quote_fields = quote.get_quote_fields()
+        quote.raw_quote = YahooCSVQuoteHistory.read_raw_columns(self.test_body)
+
+        self.assertEqual(quote.parse_quote()[1]['Close'], Decimal('3.36'))
+
+
+class StaticTransport(object):
+    """Transport that responds to every url with a fixed body."""
+    def __init__(self, body):
+        self.body = body
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        return self.body
+
+
 class YahooCSVQuoteHistoryParseQuoteTestCase(unittest.TestCase):
     """The `YahooCSVQuoteHistory`.`parse_quote` function should correctly parse the
     information from a Yahoo CSV stock history.
@@ -1529,178 +1888,2040 @@ class YahooCSVQuoteHistoryParseQuoteTestCase(unittest.TestCase):
         self.assertRaises(Exception, self.test_quote_no_fields.parse_quote)
 
 
-class ValidateDateRangeTestCase(unittest.TestCase):
-    """Test Case for the `validate_date_range` function.
-
-    The `validate_date_range` function will return True if the given date range
-    validates against a set of custom rules.  Date ranges are used to extract
-    historical data for a given stock.
+class GatherQuotesTestCase(unittest.TestCase):
+    """Test Case for the `gather_quotes` function.
 
-    A valid date range is a list of two elements; each element may be a date
-    object or a string representation of the date.
+    The `gather_quotes` function should process many deferred quotes
+    concurrently and return them in the given order.
 
     """
     def setUp(self):
-        # The valid date range, which good date range inputs must match
-        self.valid_date = [date(2013, 4, 10), date(2013, 4, 12)]
+        self.server = StandInServer(invalid_symbols=['NOTACODE.AX'])
+        self.server.start()
+        set_provider_url(self.server.url)
 
-        # Some good date range inputs
-        self.good_dates = [
-            [date(2013, 4, 10), date(2013, 4, 12)],
-            ['2013-04-10', '2013-04-12'],
-            ['2013-04-10', date(2013, 4, 12)],
+        self.transport = HTTPTransport(timeout=10)
+
+        self.test_codes = ['ABC', 'BHP', 'CBA']
+        self.test_exchange = 'AX'
+        self.test_fields = ['Code', ]
+
+        self.test_quotes = [
+            YahooCSVQuote(code, self.test_exchange, self.test_fields, defer=True, transport=self.transport)
+            for code in self.test_codes
+        ]
+        self.test_bad_quotes = [
+            YahooCSVQuoteHistory(
+                'NOTACODE', self.test_exchange, [date(2013, 4, 8), date(2013, 4, 12)],
+                defer=True, transport=self.transport
+            )
         ]
-        # Valid date ranges can be the same day
-        self.good_date_same_day = [date(2013, 4, 10), '2013-04-10']
-        self.valid_date_same_day = [date(2013, 4, 10), date(2013, 4, 10)]
 
-        # Number of days to lookback when no start_date is given
-        self.lookback_days = LOOKBACK_DAYS
+    def tearDown(self):
+        set_provider_url()
+        self.transport.close()
+        self.server.stop()
 
-        # Define an end_date and start_date to reuse when required for other tests
-        self.start_date = date(2013, 4, 10)
-        self.end_date = date(2013, 4, 12)
+    def test_gather_quotes(self):
+        """gather_quotes should process every quote and keep the given order."""
+        quotes = gather_quotes(self.test_quotes, concurrency=2)
 
-        # Define start and end dates to be used when they are not specified
-        self.no_end_date = datetime.today().date()
-        self.no_start_date = self.end_date - timedelta(days=self.lookback_days)
-        self.no_start_date_no_end_date = self.no_end_date - timedelta(days=self.lookback_days)
+        self.assertEqual(quotes, self.test_quotes)
 
-        # Test date range for when no start_date is given
-        self.good_date_no_start = [None, self.end_date]
-        # Test date range for when no end_date is given
-        self.good_date_no_end = [self.start_date, '']
-        # Test date range for when no start or end date is given
-        self.good_date_no_start_no_end = ['', None]
+        self.assertEqual(
+            [quote.quote['Code'] for quote in quotes],
+            ['%s.%s' % (code, self.test_exchange) for code in self.test_codes]
+        )
+        self.assertEqual(self.server.requests, 3)
 
-        # Some bad date range inputs
-        self.bad_date_not_list = [2013, {}, '']
-        self.bad_date_wrong_length = [
-            [], ['2013-04-10'], ['2013-04-10', '2013-04-11', '2013-04-12', ]
+    def test_gather_quotes_exception(self):
+        """gather_quotes should raise the exception of a failed quote."""
+        self.assertRaises(TransportError, gather_quotes, self.test_quotes + self.test_bad_quotes)
+
+    def test_gather_quotes_return_exceptions(self):
+        """gather_quotes should return exceptions in place of failed quotes if asked."""
+        results = gather_quotes(self.test_bad_quotes + self.test_quotes, return_exceptions=True)
+
+        self.assertTrue(isinstance(results[0], TransportError))
+        self.assertEqual(results[1:], self.test_quotes)
+        self.assertEqual(results[3].quote['Code'], 'CBA.AX')
+
+
+class StaticQuoteHistory(YahooCSVQuoteHistory):
+    """History quote model that returns a fixed raw quote instead of fetching one.
+
+    The codes 'FAIL' and 'SLOW' raise an Exception and sleep respectively.
+
+    """
+    attempts = {}
+    requests = []
+
+    def get_raw_quote_range(self, start_date, end_date, allow_empty=False):
+        StaticQuoteHistory.attempts[self.code] = StaticQuoteHistory.attempts.get(self.code, 0) + 1
+        StaticQuoteHistory.requests.append([start_date, end_date])
+        if self.code == 'FAIL':
+            raise Exception('Failed to fetch quote')
+        if self.code == 'SLOW':
+            sleep(2)
+        return [
+            {'Date': day.isoformat(), 'Close': '3.33'}
+            for day in reversed(list(date_range_generator(start_date, end_date)))
         ]
-        self.bad_date_wrong_types = [[2013, ''], [None, Decimal('2013')], ]
-        self.bad_date_wrong_format = [date(2013, 4, 10), '12-04-2013']
-        self.bad_date_backwards = ['2013-04-12', date(2013, 4, 10)]
-        self.bad_date_future = [date(2020, 4, 10), '2020-04-12']
 
-    def test_good_date(self):
-        """validate_date_range should return True given valid date ranges."""
-        for good_date in self.good_dates:
-            ret, date_range = validate_date_range(good_date)
 
-            # Check function returned True
-            self.assertTrue(ret)
+class UndatedQuoteHistory(StaticQuoteHistory):
+    """History quote model that returns only the requested columns, like YQL."""
+    def get_raw_quote_range(self, start_date, end_date, allow_empty=False):
+        rows = super(UndatedQuoteHistory, self).get_raw_quote_range(start_date, end_date, allow_empty)
+        columns = self.get_quote_fields().columns
+        return [dict((column, row[column]) for column in columns) for row in rows]
 
-            # Check data returned matches valid date range
-            self.assertEqual(self.valid_date, date_range)
 
-    def test_good_date_same_day(self):
-        """validate_date_range should return True given valid date range (same day)."""
-        ret, date_range = validate_date_range(self.good_date_same_day)
+class ColumnarQuoteHistory(StaticQuoteHistory):
+    """History quote model that returns raw values per column, like a columnar CSV history."""
+    def get_raw_quote_range(self, start_date, end_date, allow_empty=False):
+        rows = super(ColumnarQuoteHistory, self).get_raw_quote_range(start_date, end_date)
+        return dict((column, [row[column] for row in rows]) for column in ('Date', 'Close'))
 
-        # Check function returned True
-        self.assertTrue(ret)
 
-        # Check data returned matches valid date range
-        self.assertEqual(self.valid_date_same_day, date_range)
+class TradingDayQuoteHistory(StaticQuoteHistory):
+    """History quote model that only returns rows for weekdays, like the providers."""
+    def get_raw_quote_range(self, start_date, end_date, allow_empty=False):
+        rows = [
+            row for row in super(TradingDayQuoteHistory, self).get_raw_quote_range(start_date, end_date)
+            if parse_date(row['Date']).weekday() < 5
+        ]
+        if not rows and not allow_empty:
+            raise Exception('Error with results')
+        return rows
 
-    def test_good_date_no_start(self):
-        """validate_date_range should return True even without range start."""
-        ret, date_range = validate_date_range(self.good_date_no_start)
 
-        # Check function returned True
-        self.assertTrue(ret)
+class HistoryDownloaderTestCase(unittest.TestCase):
+    """Test Case for the `HistoryDownloader` class.
 
-        # Check data returned matches valid date range
-        self.assertEqual(date_range, [self.no_start_date, self.end_date])
+    The `HistoryDownloader` should process a history for every job on a pool of
+    threads and yield the results as the jobs finish.
 
-    def test_good_date_no_end(self):
-        """validate_date_range should return True even without range end."""
-        ret, date_range = validate_date_range(self.good_date_no_end)
+    """
+    def setUp(self):
+        self.test_date_range = ['2013-04-12', '2013-04-12']
+        self.test_jobs = [
+            (code, 'AX', self.test_date_range) for code in ['ABC', 'BHP', 'CBA', 'NAB']
+        ]
+        self.test_parsed_quote = [{'Date': date(2013, 4, 12), 'Close': Decimal('3.33')}]
 
-        # Check function returned True
-        self.assertTrue(ret)
+        StaticQuoteHistory.attempts = {}
 
-        # Check data returned matches valid date range
-        self.assertEqual(date_range, [self.start_date, self.no_end_date])
+    def test_run(self):
+        """run should yield a processed history for every job."""
+        downloader = HistoryDownloader(self.test_jobs, model=StaticQuoteHistory, workers=2)
 
-    def test_good_date_no_start_no_end(self):
-        """validate_date_range should return True even without range start or end."""
-        ret, date_range = validate_date_range(self.good_date_no_start_no_end)
+        results = list(downloader.run())
 
-        # Check function returned True
-        self.assertTrue(ret)
+        self.assertEqual(sorted([job for job, history, error in results]), sorted(self.test_jobs))
+        self.assertEqual([error for job, history, error in results], [None] * len(self.test_jobs))
+        self.assertEqual(
+            [history.quote for job, history, error in results],
+            [self.test_parsed_quote] * len(self.test_jobs)
+        )
+        self.assertEqual(downloader.completed, len(self.test_jobs))
 
-        # Check data returned matches valid date range
-        self.assertEqual(date_range, [self.no_start_date_no_end_date, self.no_end_date])
+    def test_run_retries(self):
+        """run should retry a failed job before reporting the error."""
+        downloader = HistoryDownloader(
+            [('FAIL', 'AX', self.test_date_range)], model=StaticQuoteHistory, retries=2
+        )
 
-    def test_bad_date_not_list(self):
-        """validate_date_range should raise a TypeError given a non-list date range."""
-        [self.assertRaises(TypeError, validate_date_range, not_list)
-            for not_list in self.bad_date_not_list]
+        job, history, error = list(downloader.run())[0]
 
-    def test_bad_date_wrong_length(self):
-        """validate_date_range should raise a ValueError given a list of incorrect length."""
-        [self.assertRaises(ValueError, validate_date_range, wrong_length)
-            for wrong_length in self.bad_date_wrong_length]
+        self.assertTrue(history is None)
+        self.assertTrue(isinstance(error, Exception))
+        self.assertEqual(StaticQuoteHistory.attempts['FAIL'], 3)
+        self.assertEqual(downloader.failed, 1)
 
-    def test_bad_date_wrong_type(self):
-        """validate_date_range should raise a TypeError given a list with wrong types."""
-        self.assertRaises(TypeError, validate_date_range, self.bad_date_wrong_types)
+    def test_run_timeout(self):
+        """run should report a job that runs longer than the timeout as failed."""
+        downloader = HistoryDownloader(
+            [('SLOW', 'AX', self.test_date_range)], model=StaticQuoteHistory, timeout=0.5
+        )
 
-    def test_bad_date_wrong_format(self):
-        """validate_date_range should raise a TypeError given a list with wrong format."""
-        self.assertRaises(ValueError, validate_date_range, self.bad_date_wrong_format)
+        job, history, error = list(downloader.run())[0]
 
-    def test_bad_date_backwards(self):
-        """validate_date_range should raise an Exception given a backwards date range."""
-        self.assertRaises(ValueError, validate_date_range, self.bad_date_backwards)
+        self.assertTrue(history is None)
+        self.assertTrue(isinstance(error, Exception))
 
-    def test_bad_date_future(self):
-        """validate_date_range should raise an Exception given a future date range."""
-        self.assertRaises(ValueError, validate_date_range, self.bad_date_future)
+    def test_report(self):
+        """report should summarise the progress of the download."""
+        downloader = HistoryDownloader(self.test_jobs, model=StaticQuoteHistory)
 
+        list(downloader.run())
 
-class DateRangeGeneratorTestCase(unittest.TestCase):
-    """Test Case for the `date_range_generator` function.
+        self.assertTrue(downloader.report().startswith('4/4 jobs finished (0 failed)'))
 
-    The `date_range_generator` function will return a generator of date objects
-    if given a list containing the start and end dates of the range.
+
+class HTTPTransportTestCase(unittest.TestCase):
+    """Test Case for the `HTTPTransport` class.
+
+    The `HTTPTransport` should fetch urls over persistent connections that are
+    reused between requests to the same host.
 
     """
     def setUp(self):
-        self.start_date = date(2013, 4, 10)
-        self.end_date = date(2013, 4, 12)
+        self.server = StandInServer(fixtures={'ABC.AX': {'quote': {'Symbol': 'ABC.AX', 'StockExchange': 'ASX'}}})
+        self.server.start()
 
-        self.start_datetime = datetime(2013, 4, 10, 15, 44, 56)
-        self.end_datetime = datetime(2013, 4, 12, 6, 1, 25)
+        self.test_url = '%s/d/quotes.csv?s=ABC.AX&f=sx' % (self.server.url, )
+        self.test_bad_url = '%s/d/notfound.csv' % (self.server.url, )
+        self.test_body = '"ABC.AX","ASX"'
+        self.test_pool_key = ('http', self.server.url[len('http://'):])
 
-        self.generated_date_range = [
-            date(2013, 4, 10), date(2013, 4, 11), date(2013, 4, 12)
-        ]
+        self.transport = HTTPTransport(timeout=10)
 
-        self.bad_date_wrong_types = ['2013-04-10', 2013]
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
 
-    def test_date_range_generator(self):
-        """date_range_generator should return a generator of dates if given date bounds."""
-        date_gen = date_range_generator(self.start_date, self.end_date)
+    def test_get(self):
+        """get should return the body of the response."""
+        self.assertEqual(self.transport.get(self.test_url).strip(), self.test_body)
 
-        self.assertEqual(list(date_gen), self.generated_date_range)
+    def test_get_reuses_connection(self):
+        """get should return the connection to the pool and reuse it."""
+        self.transport.get(self.test_url)
+        connection = self.transport.pools[self.test_pool_key][0]
 
-    def test_generate_datetime_range(self):
-        """date_range_generator should return a generator of dates if given datetime bounds."""
-        date_gen = date_range_generator(self.start_datetime, self.end_datetime)
+        self.transport.get(self.test_url)
 
-        self.assertEqual(list(date_gen), self.generated_date_range)
+        self.assertTrue(self.transport.pools[self.test_pool_key][0] is connection)
+        self.assertEqual(len(self.transport.pools[self.test_pool_key]), 1)
 
-    def test_generate_bad_date_wrong_types(self):
-        """date_range_generator should raise an Exception if the inputs are not dates."""
-        self.assertRaises(Exception, date_range_generator,
-            (self.bad_date_wrong_types[0], self.bad_date_wrong_types[1]))
+    def test_get_bad_status(self):
+        """get should raise TransportError if the response is unsuccessful."""
+        try:
+            self.transport.get(self.test_bad_url)
+        except TransportError, e:
+            self.assertEqual(e.status, 404)
+        else:
+            self.fail('TransportError was not raised')
 
+        # The connection is still reused
+        self.transport.get(self.test_url)
+        self.assertEqual(len(self.transport.pools[self.test_pool_key]), 1)
 
-class ParseDateTestCase(unittest.TestCase):
-    """Test Case for the `parse_date` function.
+    def test_get_reconnects(self):
+        """get should retry on a new connection if the server closed the pooled one."""
+        self.server.drop_connections = True
+
+        for i in range(3):
+            self.assertEqual(self.transport.get(self.test_url).strip(), self.test_body)
+
+        self.assertEqual(self.server.requests, 3)
+
+
+class YahooCSVQuoteHistoryIterQuoteTestCase(unittest.TestCase):
+    """The `YahooCSVQuoteHistory`.`iter_quote` function should read the CSV API
+    response incrementally and yield each parsed row of the history.
+
+    """
+    def setUp(self):
+        # Gzip compressed responses sent in small chunks
+        self.server = StandInServer(chunk_size=512)
+        self.server.start()
+        set_provider_url(self.server.url)
+
+        self.transport = HTTPTransport(timeout=10)
+
+        self.test_code = 'ABC'
+        self.test_exchange = 'AX'
+        self.test_dates = [date(2012, 1, 1), date(2013, 4, 12)]
+        self.test_fields = ['Date', 'Close', ]
+
+        self.test_quote = YahooCSVQuoteHistory(
+            self.test_code, self.test_exchange, self.test_dates, self.test_fields,
+            defer=True, transport=self.transport
+        )
+        self.test_quote.chunk_days = None
+
+    def tearDown(self):
+        set_provider_url()
+        self.transport.close()
+        self.server.stop()
+
+    def test_iter_quote(self):
+        """iter_quote should yield the parsed rows of the history in the order of get_raw_quote."""
+        rows = list(self.test_quote.iter_quote())
+
+        self.test_quote.process_quote()
+
+        self.assertEqual(rows, self.test_quote.quote)
+        self.assertEqual(rows[0]['Date'], date(2013, 4, 12))
+        self.assertEqual(len(rows), len(self.test_quote.get_raw_quote()))
+
+    def test_iter_quote_unprocessed(self):
+        """iter_quote should leave the raw quote and quote unpopulated."""
+        list(self.test_quote.iter_quote())
+
+        self.assertTrue(self.test_quote.raw_quote is None)
+        self.assertTrue(self.test_quote.quote is None)
+
+    def test_iter_lines(self):
+        """iter_lines should decompress a chunked gzip response into its lines."""
+        url = self.test_quote.get_quote_url(*self.test_dates)
+
+        lines = list(self.transport.iter_lines(url, chunk_size=100))
+        body = self.transport.get(url)
+        headers = self.transport.get_response_headers()
+
+        self.assertEqual((headers['transfer-encoding'], headers['content-encoding']), ('chunked', 'gzip'))
+        self.assertEqual(lines, body.splitlines())
+        self.assertTrue(len(lines) > 300)
+
+        # The connection of the fully read response is reused
+        self.assertEqual(len(self.transport.pools.values()[0]), 1)
+
+
+class HistoryQuoteBaseIterQuoteTestCase(unittest.TestCase):
+    """The `HistoryQuoteBase`.`iter_quote` function should yield each parsed row of
+    the raw quote.
+
+    """
+    def setUp(self):
+        self.test_quote = StaticQuoteHistory('ABC', 'AX', ['2013-04-12', '2013-04-12'], defer=True)
+        self.test_parsed_quote = [{'Date': date(2013, 4, 12), 'Close': Decimal('3.33')}]
+
+    def test_iter_quote(self):
+        """iter_quote should yield the parsed rows of the raw quote."""
+        self.assertEqual(
+            list(HistoryQuoteBase.iter_quote(self.test_quote)), self.test_parsed_quote
+        )
+
+
+class QuoteCacheTestCase(unittest.TestCase):
+    """Test Case for the `QuoteCache` class.
+
+    The `QuoteCache` should return cached values until they expire, evict the
+    least recently used values and count its hits and misses.
+
+    """
+    def setUp(self):
+        self.fetches = []
+
+        self.test_cache = QuoteCache(ttl=60, max_size=2)
+
+    def fetch(self, value):
+        """Returns a function that records the fetch and returns the value."""
+        def fetch():
+            self.fetches.append(value)
+            return value
+        return fetch
+
+    def test_get(self):
+        """get should fetch a value once and then return the cached value."""
+        self.assertEqual(self.test_cache.get('ABC', self.fetch(1)), 1)
+        self.assertEqual(self.test_cache.get('ABC', self.fetch(2)), 1)
+
+        self.assertEqual(self.fetches, [1])
+        self.assertEqual((self.test_cache.hits, self.test_cache.misses), (1, 1))
+
+    def test_get_expired(self):
+        """get should fetch a new value once the cached value expires."""
+        self.test_cache.ttl = 0.1
+
+        self.test_cache.get('ABC', self.fetch(1))
+        sleep(0.2)
+
+        self.assertEqual(self.test_cache.get('ABC', self.fetch(2)), 2)
+
+    def test_get_evicts_least_recently_used(self):
+        """get should evict the least recently used value when the cache is full."""
+        self.test_cache.get('ABC', self.fetch(1))
+        self.test_cache.get('BHP', self.fetch(2))
+        self.test_cache.get('ABC', self.fetch(1))
+        self.test_cache.get('CBA', self.fetch(3))
+
+        self.assertEqual(self.test_cache.entries.keys(), ['ABC', 'CBA'])
+
+    def test_get_stale(self):
+        """get should serve a stale value while it is refreshed in the background."""
+        self.test_cache.ttl = 0.5
+        self.test_cache.stale_ttl = 60
+
+        self.test_cache.get('ABC', self.fetch(1))
+        sleep(0.6)
+
+        self.assertEqual(self.test_cache.get('ABC', self.fetch(2)), 1)
+        sleep(0.1)
+
+        self.assertEqual(self.test_cache.get('ABC', self.fetch(3)), 2)
+        self.assertEqual(self.test_cache.stale_hits, 1)
+
+
+    def test_lookup(self):
+        """lookup should return a fresh cached value without fetching, or None."""
+        self.assertEqual(self.test_cache.lookup('ABC'), None)
+
+        self.test_cache.set('ABC', 1)
+
+        self.assertEqual(self.test_cache.lookup('ABC'), 1)
+        self.assertEqual((self.test_cache.hits, self.test_cache.misses), (1, 1))
+
+        self.test_cache.ttl = -1
+
+        self.assertEqual(self.test_cache.lookup('ABC'), None)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """Test Case for the `SingleFlight` class.
+
+    Concurrent requests to a `SingleFlight` for the same key should share a
+    single call.
+
+    """
+    def setUp(self):
+        self.calls = []
+
+        self.test_single_flight = SingleFlight()
+
+    def fetch(self):
+        """Record the call and return a value after a short delay."""
+        self.calls.append(1)
+        sleep(0.2)
+        return 'ABC'
+
+    def fetch_error(self):
+        """Raise an Exception after a short delay."""
+        sleep(0.2)
+        raise Exception('Failed to fetch quote')
+
+    def run_threads(self, fetch, count):
+        """Returns the results of running count requests for the same key at once."""
+        results = []
+
+        def request():
+            try:
+                results.append(self.test_single_flight.do('ABC', fetch))
+            except Exception, e:
+                results.append(e)
+
+        threads = [threading.Thread(target=request) for i in range(count)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+
+        return results
+
+    def test_do(self):
+        """do should make one call for concurrent requests and share its value."""
+        results = self.run_threads(self.fetch, 5)
+
+        self.assertEqual(results, ['ABC'] * 5)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.test_single_flight.shared, 4)
+
+    def test_do_error(self):
+        """do should raise the exception of the shared call for every request."""
+        results = self.run_threads(self.fetch_error, 3)
+
+        self.assertEqual([isinstance(result, Exception) for result in results], [True] * 3)
+
+    def test_do_sequential(self):
+        """do should make a new call once the previous call has finished."""
+        self.test_single_flight.do('ABC', self.fetch)
+        self.test_single_flight.do('ABC', self.fetch)
+
+        self.assertEqual(len(self.calls), 2)
+
+
+class QuoteBaseCacheTestCase(unittest.TestCase):
+    """Test Case for the cache of the `QuoteBase`.`process_quote` function.
+
+    Processing a quote with a cache should only fetch the raw quote if it is not
+    cached.
+
+    """
+    def setUp(self):
+        self.test_date_range = ['2013-04-12', '2013-04-12']
+        self.test_cache = QuoteCache()
+
+        StaticQuoteHistory.attempts = {}
+
+    def test_process_quote_cached(self):
+        """process_quote should use the cached raw quote of an identical quote."""
+        for i in range(3):
+            quote = StaticQuoteHistory('ABC', 'AX', self.test_date_range, defer=True)
+            quote.cache = self.test_cache
+            quote.process_quote()
+
+        self.assertEqual(StaticQuoteHistory.attempts['ABC'], 1)
+        self.assertEqual(self.test_cache.hits, 2)
+
+    def test_process_quote_different_date_range(self):
+        """process_quote should not use the cached raw quote of another date range."""
+        for date_range in [self.test_date_range, ['2013-04-11', '2013-04-12']]:
+            quote = StaticQuoteHistory('ABC', 'AX', date_range, defer=True)
+            quote.cache = self.test_cache
+            quote.process_quote()
+
+        self.assertEqual(StaticQuoteHistory.attempts['ABC'], 2)
+
+
+class QuoteBaseGetFieldSetTestCase(unittest.TestCase):
+    """The `QuoteBase`.`get_field_set` function should return the same immutable
+    field set for the same list of fields.
+
+    """
+    def setUp(self):
+        self.test_fields = ['Close', 'Code']
+
+    def test_get_field_set(self):
+        """get_field_set should return the query columns in the requested order."""
+        field_set = YahooCSVQuote.get_field_set(self.test_fields)
+
+        self.assertEqual(field_set.columns, ('l1', 's'))
+        self.assertEqual(field_set, {'l1': ('Close', Decimal), 's': ('Code', str)})
+
+    def test_get_field_set_cached(self):
+        """get_field_set should return the same field set for the same fields."""
+        self.assertTrue(
+            YahooCSVQuote.get_field_set(self.test_fields) is YahooCSVQuote.get_field_set(tuple(self.test_fields))
+        )
+        self.assertFalse(
+            YahooCSVQuote.get_field_set(self.test_fields) is YahooQuote.get_field_set(self.test_fields)
+        )
+
+    def test_get_field_set_immutable(self):
+        """A field set should not be changed."""
+        field_set = YahooCSVQuote.get_field_set(self.test_fields)
+
+        self.assertRaises(TypeError, field_set.__setitem__, 'v', ('Volume', Decimal))
+        self.assertRaises(TypeError, field_set.pop, 'l1')
+
+    def test_get_field_set_unknown(self):
+        """get_field_set should raise Exception if a field is unknown."""
+        self.assertRaises(Exception, YahooCSVQuote.get_field_set, ['RandomField'])
+
+
+class MakeRowConverterTestCase(unittest.TestCase):
+    """Test Case for the `make_row_converter` function.
+
+    The generated function should convert a raw row like the quote fields.
+
+    """
+    def setUp(self):
+        self.test_quote_fields = {
+            'Date': ('Date', parse_date),
+            'Adj Close': ('Adj Close', Decimal),
+        }
+        self.test_row = {'Date': '2013-04-12', 'Adj Close': '3.45', 'Volume': '1000'}
+        self.test_output = {'Date': date(2013, 4, 12), 'Adj Close': Decimal('3.45')}
+
+    def test_make_row_converter(self):
+        """The row converter should only convert the columns of the quote fields."""
+        convert_row = make_row_converter(self.test_quote_fields)
+
+        self.assertEqual(convert_row(self.test_row), self.test_output)
+
+    def test_make_row_converter_missing_column(self):
+        """The row converter should leave out the columns that a row is missing."""
+        convert_row = make_row_converter(self.test_quote_fields)
+
+        self.assertEqual(convert_row({'Date': '2013-04-12'}), {'Date': date(2013, 4, 12)})
+
+    def test_get_row_converter_cached(self):
+        """get_row_converter should generate the row converter of a field set once."""
+        field_set = YahooCSVQuoteHistory.get_field_set(['Date', 'Close'])
+
+        self.assertTrue(get_row_converter(field_set) is get_row_converter(field_set))
+
+
+class TimeZoneConverterTestCase(unittest.TestCase):
+    """Test Case for the `TimeZoneConverter` class.
+
+    The converter should give the same datetimes as pytz's localize and
+    normalize, including on the days the timezones change their offsets.
+
+    """
+    def setUp(self):
+        self.converter = TimeZoneConverter('US/Eastern', 'Australia/Sydney')
+
+        # Days around the daylight saving changes of both timezones in 2013
+        self.test_days = [
+            date(2013, 3, 9), date(2013, 3, 10), date(2013, 3, 11),
+            date(2013, 4, 6), date(2013, 4, 7), date(2013, 4, 10),
+            date(2013, 10, 5), date(2013, 10, 6), date(2013, 11, 3),
+        ]
+        self.test_datetimes = [
+            datetime.combine(day, time(hour, 30))
+            for day in self.test_days for hour in range(24)
+        ]
+
+    def test_convert(self):
+        """convert should match localize and normalize."""
+        for value in self.test_datetimes:
+            converted = self.converter.convert(value)
+            expected = self.converter.convert_exact(value)
+
+            self.assertEqual(converted, expected)
+            self.assertEqual(converted.tzinfo, expected.tzinfo)
+
+    def test_convert_caches_day(self):
+        """convert should remember the offset of a day without an offset change."""
+        self.converter.convert(datetime(2013, 4, 10, 16, 10))
+
+        self.assertEqual(
+            self.converter.days[date(2013, 4, 10)][0],
+            timedelta(hours=14)
+        )
+
+    def test_convert_offset_change(self):
+        """convert should not remember the offset of a day with an offset change."""
+        self.converter.convert(datetime(2013, 3, 10, 16, 10))
+
+        self.assertEqual(self.converter.days[date(2013, 3, 10)], None)
+
+    def test_convert_many(self):
+        """convert_many should convert every datetime."""
+        self.assertEqual(
+            self.converter.convert_many(self.test_datetimes),
+            [self.converter.convert_exact(value) for value in self.test_datetimes]
+        )
+
+    def test_parse_datetimes(self):
+        """parse_datetimes should parse and convert every Yahoo date and time."""
+        self.assertEqual(
+            YahooQuote.parse_datetimes([('04/10/2013', '10:21pm'), ('04/11/2013', '4:10pm')]),
+            [
+                pytz.timezone(TIME_ZONE).localize(datetime(2013, 4, 11, 12, 21)),
+                pytz.timezone(TIME_ZONE).localize(datetime(2013, 4, 12, 6, 10)),
+            ]
+        )
+
+
+class HistoryColumnsTestCase(unittest.TestCase):
+    """Test Case for the `HistoryColumns` class.
+
+    The columns should hold each field in a typed array, oldest first, and be
+    sliced by date without copying the arrays.
+
+    """
+    def setUp(self):
+        self.test_date_range = [date(2013, 4, 8), date(2013, 4, 12)]
+        self.test_rows = [
+            {'Date': day.isoformat(), 'Close': '3.4%d' % (day.day - 8, ), 'Volume': '%d' % (day.day * 100, )}
+            for day in reversed(list(date_range_generator(*self.test_date_range)))
+        ]
+        self.test_quote_fields = YahooCSVQuoteHistory.get_field_set(['Date', 'Close', 'Volume'])
+
+        self.columns = HistoryColumns.from_rows(self.test_rows, self.test_quote_fields)
+
+    def test_from_rows(self):
+        """from_rows should hold each field in date order."""
+        self.assertEqual(len(self.columns), 5)
+        self.assertEqual(self.columns.dates[0], date(2013, 4, 8))
+        self.assertEqual(list(self.columns['Close']), [3.40, 3.41, 3.42, 3.43, 3.44])
+        self.assertEqual(list(self.columns['Volume']), [800, 900, 1000, 1100, 1200])
+
+    def test_from_raw_columns(self):
+        """from_raw_columns should hold the same columns as from_rows."""
+        raw_columns = dict(
+            (column, [row[column] for row in self.test_rows]) for column in ['Date', 'Close', 'Volume']
+        )
+        columns = HistoryColumns.from_raw_columns(raw_columns, self.test_quote_fields)
+
+        self.assertEqual(columns.dates, self.columns.dates)
+        self.assertEqual(list(columns['Close']), list(self.columns['Close']))
+
+        # Unordered dates are sorted
+        raw_columns = dict((column, values[1:] + values[:1]) for column, values in raw_columns.items())
+        columns = HistoryColumns.from_raw_columns(raw_columns, self.test_quote_fields)
+
+        self.assertEqual(list(columns['Volume']), list(self.columns['Volume']))
+
+    def test_parse_date_ordinals(self):
+        """parse_date_ordinals should return the ordinals of the dates, like parse_date."""
+        dates = ['2012-02-29', '2013-01-31', '2013-04-01', '2013-4-8']
+
+        self.assertEqual(parse_date_ordinals(dates), [parse_date(value).toordinal() for value in dates])
+        self.assertEqual(parse_date_ordinals(dates[:3]), [parse_date(value).toordinal() for value in dates[:3]])
+        self.assertEqual(parse_date_ordinals([]), [])
+
+        for value in ['2013-02-29', '2013-04-31', '2013-04-00', '2013-04-32']:
+            self.assertRaises(ValueError, parse_date_ordinals, ['2013-04-01', value])
+
+    def test_between(self):
+        """between should return the rows between two dates, sharing the arrays."""
+        sliced = self.columns.between(date(2013, 4, 9), '2013-04-11')
+
+        self.assertEqual(sliced.dates, [date(2013, 4, 9), date(2013, 4, 10), date(2013, 4, 11)])
+        self.assertEqual(list(sliced['Close']), [3.41, 3.42, 3.43])
+        self.assertTrue(sliced.arrays is self.columns.arrays)
+
+    def test_between_slice(self):
+        """Slicing with dates should leave the open end of the slice open."""
+        self.assertEqual(self.columns[date(2013, 4, 11):].dates, [date(2013, 4, 11), date(2013, 4, 12)])
+        self.assertEqual(len(self.columns[date(2013, 5, 1):]), 0)
+
+    def test_nbytes(self):
+        """nbytes should be the size of the array items of the rows."""
+        self.assertEqual(
+            self.columns.nbytes,
+            5 * sum([values.itemsize for values in self.columns.arrays.values()])
+        )
+
+    def test_columnar_history(self):
+        """A columnar history should parse its quote into columns and drop the raw rows."""
+        quote = StaticQuoteHistory('ABC', 'AX', self.test_date_range, ['Date', 'Close'], defer=True)
+        quote.columnar = True
+        quote.process_quote()
+
+        self.assertTrue(isinstance(quote.quote, HistoryColumns))
+        self.assertTrue(quote.columns is quote.quote)
+        self.assertEqual(quote.raw_quote, None)
+        self.assertEqual(list(quote.columns['Close']), [3.33] * 5)
+
+    def test_history_columns(self):
+        """The columns of a history should be built from its raw rows."""
+        quote = StaticQuoteHistory('ABC', 'AX', self.test_date_range, ['Date', 'Close'])
+
+        self.assertEqual(quote.columns.dates, [row['Date'] for row in reversed(quote.quote)])
+
+
+class ArrayViewTestCase(unittest.TestCase):
+    """Test Case for the `ArrayView` class.
+
+    The view should behave like a slice of the array without copying it.
+
+    """
+    def setUp(self):
+        self.data = array.array('l', range(10))
+        self.view = ArrayView(self.data, 2, 6)
+
+    def test_view(self):
+        """The view should contain the items between its indexes."""
+        self.assertEqual(len(self.view), 4)
+        self.assertEqual(list(self.view), [2, 3, 4, 5])
+        self.assertEqual(self.view[-1], 5)
+        self.assertRaises(IndexError, self.view.__getitem__, 4)
+
+    def test_view_slice(self):
+        """Slicing the view should return a view of the same array."""
+        sliced = self.view[1:3]
+
+        self.assertEqual(sliced.tolist(), [3, 4])
+        self.assertTrue(sliced.data is self.data)
+
+
+class ScaledNumericModeTestCase(unittest.TestCase):
+    """Quote models in the scaled numeric mode should parse prices into integers
+    of ten-thousandths and volumes into integers.
+
+    """
+    def setUp(self):
+        self.test_date_range = [date(2013, 4, 8), date(2013, 4, 12)]
+
+    def test_field_set(self):
+        """The scaled field set should parse the Decimal fields as integers."""
+        field_set = YahooCSVQuoteHistory.get_field_set(['Date', 'Close', 'Volume'], NUMERIC_SCALED)
+
+        self.assertEqual(field_set['Date'], ('Date', parse_date))
+        self.assertEqual(field_set['Close'], ('Close', parse_scaled))
+        self.assertEqual(field_set['Volume'], ('Volume', parse_volume))
+        self.assertFalse(field_set is YahooCSVQuoteHistory.get_field_set(['Date', 'Close', 'Volume']))
+
+    def test_history(self):
+        """A scaled history should hold its prices as integers."""
+        quote = StaticQuoteHistory('ABC', 'AX', self.test_date_range, ['Date', 'Close'], defer=True)
+        quote.numeric_mode = NUMERIC_SCALED
+        quote.process_quote()
+
+        self.assertEqual(quote.quote[0], {'Date': date(2013, 4, 12), 'Close': 33300})
+
+    def test_history_columns(self):
+        """The columns of a scaled history should hold its prices as integers."""
+        quote = StaticQuoteHistory('ABC', 'AX', self.test_date_range, ['Date', 'Close'], defer=True)
+        quote.numeric_mode = NUMERIC_SCALED
+        quote.columnar = True
+        quote.process_quote()
+
+        self.assertEqual(list(quote.columns['Close']), [33300] * 5)
+
+    def test_get_decimal(self):
+        """get_decimal should return the Decimal of a scaled price."""
+        quote = YahooCSVQuote('ABC', 'AX', ['Close', 'Volume'], defer=True)
+        quote.numeric_mode = NUMERIC_SCALED
+        quote.quote_fields = quote.get_quote_fields()
+        quote.raw_quote = {'l1': '3.310', 'v': '1123210'}
+        quote.quote = quote.parse_quote()
+
+        self.assertEqual(quote.price, 33100)
+        self.assertEqual(quote.get_decimal('Close'), Decimal('3.310'))
+        self.assertEqual(quote.get_decimal('Volume'), Decimal('1123210'))
+
+
+class QuoteRecordTestCase(unittest.TestCase):
+    """Test Case for the generated `QuoteRecord` classes.
+
+    A latest quote with records should be parsed into a record with a slot for
+    each field that reads like the dictionary it replaces.
+
+    """
+    def setUp(self):
+        self.test_quote_fields = YahooCSVQuote.get_field_set(['Close', 'Code', 'Volume'])
+        self.test_raw_quote = {'l1': '3.310', 's': 'ABC.AX', 'v': '1123210', 'x': 'ASX'}
+        self.test_parsed_quote = {'Close': Decimal('3.310'), 'Code': 'ABC.AX', 'Volume': Decimal('1123210')}
+
+        self.record = get_record_converter(self.test_quote_fields)(self.test_raw_quote)
+
+    def test_record(self):
+        """The record should hold each requested field in a slot."""
+        self.assertEqual(self.record.Close, Decimal('3.310'))
+        self.assertEqual(self.record['Code'], 'ABC.AX')
+        self.assertFalse(hasattr(self.record, '__dict__'))
+        self.assertEqual(self.record, self.test_parsed_quote)
+        self.assertEqual(self.test_parsed_quote, self.record)
+
+    def test_record_missing_field(self):
+        """A field missing from the raw quote should not be in the record."""
+        record = get_record_converter(self.test_quote_fields)({'l1': '3.310'})
+
+        self.assertEqual(record.keys(), ['Close'])
+        self.assertFalse(record.has_key('Volume'))
+        self.assertRaises(KeyError, record.__getitem__, 'Volume')
+
+    def test_make_record_class_cached(self):
+        """make_record_class should return the same class for the same fields."""
+        self.assertTrue(make_record_class(['Close', 'Code']) is make_record_class(('Code', 'Close')))
+        self.assertEqual(make_record_class(['Adj Close']).__slots__, ('Adj_Close', ))
+
+    def test_record_set(self):
+        """Fields of the record should be set like a dictionary."""
+        self.record['Close'] = Decimal('3.320')
+
+        self.assertEqual(self.record.Close, Decimal('3.320'))
+        self.assertRaises(KeyError, self.record.__setitem__, 'Name', 'ABC')
+
+    def test_record_pickle(self):
+        """Records, including lazy records, should survive pickling."""
+        lazy_record = get_lazy_record_class(self.test_quote_fields)(self.test_raw_quote)
+
+        for record in (self.record, lazy_record):
+            unpickled = pickle.loads(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+
+            self.assertEqual(unpickled, self.test_parsed_quote)
+            self.assertEqual(unpickled.Volume, Decimal('1123210'))
+
+    def get_quote(self, records):
+        """Returns a quote parsed from the test raw quote, with or without records."""
+        quote = YahooCSVQuote('ABC', 'AX', ['Close', 'Code', 'Volume'], defer=True)
+        quote.records = records
+        quote.quote_fields = quote.get_quote_fields()
+        quote.raw_quote = self.test_raw_quote
+        quote.quote = quote.parse_quote()
+        return quote
+
+    def test_quote_dictionary(self):
+        """A quote without records should be parsed into a dictionary."""
+        quote = self.get_quote(False)
+
+        self.assertEqual(type(quote.quote), dict)
+        self.assertEqual(quote.quote, self.test_parsed_quote)
+        self.assertEqual(quote.price, Decimal('3.310'))
+
+    def test_quote_properties(self):
+        """The quote properties should read the record slots."""
+        quote = self.get_quote(True)
+
+        self.assertTrue(isinstance(quote.quote, QuoteRecord))
+        self.assertEqual(quote.price, Decimal('3.310'))
+        self.assertEqual(quote.volume, Decimal('1123210'))
+        self.assertRaises(Exception, getattr, quote, 'price_date')
+
+
+class LazyQuoteTestCase(unittest.TestCase):
+    """Lazy quotes should parse each field the first time it is read, and only once."""
+    def setUp(self):
+        self.calls = []
+
+        def parse_price(value):
+            self.calls.append(value)
+            return Decimal(value)
+
+        self.test_quote_fields = {
+            'l1': ('Close', parse_price),
+            'o': ('Open', parse_price),
+            'd1': ('Date', parse_us_date),
+        }
+        self.test_raw_quote = {'l1': '3.310', 'o': '3.290', 'd1': '4/10/2013'}
+
+    def get_quote(self):
+        """Returns a lazy quote parsed from the test raw quote."""
+        quote = YahooCSVQuote('ABC', 'AX', defer=True)
+        quote.lazy = True
+        quote.quote_fields = self.test_quote_fields
+        quote.raw_quote = self.test_raw_quote
+        quote.quote = quote.parse_quote()
+        return quote
+
+    def test_lazy_quote(self):
+        """A lazy quote should only parse the fields that are read."""
+        quote = self.get_quote()
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(quote.price, Decimal('3.310'))
+        self.assertEqual(quote.price, Decimal('3.310'))
+        self.assertEqual(self.calls, ['3.310'])
+
+    def test_lazy_quote_equal(self):
+        """A lazy quote should equal the quote parsed at once."""
+        quote = self.get_quote()
+
+        self.assertEqual(
+            quote.quote,
+            {'Close': Decimal('3.310'), 'Open': Decimal('3.290'), 'Date': date(2013, 4, 10)}
+        )
+
+    def test_lazy_quote_missing_field(self):
+        """A lazy quote should raise an Exception for a field missing from the raw quote."""
+        quote = self.get_quote()
+        quote.quote = get_lazy_record_class(self.test_quote_fields)({'l1': '3.310'})
+
+        self.assertRaises(Exception, getattr, quote, 'price_date')
+        self.assertFalse(quote.quote.has_key('Open'))
+
+    def test_lazy_history(self):
+        """The rows of a lazy history should be parsed when they are read."""
+        quote = StaticQuoteHistory('ABC', 'AX', [date(2013, 4, 8), date(2013, 4, 12)], ['Date', 'Close'], defer=True)
+        quote.lazy = True
+        quote.process_quote()
+
+        self.assertEqual(quote.quote[0]['Close'], Decimal('3.33'))
+        self.assertEqual(quote.quote[0].Date, date(2013, 4, 12))
+        self.assertEqual(quote.quote[-1], {'Date': date(2013, 4, 8), 'Close': Decimal('3.33')})
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    """Test Case for the `TokenBucket` class.
+
+    The `TokenBucket` should limit the rate of requests to a provider endpoint
+    and back off and retry requests that are throttled.
+
+    """
+    def setUp(self):
+        self.test_bucket = TokenBucket(rate=10.0, capacity=2, backoff_base=0.1)
+
+        self.attempts = []
+
+    def fetch_throttled(self, count):
+        """Returns a function that is throttled count times before succeeding."""
+        def fetch():
+            self.attempts.append(1)
+            if len(self.attempts) <= count:
+                raise TransportError(999, 'http://finance.yahoo.com/d/quotes.csv')
+            return 'ABC'
+        return fetch
+
+    def test_acquire_burst(self):
+        """acquire should not wait while the bucket has tokens."""
+        waits = [self.test_bucket.acquire() for i in range(2)]
+
+        self.assertTrue(max(waits) < 0.05)
+
+    def test_acquire_rate(self):
+        """acquire should wait for a token once the bucket is empty."""
+        waits = [self.test_bucket.acquire() for i in range(3)]
+
+        self.assertTrue(waits[2] >= 0.05)
+        self.assertEqual(self.test_bucket.acquired, 3)
+
+    def test_get_wait_time(self):
+        """get_wait_time should estimate the wait of a new request."""
+        self.assertEqual(self.test_bucket.get_wait_time(), 0.0)
+
+        [self.test_bucket.acquire() for i in range(2)]
+
+        self.assertTrue(self.test_bucket.get_wait_time() > 0.0)
+
+    def test_call_throttled(self):
+        """call should back off and retry a throttled request."""
+        self.assertEqual(self.test_bucket.call(self.fetch_throttled(2)), 'ABC')
+
+        self.assertEqual(len(self.attempts), 3)
+        self.assertEqual(self.test_bucket.throttled, 2)
+
+    def test_call_throttled_retries(self):
+        """call should raise the exception once the retries are used up."""
+        self.test_bucket.retries = 1
+
+        self.assertRaises(TransportError, self.test_bucket.call, self.fetch_throttled(5))
+        self.assertEqual(len(self.attempts), 2)
+
+    def test_call_error(self):
+        """call should not retry a request that fails for another reason."""
+        def fetch():
+            self.attempts.append(1)
+            raise TransportError(404, 'http://finance.yahoo.com/d/notfound.csv')
+
+        self.assertRaises(TransportError, self.test_bucket.call, fetch)
+        self.assertEqual(len(self.attempts), 1)
+
+    def test_quote_rate_limiter(self):
+        """Provider requests should only go through a rate limiter given to the model."""
+        for model in [YahooQuote, YahooCSVQuote, YahooQuoteHistory, YahooCSVQuoteHistory]:
+            self.assertEqual(model.rate_limiter, None)
+
+        quote = YahooCSVQuote('ABC', 'AX', defer=True)
+        self.assertEqual(quote.call_provider(self.fetch_throttled(0)), 'ABC')
+
+        self.attempts = []
+        quote.rate_limiter = self.test_bucket
+        self.assertEqual(quote.call_provider(self.fetch_throttled(1)), 'ABC')
+        self.assertEqual(self.test_bucket.acquired, 2)
+        self.assertEqual(self.test_bucket.throttled, 1)
+
+
+class HistoryQuoteBaseGetRawQuoteChunksTestCase(unittest.TestCase):
+    """The `HistoryQuoteBase`.`get_raw_quote_chunks` function should fetch a long
+    date range in chunks and merge them into a single list, latest first.
+
+    """
+    def setUp(self):
+        self.test_date_range = [date(2013, 4, 1), date(2013, 4, 10)]
+        self.test_quote = StaticQuoteHistory('ABC', 'AX', self.test_date_range, defer=True)
+        self.test_quote.chunk_days = 4
+        self.test_quote.chunk_min_days = 1
+
+        self.test_requests = [
+            [date(2013, 4, 1), date(2013, 4, 4)],
+            [date(2013, 4, 5), date(2013, 4, 8)],
+            [date(2013, 4, 9), date(2013, 4, 10)],
+        ]
+        self.test_dates = [
+            day.isoformat() for day in reversed(list(date_range_generator(*self.test_date_range)))
+        ]
+
+        StaticQuoteHistory.requests = []
+
+    def test_get_raw_quote_chunks(self):
+        """get_raw_quote_chunks should fetch each chunk and merge the rows in order."""
+        raw_quote = self.test_quote.get_raw_quote_chunks(*self.test_date_range)
+
+        self.assertEqual(sorted(StaticQuoteHistory.requests), self.test_requests)
+        self.assertEqual([row['Date'] for row in raw_quote], self.test_dates)
+
+    def test_get_raw_quote_chunks_without_date(self):
+        """get_raw_quote_chunks should join the chunks of rows that have no date."""
+        quote = UndatedQuoteHistory('ABC', 'AX', self.test_date_range, ['Close'], defer=True)
+        quote.chunk_days = 4
+        quote.process_quote()
+
+        self.assertEqual(len(quote.quote), 10)
+        self.assertEqual(quote.quote[0], {'Close': Decimal('3.33')})
+
+    def test_get_raw_quote_chunks_columns(self):
+        """get_raw_quote_chunks should join the chunks of raw columns column by column."""
+        quote = ColumnarQuoteHistory('ABC', 'AX', self.test_date_range, defer=True)
+        quote.chunk_days = 4
+        quote.chunk_min_days = 1
+
+        raw_quote = quote.get_raw_quote_chunks(*self.test_date_range)
+
+        self.assertEqual(raw_quote['Date'], self.test_dates)
+        self.assertEqual(raw_quote['Close'], ['3.33'] * 10)
+
+    def test_get_raw_quote_chunks_merge_remainder(self):
+        """get_raw_quote_chunks should fetch a short last chunk with the one before it."""
+        self.test_quote.chunk_min_days = 3
+
+        self.test_quote.get_raw_quote_chunks(*self.test_date_range)
+
+        self.assertEqual(sorted(StaticQuoteHistory.requests), [
+            [date(2013, 4, 1), date(2013, 4, 4)],
+            [date(2013, 4, 5), date(2013, 4, 10)],
+        ])
+
+    def test_get_raw_quote_chunks_empty_chunk(self):
+        """get_raw_quote_chunks should treat a chunk without trading days as no rows."""
+        # The last chunk is a weekend
+        quote = TradingDayQuoteHistory('ABC', 'AX', [date(2013, 4, 1), date(2013, 4, 14)], defer=True)
+        quote.chunk_days = 6
+        quote.chunk_min_days = 1
+
+        raw_quote = quote.get_raw_quote_chunks(date(2013, 4, 1), date(2013, 4, 14))
+
+        self.assertEqual(len(StaticQuoteHistory.requests), 3)
+        self.assertEqual(len(raw_quote), 10)
+        self.assertEqual(raw_quote[0]['Date'], '2013-04-12')
+
+    def test_get_raw_quote_chunks_all_empty(self):
+        """get_raw_quote_chunks should raise an Exception if every chunk is empty."""
+        quote = TradingDayQuoteHistory('ABC', 'AX', [date(2013, 4, 13), date(2013, 4, 14)], defer=True)
+        quote.chunk_days = 1
+        quote.chunk_min_days = 1
+
+        self.assertRaises(Exception, quote.get_raw_quote_chunks, date(2013, 4, 13), date(2013, 4, 14))
+        self.assertEqual(quote.get_raw_quote_chunks(date(2013, 4, 13), date(2013, 4, 14), allow_empty=True), [])
+
+    def test_get_raw_quote_no_chunks(self):
+        """get_raw_quote_chunks should fetch the date range at once without chunk days."""
+        self.test_quote.chunk_days = None
+
+        self.test_quote.get_raw_quote_chunks(*self.test_date_range)
+
+        self.assertEqual(StaticQuoteHistory.requests, [self.test_date_range])
+
+
+class HistoryStoreTestCase(unittest.TestCase):
+    """Test Case for the `HistoryStore` class.
+
+    A history quote with a `HistoryStore` should only fetch the dates that the
+    store does not already cover.
+
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.test_store = HistoryStore(self.directory)
+
+        self.test_date_range = [date(2013, 4, 8), date(2013, 4, 12)]
+        self.test_later_date_range = [date(2013, 4, 10), date(2013, 4, 16)]
+
+        StaticQuoteHistory.attempts = {}
+        StaticQuoteHistory.requests = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_quote(self, date_range, model=StaticQuoteHistory):
+        """Returns a processed quote that uses the test store."""
+        quote = model('ABC', 'AX', date_range, ['Date', 'Close'], defer=True)
+        quote.history_store = self.test_store
+        quote.process_quote()
+        return quote
+
+    def test_get_raw_quote(self):
+        """get_raw_quote should return the rows of the date range, latest first."""
+        quote = self.get_quote(self.test_date_range)
+
+        self.assertEqual(
+            [row['Date'] for row in quote.quote],
+            [day for day in reversed(list(date_range_generator(*self.test_date_range)))]
+        )
+
+    def test_get_raw_quote_covered(self):
+        """get_raw_quote should not fetch a date range that is covered."""
+        self.get_quote(self.test_date_range)
+        self.get_quote([date(2013, 4, 9), date(2013, 4, 11)])
+
+        self.assertEqual(StaticQuoteHistory.requests, [self.test_date_range])
+
+    def test_get_raw_quote_missing(self):
+        """get_raw_quote should only fetch the dates that are missing."""
+        self.get_quote(self.test_date_range)
+        quote = self.get_quote(self.test_later_date_range)
+
+        self.assertEqual(
+            StaticQuoteHistory.requests,
+            [self.test_date_range, [date(2013, 4, 13), date(2013, 4, 16)]]
+        )
+        self.assertEqual(len(quote.quote), 7)
+
+    def test_get_raw_quote_missing_weekend(self):
+        """get_raw_quote should cover missing dates without any trading days."""
+        self.get_quote(self.test_date_range, TradingDayQuoteHistory)
+        quote = self.get_quote([date(2013, 4, 8), date(2013, 4, 14)], TradingDayQuoteHistory)
+        self.get_quote([date(2013, 4, 8), date(2013, 4, 14)], TradingDayQuoteHistory)
+
+        self.assertEqual(
+            StaticQuoteHistory.requests,
+            [self.test_date_range, [date(2013, 4, 13), date(2013, 4, 14)]]
+        )
+        self.assertEqual(len(quote.quote), 5)
+
+    def test_get_raw_quote_persists(self):
+        """get_raw_quote should use the coverage stored by another store instance."""
+        self.get_quote(self.test_date_range)
+        self.test_store = HistoryStore(self.directory)
+        self.get_quote(self.test_date_range)
+
+        self.assertEqual(StaticQuoteHistory.requests, [self.test_date_range])
+
+
+class OHLCVFileTestCase(unittest.TestCase):
+    """Test Case for the `OHLCVFile` and `OHLCVStore` classes.
+
+    Parsed histories should be written to fixed size binary records and read
+    back by date from the memory mapped file.
+
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.test_path = os.path.join(self.directory, 'ABC.AX.ohlcv')
+
+        self.test_date_range = [date(2013, 4, 8), date(2013, 4, 12)]
+        self.test_raw_rows = [
+            {
+                'Date': day.isoformat(), 'Open': '3.3%d' % (day.day - 8, ), 'High': '3.40',
+                'Low': '3.30', 'Close': '3.35', 'Volume': '%d' % (day.day * 1000, ), 'Adj Close': '3.35',
+            }
+            for day in reversed(list(date_range_generator(*self.test_date_range)))
+        ]
+
+        self.test_quote = YahooCSVQuoteHistory('ABC', 'AX', self.test_date_range, defer=True)
+        self.test_quote.quote_fields = self.test_quote.get_quote_fields()
+        self.test_quote.raw_quote = self.test_raw_rows
+        self.test_quote.quote = self.test_quote.parse_quote()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write(self):
+        """write should write a header and a fixed size record per day."""
+        OHLCVFile.write(self.test_path, self.test_quote.quote)
+
+        self.assertEqual(
+            os.path.getsize(self.test_path),
+            OHLCV_HEADER.size + 5 * OHLCV_RECORD.size
+        )
+
+    def test_read(self):
+        """The bars should be read back oldest first as scaled integers."""
+        OHLCVFile.write(self.test_path, self.test_quote.quote)
+
+        with OHLCVFile(self.test_path) as ohlcv_file:
+            self.assertEqual(len(ohlcv_file), 5)
+            self.assertEqual(ohlcv_file.start_date, date(2013, 4, 8))
+            self.assertEqual(ohlcv_file.end_date, date(2013, 4, 12))
+            self.assertEqual(ohlcv_file[0], {
+                'Date': date(2013, 4, 8), 'Open': 33000, 'High': 34000, 'Low': 33000,
+                'Close': 33500, 'Volume': 8000, 'Adj Close': 33500,
+            })
+            self.assertEqual(ohlcv_file[-1].Volume, 12000)
+
+    def test_write_scaled(self):
+        """Rows parsed in the scaled numeric mode should be written unchanged."""
+        self.test_quote.numeric_mode = NUMERIC_SCALED
+        self.test_quote.quote_fields = self.test_quote.get_quote_fields()
+
+        OHLCVFile.write(self.test_path, self.test_quote.parse_quote())
+
+        with OHLCVFile(self.test_path) as ohlcv_file:
+            self.assertEqual(ohlcv_file.get('2013-04-10').Open, 33200)
+
+    def test_write_columns(self):
+        """Columnar histories should be written in either numeric mode."""
+        store = OHLCVStore(self.directory)
+
+        for numeric_mode in (NUMERIC_DECIMAL, NUMERIC_SCALED):
+            self.test_quote.numeric_mode = numeric_mode
+            self.test_quote.quote_fields = self.test_quote.get_quote_fields()
+            self.test_quote.quote = HistoryColumns.from_rows(self.test_raw_rows, self.test_quote.quote_fields)
+
+            store.save(self.test_quote)
+
+            with store.open('ABC', 'AX') as ohlcv_file:
+                self.assertEqual(len(ohlcv_file), 5)
+                self.assertEqual(ohlcv_file.get(date(2013, 4, 10)), {
+                    'Date': date(2013, 4, 10), 'Open': 33200, 'High': 34000, 'Low': 33000,
+                    'Close': 33500, 'Volume': 10000, 'Adj Close': 33500,
+                })
+
+        self.test_quote.quote = HistoryColumns.from_rows(
+            self.test_raw_rows, YahooCSVQuoteHistory.get_field_set(['Date', 'Close'])
+        )
+        self.assertRaises(Exception, store.save, self.test_quote)
+
+    def test_write_missing_field(self):
+        """write should raise Exception for rows without every field."""
+        self.assertRaises(
+            Exception, OHLCVFile.write, self.test_path, [{'Date': date(2013, 4, 8), 'Close': 1}]
+        )
+
+    def test_get(self):
+        """get should return the bar of a date, or None."""
+        OHLCVFile.write(self.test_path, self.test_quote.quote)
+
+        with OHLCVFile(self.test_path) as ohlcv_file:
+            self.assertEqual(ohlcv_file.get(date(2013, 4, 11)).Open, 33300)
+            self.assertEqual(ohlcv_file.get(date(2013, 4, 13)), None)
+            self.assertEqual(ohlcv_file.get(date(2013, 4, 1)), None)
+
+    def test_between(self):
+        """between should return the bars between two dates, latest first."""
+        OHLCVFile.write(self.test_path, self.test_quote.quote)
+
+        with OHLCVFile(self.test_path) as ohlcv_file:
+            self.assertEqual(
+                [bar.Date for bar in ohlcv_file.between('2013-04-09', date(2013, 4, 11))],
+                [date(2013, 4, 11), date(2013, 4, 10), date(2013, 4, 9)]
+            )
+            self.assertEqual(len(ohlcv_file.between(date(2013, 4, 10))), 3)
+            self.assertEqual(ohlcv_file.between(date(2013, 5, 1)), [])
+
+    def test_not_ohlcv_file(self):
+        """Opening a file that is not an OHLCV file should raise Exception."""
+        with open(self.test_path, 'wb') as f:
+            f.write('Date,Open,High,Low,Close,Volume,Adj Close\n')
+
+        self.assertRaises(Exception, OHLCVFile, self.test_path)
+
+    def test_empty_file(self):
+        """Opening an empty file should raise Exception that it is not an OHLCV file."""
+        open(self.test_path, 'wb').close()
+
+        try:
+            OHLCVFile(self.test_path)
+        except Exception, e:
+            self.assertTrue('is not an OHLCV file' in str(e))
+        else:
+            self.fail('The empty file was opened')
+
+    def test_store(self):
+        """The store should merge saved histories with the bars it holds."""
+        store = OHLCVStore(self.directory)
+        self.assertEqual(store.open('ABC', 'AX'), None)
+
+        store.save(self.test_quote)
+
+        self.test_quote.quote = self.test_quote.quote[:1] + [
+            dict(self.test_quote.quote[0], Date=date(2013, 4, 15), Close=Decimal('3.5'))
+        ]
+        store.save(self.test_quote)
+
+        with store.open('ABC', 'AX') as ohlcv_file:
+            self.assertEqual(len(ohlcv_file), 6)
+            self.assertEqual(ohlcv_file.get(date(2013, 4, 15)).Close, 35000)
+
+
+class StandInServerTestCase(unittest.TestCase):
+    """Test Case for the `StandInServer` class.
+
+    The quote models should fetch quotes from the stand-in server once the
+    provider url is set to it.
+
+    """
+    def setUp(self):
+        self.test_fixtures = {
+            'ABC.AX': {
+                'quote': {
+                    'Name': 'ABC LIMITED',
+                    'Symbol': 'ABC.AX',
+                    'StockExchange': 'ASX',
+                    'LastTradeDate': '4/12/2013',
+                    'LastTradeTime': '4:10pm',
+                    'LastTradePriceOnly': '3.45',
+                },
+                'history': [
+                    {'Date': '2013-04-12', 'Open': '3.40', 'High': '3.50', 'Low': '3.38',
+                     'Close': '3.45', 'Volume': '1000', 'Adj Close': '3.45'},
+                    {'Date': '2013-04-11', 'Open': '3.30', 'High': '3.42', 'Low': '3.30',
+                     'Close': '3.40', 'Volume': '2000', 'Adj Close': '3.40'},
+                ],
+            },
+        }
+
+        self.server = StandInServer(fixtures=self.test_fixtures, invalid_symbols=['BAD.AX'])
+        self.server.start()
+        set_provider_url(self.server.url)
+
+        self.transport = HTTPTransport(timeout=10)
+
+    def tearDown(self):
+        set_provider_url()
+        self.transport.close()
+        self.server.stop()
+
+    def test_csv_quote(self):
+        """A CSV quote should be fetched from the fixture of the stand-in server."""
+        quote = YahooCSVQuote('ABC', 'AX', ['Name', 'Close'], transport=self.transport)
+
+        self.assertEqual(quote.quote, {'Name': 'ABC LIMITED', 'Close': Decimal('3.45')})
+
+    def test_csv_quote_fetch_many(self):
+        """fetch_many should fetch synthetic quotes for symbols without fixtures."""
+        quotes = YahooCSVQuote.fetch_many(
+            ['ABC', 'XYZ'], 'AX', ['Code', 'Close'], transport=self.transport
+        )
+
+        self.assertEqual(quotes[0].quote['Code'], 'ABC.AX')
+        self.assertEqual(quotes[1].quote['Code'], 'XYZ.AX')
+        self.assertTrue(isinstance(quotes[1].quote['Close'], Decimal))
+        self.assertEqual(self.server.requests, 1)
+
+    def test_csv_history(self):
+        """A CSV history quote should only return the fixture rows in the date range."""
+        quote = YahooCSVQuoteHistory(
+            'ABC', 'AX', [date(2013, 4, 12), date(2013, 4, 14)], ['Date', 'Close'],
+            transport=self.transport
+        )
+
+        self.assertEqual(quote.quote, [{'Date': date(2013, 4, 12), 'Close': Decimal('3.45')}])
+
+    def test_csv_history_synthetic(self):
+        """A CSV history quote should return repeatable synthetic rows for the weekdays."""
+        date_range = [date(2013, 4, 8), date(2013, 4, 14)]
+        quote = YahooCSVQuoteHistory('XYZ', 'AX', date_range, transport=self.transport)
+        other = YahooCSVQuoteHistory('XYZ', 'AX', date_range, transport=self.transport)
+
+        self.assertEqual(
+            [row['Date'] for row in quote.quote],
+            [date(2013, 4, day) for day in (12, 11, 10, 9, 8)]
+        )
+        self.assertEqual(quote.quote, other.quote)
+
+    def test_csv_history_invalid_symbol(self):
+        """A CSV history quote for an invalid symbol should fail."""
+        self.assertRaises(
+            TransportError, YahooCSVQuoteHistory, 'BAD', 'AX',
+            [date(2013, 4, 8), date(2013, 4, 12)], transport=self.transport
+        )
+
+    def test_yql_quotes(self):
+        """The YQL endpoint should return the requested columns of each symbol."""
+        url = '%s?q=%s&format=json' % (
+            provider_urls['yql'],
+            'select%20Symbol%2C%20LastTradePriceOnly%20from%20yahoo.finance.quotes'
+            '%20where%20symbol%20in%20(%22ABC.AX%22%2C%22BAD.AX%22)',
+        )
+
+        query = json.loads(self.transport.get(url))['query']
+
+        self.assertEqual(query['count'], 2)
+        self.assertEqual(query['results']['quote'], [
+            {'Symbol': 'ABC.AX', 'LastTradePriceOnly': '3.45'},
+            {'Symbol': 'BAD.AX', 'LastTradePriceOnly': None},
+        ])
+
+    def test_yql_count(self):
+        """The count of a YQL response should be the number of result rows."""
+        statement = (
+            'select * from yahoo.finance.historicaldata where symbol = "XYZ.AX" '
+            'and startDate = "%s" and endDate = "%s"'
+        )
+
+        # A week of trading days, a single day and a weekend
+        for start_date, end_date, count in [
+                ('2013-04-08', '2013-04-14', 5),
+                ('2013-04-12', '2013-04-12', 1),
+                ('2013-04-13', '2013-04-14', 0)]:
+            url = '%s?%s' % (
+                provider_urls['yql'],
+                urllib.urlencode({'q': statement % (start_date, end_date), 'format': 'json'}),
+            )
+
+            self.assertEqual(json.loads(self.transport.get(url))['query']['count'], count)
+
+    def test_error_rate(self):
+        """Every request should fail with an error rate of 1."""
+        self.server.error_rate = 1
+
+        self.assertRaises(TransportError, self.transport.get, YahooCSVQuote.get_quote_url('ABC.AX', 's'))
+        self.assertEqual(self.server.errors, 1)
+
+    def test_throttling(self):
+        """Requests beyond the rate should be throttled with status 999."""
+        self.server.limiter = TokenBucket(0.01, 1)
+        url = YahooCSVQuote.get_quote_url('ABC.AX', 's')
+
+        self.transport.get(url)
+        try:
+            self.transport.get(url)
+        except TransportError, e:
+            self.assertEqual(e.status, THROTTLE_STATUS)
+        else:
+            self.fail('The second request was not throttled')
+
+
+class CassetteTestCase(unittest.TestCase):
+    """Test Case for the `Cassette` class.
+
+    Raw quotes recorded by a cassette should be replayed without the provider.
+
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.test_path = os.path.join(self.directory, 'quotes.cassette')
+
+        self.server = StandInServer()
+        self.server.start()
+        set_provider_url(self.server.url)
+
+        self.transport = HTTPTransport(timeout=10)
+
+    def tearDown(self):
+        set_provider_url()
+        self.transport.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def record(self):
+        """Record a latest quote, a history quote and a batch of quotes and return them."""
+        with Cassette(self.test_path, RECORD) as cassette:
+            latest = YahooCSVQuote('ABC', 'AX', ['Code', 'Close'], defer=True, transport=self.transport)
+            history = YahooCSVQuoteHistory(
+                'ABC', 'AX', [date(2013, 4, 8), date(2013, 4, 12)], defer=True, transport=self.transport
+            )
+
+            for quote in (latest, history):
+                quote.cassette = cassette
+                quote.process_quote()
+
+            batch = [
+                YahooCSVQuote(code, 'AX', ['Code', 'Close'], defer=True, transport=self.transport)
+                for code in ['ABC', 'XYZ']
+            ]
+            for quote in batch:
+                quote.cassette = cassette
+            YahooCSVQuote.process_batch(batch)
+
+        return latest, history, batch
+
+    def test_record(self):
+        """A recording cassette should save each request with its response."""
+        latest, history, batch = self.record()
+        cassette = Cassette(self.test_path)
+
+        self.assertEqual(len(cassette), 3)
+        self.assertEqual(cassette.entries[0]['keys'], [('YahooCSVQuote', 'ABC', 'AX', ('Code', 'Close'))])
+        self.assertEqual(
+            YahooCSVQuote.read_raw_quotes(latest, cassette.entries[0]['body'].encode('latin-1')),
+            [latest.raw_quote]
+        )
+
+        request = cassette.entries[1]
+        self.assertEqual(request['request'], history.get_quote_url(date(2013, 4, 8), date(2013, 4, 12)))
+        self.assertEqual(request['headers']['content-type'], 'text/csv')
+
+        self.assertEqual(
+            cassette.entries[2]['keys'],
+            [('YahooCSVQuote', code, 'AX', ('Code', 'Close')) for code in ['ABC', 'XYZ']]
+        )
+
+    def test_record_chunks(self):
+        """Every chunk of a history fetched on the worker threads should be recorded as one fetch."""
+        with Cassette(self.test_path, RECORD) as cassette:
+            history = YahooCSVQuoteHistory(
+                'ABC', 'AX', [date(2010, 1, 1), date(2012, 12, 31)], defer=True, transport=self.transport
+            )
+            history.cassette = cassette
+            history.process_quote()
+
+        cassette = Cassette(self.test_path)
+
+        self.assertEqual(len(cassette), self.server.requests)
+        self.assertTrue(len(cassette) > 1)
+        self.assertEqual(set([entry['fetch'] for entry in cassette.entries]), set([0]))
+
+    def test_replay(self):
+        """A replaying cassette should serve the recorded responses without requests."""
+        latest, history, batch = self.record()
+        requests = self.server.requests
+
+        cassette = Cassette(self.test_path)
+        replayed = YahooCSVQuoteHistory(
+            'ABC', 'AX', [date(2013, 4, 8), date(2013, 4, 12)], defer=True, transport=self.transport
+        )
+        replayed.cassette = cassette
+        replayed.process_quote()
+
+        self.assertEqual(replayed.raw_quote, history.raw_quote)
+        self.assertEqual(replayed.quote, history.quote)
+        self.assertEqual(self.server.requests, requests)
+
+    def test_replay_batch(self):
+        """A replaying cassette should serve batch requests."""
+        latest, history, batch = self.record()
+        requests = self.server.requests
+
+        YahooCSVQuote.cassette = Cassette(self.test_path)
+        try:
+            quotes = YahooCSVQuote.fetch_many(['ABC', 'XYZ'], 'AX', ['Code', 'Close'], transport=self.transport)
+        finally:
+            YahooCSVQuote.cassette = None
+
+        self.assertEqual([quote.quote for quote in quotes], [quote.quote for quote in batch])
+        self.assertEqual(self.server.requests, requests)
+
+    def test_replay_iter_quote(self):
+        """A replaying cassette should serve streamed histories."""
+        latest, history, batch = self.record()
+        requests = self.server.requests
+
+        replayed = YahooCSVQuoteHistory(
+            'ABC', 'AX', [date(2013, 4, 8), date(2013, 4, 12)], defer=True, transport=self.transport
+        )
+        replayed.cassette = Cassette(self.test_path)
+
+        self.assertEqual(list(replayed.iter_quote()), history.quote)
+        self.assertEqual(self.server.requests, requests)
+
+    def test_replay_not_recorded(self):
+        """A replaying cassette should raise an exception for a request it has not recorded."""
+        self.record()
+
+        quote = YahooCSVQuote('XYZ', 'AX', defer=True)
+        quote.cassette = Cassette(self.test_path)
+
+        self.assertRaises(Exception, quote.process_quote)
+
+    def test_play(self):
+        """play should process every recorded fetch again at the given speed."""
+        latest, history, batch = self.record()
+        cassette = Cassette(self.test_path)
+
+        quotes = cassette.play([YahooCSVQuote, YahooCSVQuoteHistory], speed=10)
+
+        self.assertEqual(
+            [quote.quote for quote in quotes],
+            [latest.quote, history.quote] + [quote.quote for quote in batch]
+        )
+
+    def test_play_batch_of_one(self):
+        """play should process a recorded batch of one quote as a batch again."""
+        with Cassette(self.test_path, RECORD) as cassette:
+            quote = BatchCountingCSVQuote('ABC', 'AX', ['Code', 'Close'], defer=True, transport=self.transport)
+            quote.cassette = cassette
+            BatchCountingCSVQuote.process_batch([quote])
+
+        BatchCountingCSVQuote.batches = []
+        played = Cassette(self.test_path).play([BatchCountingCSVQuote])
+
+        self.assertEqual(BatchCountingCSVQuote.batches, [1])
+        self.assertEqual([played_quote.quote for played_quote in played], [quote.quote])
+
+
+class BatchCountingCSVQuote(YahooCSVQuote):
+    """CSV quote model that records the size of each batch it processes."""
+    batches = []
+
+    @classmethod
+    def process_batch(cls, quotes, raise_errors=True):
+        cls.batches.append(len(quotes))
+        return super(BatchCountingCSVQuote, cls).process_batch(quotes, raise_errors)
+
+
+class ProcessDeferredTestCase(unittest.TestCase):
+    """Test Case for the `process_deferred` function.
+
+    Deferred quotes should be processed with one batched request for each
+    model, exchange and fields.
+
+    """
+    def setUp(self):
+        self.server = StandInServer()
+        self.server.start()
+        set_provider_url(self.server.url)
+
+        self.transport = HTTPTransport(timeout=10)
+
+    def tearDown(self):
+        set_provider_url()
+        self.transport.close()
+        self.server.stop()
+
+    def get_quote(self, code, fields=['Code', 'Close']):
+        """Returns a deferred CSV quote."""
+        return YahooCSVQuote(code, 'AX', fields, defer=True, transport=self.transport)
+
+    def test_process_deferred(self):
+        """process_deferred should batch the quotes that share a model, exchange and fields."""
+        quotes = [
+            self.get_quote('ABC'), self.get_quote('XYZ'), self.get_quote('ABC'),
+            self.get_quote('ABC', ['Code', 'Volume']),
+            StaticQuoteHistory('ABC', 'AX', [date(2013, 4, 8), date(2013, 4, 12)], defer=True),
+        ]
+
+        self.assertEqual(process_deferred(quotes), quotes)
+
+        self.assertEqual([quote.quote['Code'] for quote in quotes[:4]], ['ABC.AX', 'XYZ.AX', 'ABC.AX', 'ABC.AX'])
+        self.assertEqual(quotes[0].quote, quotes[2].quote)
+        self.assertTrue(quotes[3].quote.has_key('Volume'))
+        self.assertEqual(len(quotes[4].quote), 5)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_process_deferred_processed(self):
+        """process_deferred should not process a quote again."""
+        quote = self.get_quote('ABC')
+        quote.process_quote()
+
+        process_deferred([quote])
+
+        self.assertEqual(self.server.requests, 1)
+
+    def test_process_deferred_errors(self):
+        """A quote that fails should not stop the other quotes of its group."""
+        self.server.invalid_symbols.add('NOTACODE.AX')
+
+        quotes = [
+            self.get_quote('ABC'), self.get_quote('NOTACODE'), self.get_quote('NOTACODE'),
+            StaticQuoteHistory('FAIL', 'AX', [date(2013, 4, 8), date(2013, 4, 12)], defer=True),
+            StaticQuoteHistory('ABC', 'AX', [date(2013, 4, 8), date(2013, 4, 12)], defer=True),
+        ]
+
+        self.assertRaises(Exception, process_deferred, quotes)
+
+        self.assertEqual(quotes[0].quote['Code'], 'ABC.AX')
+        self.assertEqual(len(quotes[4].quote), 5)
+        self.assertEqual([quote.error is None for quote in quotes], [True, False, False, False, True])
+
+    def test_process_deferred_return_exceptions(self):
+        """With return_exceptions, a quote that fails should be replaced by its exception."""
+        self.server.invalid_symbols.add('NOTACODE.AX')
+
+        quotes = [self.get_quote('ABC'), self.get_quote('NOTACODE'), self.get_quote('XYZ')]
+
+        results = process_deferred(quotes, return_exceptions=True)
+
+        self.assertTrue(results[0] is quotes[0])
+        self.assertTrue(isinstance(results[1], Exception))
+        self.assertTrue(results[2] is quotes[2])
+        self.assertEqual(self.server.requests, 1)
+
+
+    def test_process_deferred_cache(self):
+        """process_deferred should parse cached quotes without a request, and cache the batch."""
+        cache = QuoteCache(ttl=60)
+
+        quotes = [self.get_quote('ABC'), self.get_quote('XYZ')]
+        for quote in quotes:
+            quote.cache = cache
+        process_deferred(quotes)
+
+        self.assertEqual(len(cache), 2)
+        requests = self.server.requests
+
+        cached = [self.get_quote('ABC'), self.get_quote('XYZ'), self.get_quote('ABC')]
+        for quote in cached:
+            quote.cache = cache
+        process_deferred(cached)
+
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual([quote.quote for quote in cached], [quotes[0].quote, quotes[1].quote, quotes[0].quote])
+
+
+class ValidateDateRangeTestCase(unittest.TestCase):
+    """Test Case for the `validate_date_range` function.
+
+    The `validate_date_range` function will return True if the given date range
+    validates against a set of custom rules.  Date ranges are used to extract
+    historical data for a given stock.
+
+    A valid date range is a list of two elements; each element may be a date
+    object or a string representation of the date.
+
+    """
+    def setUp(self):
+        # The valid date range, which good date range inputs must match
+        self.valid_date = [date(2013, 4, 10), date(2013, 4, 12)]
+
+        # Some good date range inputs
+        self.good_dates = [
+            [date(2013, 4, 10), date(2013, 4, 12)],
+            ['2013-04-10', '2013-04-12'],
+            ['2013-04-10', date(2013, 4, 12)],
+        ]
+        # Valid date ranges can be the same day
+        self.good_date_same_day = [date(2013, 4, 10), '2013-04-10']
+        self.valid_date_same_day = [date(2013, 4, 10), date(2013, 4, 10)]
+
+        # Number of days to lookback when no start_date is given
+        self.lookback_days = LOOKBACK_DAYS
+
+        # Define an end_date and start_date to reuse when required for other tests
+        self.start_date = date(2013, 4, 10)
+        self.end_date = date(2013, 4, 12)
+
+        # Define start and end dates to be used when they are not specified
+        self.no_end_date = datetime.today().date()
+        self.no_start_date = self.end_date - timedelta(days=self.lookback_days)
+        self.no_start_date_no_end_date = self.no_end_date - timedelta(days=self.lookback_days)
+
+        # Test date range for when no start_date is given
+        self.good_date_no_start = [None, self.end_date]
+        # Test date range for when no end_date is given
+        self.good_date_no_end = [self.start_date, '']
+        # Test date range for when no start or end date is given
+        self.good_date_no_start_no_end = ['', None]
+
+        # Some bad date range inputs
+        self.bad_date_not_list = [2013, {}, '']
+        self.bad_date_wrong_length = [
+            [], ['2013-04-10'], ['2013-04-10', '2013-04-11', '2013-04-12', ]
+        ]
+        self.bad_date_wrong_types = [[2013, ''], [None, Decimal('2013')], ]
+        self.bad_date_wrong_format = [date(2013, 4, 10), '12-04-2013']
+        self.bad_date_backwards = ['2013-04-12', date(2013, 4, 10)]
+        self.bad_date_future = [date(2020, 4, 10), '2020-04-12']
+
+    def test_good_date(self):
+        """validate_date_range should return True given valid date ranges."""
+        for good_date in self.good_dates:
+            ret, date_range = validate_date_range(good_date)
+
+            # Check function returned True
+            self.assertTrue(ret)
+
+            # Check data returned matches valid date range
+            self.assertEqual(self.valid_date, date_range)
+
+    def test_good_date_same_day(self):
+        """validate_date_range should return True given valid date range (same day)."""
+        ret, date_range = validate_date_range(self.good_date_same_day)
+
+        # Check function returned True
+        self.assertTrue(ret)
+
+        # Check data returned matches valid date range
+        self.assertEqual(self.valid_date_same_day, date_range)
+
+    def test_good_date_no_start(self):
+        """validate_date_range should return True even without range start."""
+        ret, date_range = validate_date_range(self.good_date_no_start)
+
+        # Check function returned True
+        self.assertTrue(ret)
+
+        # Check data returned matches valid date range
+        self.assertEqual(date_range, [self.no_start_date, self.end_date])
+
+    def test_good_date_no_end(self):
+        """validate_date_range should return True even without range end."""
+        ret, date_range = validate_date_range(self.good_date_no_end)
+
+        # Check function returned True
+        self.assertTrue(ret)
+
+        # Check data returned matches valid date range
+        self.assertEqual(date_range, [self.start_date, self.no_end_date])
+
+    def test_good_date_no_start_no_end(self):
+        """validate_date_range should return True even without range start or end."""
+        ret, date_range = validate_date_range(self.good_date_no_start_no_end)
+
+        # Check function returned True
+        self.assertTrue(ret)
+
+        # Check data returned matches valid date range
+        self.assertEqual(date_range, [self.no_start_date_no_end_date, self.no_end_date])
+
+    def test_bad_date_not_list(self):
+        """validate_date_range should raise a TypeError given a non-list date range."""
+        [self.assertRaises(TypeError, validate_date_range, not_list)
+            for not_list in self.bad_date_not_list]
+
+    def test_bad_date_wrong_length(self):
+        """validate_date_range should raise a ValueError given a list of incorrect length."""
+        [self.assertRaises(ValueError, validate_date_range, wrong_length)
+            for wrong_length in self.bad_date_wrong_length]
+
+    def test_bad_date_wrong_type(self):
+        """validate_date_range should raise a TypeError given a list with wrong types."""
+        self.assertRaises(TypeError, validate_date_range, self.bad_date_wrong_types)
+
+    def test_bad_date_wrong_format(self):
+        """validate_date_range should raise a TypeError given a list with wrong format."""
+        self.assertRaises(ValueError, validate_date_range, self.bad_date_wrong_format)
+
+    def test_bad_date_backwards(self):
+        """validate_date_range should raise an Exception given a backwards date range."""
+        self.assertRaises(ValueError, validate_date_range, self.bad_date_backwards)
+
+    def test_bad_date_future(self):
+        """validate_date_range should raise an Exception given a future date range."""
+        self.assertRaises(ValueError, validate_date_range, self.bad_date_future)
+
+
+class DateRangeGeneratorTestCase(unittest.TestCase):
+    """Test Case for the `date_range_generator` function.
+
+    The `date_range_generator` function will return a generator of date objects
+    if given a list containing the start and end dates of the range.
+
+    """
+    def setUp(self):
+        self.start_date = date(2013, 4, 10)
+        self.end_date = date(2013, 4, 12)
+
+        self.start_datetime = datetime(2013, 4, 10, 15, 44, 56)
+        self.end_datetime = datetime(2013, 4, 12, 6, 1, 25)
+
+        self.generated_date_range = [
+            date(2013, 4, 10), date(2013, 4, 11), date(2013, 4, 12)
+        ]
+
+        self.bad_date_wrong_types = ['2013-04-10', 2013]
+
+    def test_date_range_generator(self):
+        """date_range_generator should return a generator of dates if given date bounds."""
+        date_gen = date_range_generator(self.start_date, self.end_date)
+
+        self.assertEqual(list(date_gen), self.generated_date_range)
+
+    def test_generate_datetime_range(self):
+        """date_range_generator should return a generator of dates if given datetime bounds."""
+        date_gen = date_range_generator(self.start_datetime, self.end_datetime)
+
+        self.assertEqual(list(date_gen), self.generated_date_range)
+
+    def test_generate_bad_date_wrong_types(self):
+        """date_range_generator should raise an Exception if the inputs are not dates."""
+        self.assertRaises(Exception, date_range_generator,
+            (self.bad_date_wrong_types[0], self.bad_date_wrong_types[1]))
+
+
+class ChunksTestCase(unittest.TestCase):
+    """Test Case for the `chunks` function.
+
+    The `chunks` function will return a generator of lists of at most the given
+    size from a sequence.
+
+    """
+    def setUp(self):
+        self.sequence = range(7)
+        self.chunked_sequence = [[0, 1, 2], [3, 4, 5], [6]]
+
+    def test_chunks(self):
+        """chunks should split a sequence into lists of at most the given size."""
+        self.assertEqual(list(chunks(self.sequence, 3)), self.chunked_sequence)
+
+    def test_chunks_bad_size(self):
+        """chunks should raise ValueError if the size is not positive."""
+        self.assertRaises(ValueError, list, chunks(self.sequence, 0))
+
+
+class AtomicWriteTestCase(unittest.TestCase):
+    """Test Case for the `atomic_write` function.
+
+    The `atomic_write` function will return a context manager of a file that
+    replaces the file at a path only once it has been written.
+
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.test_path = os.path.join(self.directory, 'test.txt')
+
+        with open(self.test_path, 'w') as f:
+            f.write('old')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.test_path) as f:
+            return f.read()
+
+    def test_atomic_write(self):
+        """atomic_write should replace the file once it is written."""
+        with atomic_write(self.test_path, 'w') as f:
+            f.write('new')
+            self.assertEqual(self.read(), 'old')
+
+        self.assertEqual(self.read(), 'new')
+        self.assertEqual(os.listdir(self.directory), ['test.txt'])
+
+    def test_atomic_write_failure(self):
+        """atomic_write should leave the file and remove the temporary file after a failure."""
+        def write():
+            with atomic_write(self.test_path, 'w') as f:
+                f.write('new')
+                raise ValueError('Write failed')
+
+        self.assertRaises(ValueError, write)
+        self.assertEqual(self.read(), 'old')
+        self.assertEqual(os.listdir(self.directory), ['test.txt'])
+
+
+class MergeDateRangesTestCase(unittest.TestCase):
+    """Test Case for the `merge_date_ranges` function.
+
+    The `merge_date_ranges` function will return a sorted list of date ranges
+    with overlapping and adjacent date ranges merged together.
+
+    """
+    def setUp(self):
+        self.date_ranges = [
+            [date(2013, 4, 20), date(2013, 4, 25)],
+            [date(2013, 4, 1), date(2013, 4, 10)],
+            [date(2013, 4, 5), date(2013, 4, 12)],
+            [date(2013, 4, 13), date(2013, 4, 14)],
+        ]
+        self.merged_date_ranges = [
+            [date(2013, 4, 1), date(2013, 4, 14)],
+            [date(2013, 4, 20), date(2013, 4, 25)],
+        ]
+
+    def test_merge_date_ranges(self):
+        """merge_date_ranges should merge overlapping and adjacent date ranges."""
+        self.assertEqual(merge_date_ranges(self.date_ranges), self.merged_date_ranges)
+
+
+class MissingDateRangesTestCase(unittest.TestCase):
+    """Test Case for the `missing_date_ranges` function.
+
+    The `missing_date_ranges` function will return the sub-ranges of a date
+    range that are not covered by a list of date ranges.
+
+    """
+    def setUp(self):
+        self.date_range = [date(2013, 4, 1), date(2013, 4, 30)]
+        self.covered_ranges = [
+            [date(2013, 3, 1), date(2013, 4, 10)],
+            [date(2013, 4, 15), date(2013, 4, 20)],
+        ]
+        self.missing_ranges = [
+            [date(2013, 4, 11), date(2013, 4, 14)],
+            [date(2013, 4, 21), date(2013, 4, 30)],
+        ]
+
+    def test_missing_date_ranges(self):
+        """missing_date_ranges should return the uncovered sub-ranges."""
+        self.assertEqual(
+            missing_date_ranges(self.date_range, self.covered_ranges), self.missing_ranges
+        )
+
+    def test_missing_date_ranges_none_covered(self):
+        """missing_date_ranges should return the whole date range if nothing is covered."""
+        self.assertEqual(missing_date_ranges(self.date_range, []), [self.date_range])
+
+    def test_missing_date_ranges_all_covered(self):
+        """missing_date_ranges should return an empty list if everything is covered."""
+        self.assertEqual(missing_date_ranges(self.date_range, [self.date_range]), [])
+
+
+class SplitDateRangeTestCase(unittest.TestCase):
+    """Test Case for the `split_date_range` function.
+
+    The `split_date_range` function will return a list of consecutive date
+    ranges of at most a number of days that cover a date range.
+
+    """
+    def setUp(self):
+        self.date_range = [date(2013, 4, 1), date(2013, 4, 10)]
+        self.split_date_range = [
+            [date(2013, 4, 1), date(2013, 4, 4)],
+            [date(2013, 4, 5), date(2013, 4, 8)],
+            [date(2013, 4, 9), date(2013, 4, 10)],
+        ]
+
+    def test_split_date_range(self):
+        """split_date_range should split a date range into chunks of days."""
+        self.assertEqual(split_date_range(self.date_range, 4), self.split_date_range)
+
+    def test_split_date_range_min_days(self):
+        """split_date_range should merge a last date range of fewer than min_days days."""
+        self.assertEqual(split_date_range(self.date_range, 4, 3), [
+            [date(2013, 4, 1), date(2013, 4, 4)],
+            [date(2013, 4, 5), date(2013, 4, 10)],
+        ])
+
+    def test_split_date_range_none(self):
+        """split_date_range should not split a date range if days is None."""
+        self.assertEqual(split_date_range(self.date_range, None), [self.date_range])
+
+    def test_split_date_range_bad_days(self):
+        """split_date_range should raise ValueError if days is not positive."""
+        self.assertRaises(ValueError, split_date_range, self.date_range, 0)
+
+
+class ParseDateTestCase(unittest.TestCase):
+    """Test Case for the `parse_date` function.
 
     The `parse_date` function will take a date string and return a date object.
 
@@ -1724,5 +3945,107 @@ class ParseDateTestCase(unittest.TestCase):
         self.assertEqual(parse_date(self.bad_date_format), None)
 
 
+class ParseUSDateTestCase(unittest.TestCase):
+    """Test Case for the `parse_us_date` function.
+
+    The `parse_us_date` function will take a %m/%d/%Y date string and return a
+    date object.
+
+    """
+    def test_parse_us_date(self):
+        """parse_us_date should return date object given a proper date string."""
+        self.assertEqual(parse_us_date('04/10/2013'), date(2013, 4, 10))
+        self.assertEqual(parse_us_date('4/1/2013'), date(2013, 4, 1))
+
+    def test_parse_us_date_bad(self):
+        """parse_us_date should raise ValueError like strptime given a bad date string."""
+        for value in ('13/10/2013', '04/10/13', '2013-04-10', '04/10/2013 ', ''):
+            self.assertRaises(ValueError, parse_us_date, value)
+            self.assertRaises(ValueError, datetime.strptime, value, '%m/%d/%Y')
+
+
+class ParseUSTimeTestCase(unittest.TestCase):
+    """Test Case for the `parse_us_time` function.
+
+    The `parse_us_time` function will take a %I:%M%p time string and return a
+    time object.
+
+    """
+    def test_parse_us_time(self):
+        """parse_us_time should return the same time as strptime."""
+        for value in ('4:10pm', '10:21pm', '12:00am', '12:30pm', '9:05AM'):
+            self.assertEqual(parse_us_time(value), datetime.strptime(value, '%I:%M%p').time())
+
+    def test_parse_us_time_bad(self):
+        """parse_us_time should raise ValueError like strptime given a bad time string."""
+        for value in ('13:10pm', '4:60pm', '4:10', '4.10pm', ':10pm', ''):
+            self.assertRaises(ValueError, parse_us_time, value)
+            self.assertRaises(ValueError, datetime.strptime, value, '%I:%M%p')
+
+
+class MemoizeTestCase(unittest.TestCase):
+    """Test Case for the `memoize` function.
+
+    A memoised function should only be called once for each argument, and should
+    hold at most the maximum number of results.
+
+    """
+    def setUp(self):
+        self.calls = []
+
+        @memoize(max_size=2)
+        def double(value):
+            self.calls.append(value)
+            return value * 2
+
+        self.double = double
+
+    def test_memoize(self):
+        """The result of an argument should be remembered."""
+        self.assertEqual([self.double(1), self.double(1)], [2, 2])
+        self.assertEqual(self.calls, [1])
+
+    def test_memoize_max_size(self):
+        """The results should be forgotten when the maximum are held."""
+        for value in (1, 2, 3, 1):
+            self.double(value)
+
+        self.assertEqual(self.calls, [1, 2, 3, 1])
+        self.assertTrue(len(self.double.cache) <= 2)
+
+
+class ParseScaledTestCase(unittest.TestCase):
+    """Test Case for the `parse_scaled` and `scaled_to_decimal` functions.
+
+    Decimal strings should be parsed into integers of ten-thousandths that
+    convert back to the same Decimal.
+
+    """
+    def setUp(self):
+        self.test_values = ['3.310', '0.0005', '-12.5', '35', '.25', '1234567.8901']
+
+    def test_parse_scaled(self):
+        """parse_scaled should return the value in ten-thousandths."""
+        self.assertEqual(
+            [parse_scaled(value) for value in self.test_values],
+            [33100, 5, -125000, 350000, 2500, 12345678901]
+        )
+
+    def test_round_trip(self):
+        """scaled_to_decimal should return the Decimal of the parsed value."""
+        for value in self.test_values:
+            self.assertEqual(scaled_to_decimal(parse_scaled(value)), Decimal(value))
+
+    def test_parse_scaled_rounds(self):
+        """parse_scaled should round values with more places half to even."""
+        self.assertEqual(parse_scaled('0.00005'), 0)
+        self.assertEqual(parse_scaled('0.00015'), 2)
+        self.assertEqual(parse_scaled('1E+2'), 1000000)
+
+    def test_parse_scaled_bad(self):
+        """parse_scaled should fail like Decimal given a string that is not a number."""
+        self.assertRaises(Exception, parse_scaled, 'N/A')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+import pytz
+
+from datetime import datetime, time
+
+from functions import memoize
+
+__all__ = ['TIME_ZONE_CACHE_DAYS', 'get_timezone', 'TimeZoneConverter', 'get_converter']
+
+# Maximum number of days of offsets remembered by each converter
+TIME_ZONE_CACHE_DAYS = 1024
+
+
+@memoize()
+def get_timezone(name):
+    """Returns the pytz timezone of a name, created once."""
+    return pytz.timezone(name)
+
+
+class TimeZoneConverter(object):
+    """Converts naive datetimes in one timezone to aware datetimes in another.
+
+    The difference between the UTC offsets of the two timezones is worked out
+    once per calendar day, so most conversions are a single addition.  Days on
+    which either timezone changes its offset are converted with localize and
+    normalize every time.
+
+    """
+    def __init__(self, from_zone, to_zone, max_days=TIME_ZONE_CACHE_DAYS):
+        """Initialise the converter given the names of the timezones to convert
+        from and to.
+
+        Optionally given the maximum number of days of offsets to remember.
+
+        """
+        self.from_timezone = get_timezone(from_zone)
+        self.to_timezone = get_timezone(to_zone)
+        self.max_days = max_days
+
+        # Offset difference and target tzinfo keyed by day, None if an offset
+        # changes during the day
+        self.days = {}
+
+    def convert_exact(self, value):
+        """Convert a naive datetime with pytz's localize and normalize."""
+        localized = self.from_timezone.localize(value)
+        return self.to_timezone.normalize(localized.astimezone(self.to_timezone))
+
+    def get_day_offset(self, day):
+        """Returns the offset difference and target tzinfo of a day, or None if
+        either timezone changes its offset during the day.
+
+        """
+        start = self.from_timezone.localize(datetime.combine(day, time.min))
+        end = self.from_timezone.localize(datetime.combine(day, time.max))
+
+        converted_start = self.to_timezone.normalize(start.astimezone(self.to_timezone))
+        converted_end = self.to_timezone.normalize(end.astimezone(self.to_timezone))
+
+        if start.utcoffset() != end.utcoffset() or converted_start.tzinfo is not converted_end.tzinfo:
+            return None
+
+        return converted_start.utcoffset() - start.utcoffset(), converted_start.tzinfo
+
+    def convert(self, value):
+        """Returns a naive datetime in the from timezone as an aware datetime in
+        the to timezone.
+
+        """
+        day = value.date()
+
+        try:
+            offset = self.days[day]
+        except KeyError:
+            offset = self.get_day_offset(day)
+
+            if len(self.days) >= self.max_days:
+                self.days.clear()
+            self.days[day] = offset
+
+        if offset is None:
+            return self.convert_exact(value)
+
+        delta, tzinfo = offset
+        return (value + delta).replace(tzinfo=tzinfo)
+
+    def convert_many(self, values):
+        """Returns a list of naive datetimes converted to the to timezone."""
+        convert = self.convert
+        return [convert(value) for value in values]
+
+
+# Converters keyed by the names of the timezones they convert from and to
+converters = {}
+
+
+def get_converter(from_zone, to_zone):
+    """Returns the shared converter between two timezones."""
+    try:
+        return converters[(from_zone, to_zone)]
+    except KeyError:
+        converter = converters[(from_zone, to_zone)] = TimeZoneConverter(from_zone, to_zone)
+        return converter
@@ -0,0 +1,207 @@
+import httplib
+import socket
+import threading
+import urlparse
+import zlib
+
+__all__ = ['TRANSPORT_TIMEOUT', 'TRANSPORT_POOL_SIZE', 'TRANSPORT_CHUNK_SIZE', 'TransportError',
+           'HTTPTransport']
+
+# Number of seconds to wait when connecting or reading a response
+TRANSPORT_TIMEOUT = 30
+
+# Maximum number of idle connections kept open per host
+TRANSPORT_POOL_SIZE = 8
+
+# Number of bytes read from a response at a time when streaming
+TRANSPORT_CHUNK_SIZE = 64 * 1024
+
+
+class TransportError(Exception):
+    """Raised when a provider responds with an unsuccessful HTTP status."""
+    def __init__(self, status, url):
+        self.status = status
+        self.url = url
+        super(TransportError, self).__init__('HTTP %s fetching %s' % (status, url))
+
+
+class HTTPTransport(object):
+    """Fetches urls over persistent HTTP/1.1 connections.
+
+    Idle connections are pooled per host and shared between quote objects and
+    threads, so the TCP and DNS setup is only paid when a pool is empty.
+
+    """
+    def __init__(self, timeout=TRANSPORT_TIMEOUT, pool_size=TRANSPORT_POOL_SIZE, gzip=True):
+        """Initialise the transport.
+
+        Optionally given the timeout in seconds of each connection, the maximum
+        number of idle connections kept per host, and a boolean to determine
+        whether to ask for gzip compressed responses (default is True).
+
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.gzip = gzip
+
+        # Idle connections keyed by the scheme and host
+        self.pools = {}
+        self.lock = threading.Lock()
+
+        # Headers of the last response fetched on each thread
+        self.local = threading.local()
+
+    def get_connection(self, scheme, host):
+        """Returns an idle connection to the host or a new one."""
+        with self.lock:
+            pool = self.pools.get((scheme, host))
+            if pool:
+                return pool.pop()
+
+        if scheme == 'https':
+            return httplib.HTTPSConnection(host, timeout=self.timeout)
+        return httplib.HTTPConnection(host, timeout=self.timeout)
+
+    def release_connection(self, scheme, host, connection):
+        """Return a connection to the pool of idle connections for the host."""
+        with self.lock:
+            pool = self.pools.setdefault((scheme, host), [])
+            if len(pool) < self.pool_size:
+                pool.append(connection)
+                return
+
+        # The pool is full
+        connection.close()
+
+    def close(self):
+        """Close every idle connection."""
+        with self.lock:
+            pools, self.pools = self.pools, {}
+
+        for pool in pools.values():
+            for connection in pool:
+                connection.close()
+
+    def get_response_headers(self):
+        """Returns the headers of the last response fetched by get on this thread."""
+        return getattr(self.local, 'response_headers', None)
+
+    def get_headers(self):
+        """Returns the request headers sent with every request."""
+        headers = {'Connection': 'keep-alive', }
+        if self.gzip:
+            headers['Accept-Encoding'] = 'gzip'
+        return headers
+
+    def request(self, url):
+        """Send a GET request for the url and return the connection and response.
+
+        A pooled connection may have been closed by the server while idle, so
+        the request is retried once on a new connection if it fails.
+
+        """
+        parts = urlparse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+
+        headers = self.get_headers()
+
+        while True:
+            connection = self.get_connection(parts.scheme, parts.netloc)
+            reused = connection.sock is not None
+            try:
+                connection.request('GET', path, headers=headers)
+                return connection, connection.getresponse()
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                if not reused:
+                    raise
+
+    def finish(self, url, connection, response):
+        """Release or close the connection of a fully read response."""
+        if response.will_close:
+            connection.close()
+        else:
+            parts = urlparse.urlsplit(url)
+            self.release_connection(parts.scheme, parts.netloc, connection)
+
+    def get(self, url):
+        """Fetch a url and return the response body.
+
+        Raises a TransportError if the response status is not 200 OK.
+
+        """
+        connection, response = self.request(url)
+
+        try:
+            body = response.read()
+        except:
+            connection.close()
+            raise
+
+        self.finish(url, connection, response)
+
+        self.local.response_headers = dict(response.getheaders())
+
+        if response.status != 200:
+            raise TransportError(response.status, url)
+
+        if response.getheader('content-encoding', '').lower() == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+
+        return body
+
+    def iter_lines(self, url, chunk_size=TRANSPORT_CHUNK_SIZE):
+        """Fetch a url and return a generator of the lines of the response body.
+
+        The body is read and decompressed incrementally, so only one chunk is
+        held in memory at a time.  The connection is only returned to the pool
+        if the whole body is read.
+
+        Raises a TransportError if the response status is not 200 OK.
+
+        """
+        connection, response = self.request(url)
+
+        if response.status != 200:
+            response.read()
+            self.finish(url, connection, response)
+            raise TransportError(response.status, url)
+
+        if response.getheader('content-encoding', '').lower() == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            decompressor = None
+
+        finished = False
+        try:
+            pending = ''
+
+            while not finished:
+                chunk = response.read(chunk_size)
+
+                # An empty read is the end of the body
+                if not chunk:
+                    finished = True
+
+                if decompressor is not None:
+                    if finished:
+                        chunk = decompressor.flush()
+                    else:
+                        chunk = decompressor.decompress(chunk)
+
+                # Keep any partial line until the next chunk arrives
+                lines = (pending + chunk).split('\n')
+                pending = lines.pop()
+
+                for line in lines:
+                    yield line
+
+            if pending:
+                yield pending
+        finally:
+            if finished:
+                self.finish(url, connection, response)
+            else:
+                connection.close()